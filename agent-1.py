@@ -1,13 +1,27 @@
+import time
+
 import streamlit as st
 from pathlib import Path
-from langchain.agents import create_sql_agent
-from langchain.sql_database import SQLDatabase
-from langchain.agents.agent_types import AgentType
-from langchain.callbacks import StreamlitCallbackHandler
-from langchain.agents.agent_toolkits import SQLDatabaseToolkit
 from sqlalchemy import create_engine
 import sqlite3
-from langchain_groq import ChatGroq
+
+import agent_factory
+import agent_pool
+import agent_runner
+import data_version
+import engine_router
+import profiling
+import prompt_budget
+import rollups
+import schema_catalog
+import sql_examples
+import sql_guard
+from dataclasses import asdict
+from query_cache import QueryCache, cache_key, final_sql
+from result_shaper import ResultStore
+
+# Module imports are cached after the first run; LangChain loads lazily after this point
+_script_start = time.perf_counter()
 
 # -------------------------------
 # Streamlit Config
@@ -41,11 +55,7 @@ if not api_key:
 # -------------------------------
 # LLM Model
 # -------------------------------
-llm = ChatGroq(
-    groq_api_key=api_key,
-    model_name="Llama3-8b-8192",
-    streaming=True
-)
+MODEL_NAME = agent_factory.DEFAULT_MODEL
 
 # -------------------------------
 # Database Connection
@@ -55,7 +65,7 @@ def configure_db(db_uri, mysql_host=None, mysql_user=None, mysql_password=None,
     if db_uri == LOCALDB:
         dbfilepath = (Path(__file__).parent / "student.db").absolute()
         creator = lambda: sqlite3.connect(f"file:{dbfilepath}?mode=ro", uri=True)
-        return SQLDatabase(create_engine("sqlite:///", creator=creator))
+        return create_engine("sqlite:///", creator=creator)
     elif db_uri == MYSQL:
         if not (mysql_host and mysql_user and mysql_password and mysql_db):
             st.error("Please provide all MySQL connection details.")
@@ -64,13 +74,74 @@ def configure_db(db_uri, mysql_host=None, mysql_user=None, mysql_password=None,
         engine = create_engine(
             f"mysql+mysqlconnector://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}"
         )
-        return SQLDatabase(engine, include_tables=None)  
-        # include_tables=None → agent can use ALL tables
+        data_version.track_writes(engine)  # agent-issued DML invalidates cached answers
+        return engine
+
+# Schema catalog: reflected once per data version instead of on every agent turn.
+# All user tables are included, so the agent can use ALL tables.
+@st.cache_resource(ttl="2h")
+def configure_catalog(_engine, db_identity, data_ver):
+    rollups.ensure_fresh(_engine)  # rebuilds rollups a write went around; no-op on read-only DBs
+    catalog = schema_catalog.load_catalog(_engine, db_identity)
+    return catalog, rollups.prompt_hint(catalog) + schema_catalog.render(catalog)
 
 if db_uri == MYSQL:
-    db = configure_db(db_uri, mysql_host, mysql_user, mysql_password, mysql_db)
+    engine = configure_db(db_uri, mysql_host, mysql_user, mysql_password, mysql_db)
+    db_identity = f"mysql://{mysql_host}/{mysql_db}"
 else:
-    db = configure_db(db_uri)
+    engine = configure_db(db_uri)
+    db_identity = "sqlite://student.db"
+
+data_ver = data_version.current(engine)
+catalog, catalog_text = configure_catalog(engine, db_identity, data_ver)
+
+# Agent reads go to AGENT_READ_URL / AGENT_READ_SNAPSHOT when set (engine_router.py);
+# the bundled SQLite file is already read-only, so only MySQL is routed
+@st.cache_resource(ttl="2h")
+def get_router(_engine, db_identity):
+    return engine_router.from_env(_engine, "agent-1") if db_uri == MYSQL else None
+
+router = get_router(engine, db_identity)
+
+# -------------------------------
+# Answer Cache
+# -------------------------------
+@st.cache_resource
+def get_query_cache():
+    return QueryCache(Path(__file__).parent / ".query_cache.sqlite")
+
+query_cache = get_query_cache()
+
+with st.sidebar.expander("Answer cache"):
+    stats = query_cache.stats()
+    st.write(f"Hits: {stats['hits']} · Misses: {stats['misses']} · "
+             f"Hit rate: {stats['hit_rate']:.0%} · Entries: {stats['entries']}")
+    if st.button("Clear answer cache"):
+        query_cache.clear()
+
+# Question -> SQL pairs of past successful runs, retrieved as few-shot examples
+@st.cache_resource
+def get_example_index():
+    return sql_examples.ExampleIndex(Path(__file__).parent / ".sql_examples.sqlite")
+
+example_index = get_example_index()
+
+with st.sidebar.expander("📖 SQL examples"):
+    st.write(example_index.stats())
+    if st.button("Clear SQL examples"):
+        example_index.clear()
+
+# Full results of large queries: the model gets a summary, the user gets a download
+@st.cache_resource
+def get_result_store():
+    return ResultStore()
+
+result_store = get_result_store()
+
+# Agent runs from every session share one bounded worker pool (agent_pool.py)
+@st.cache_resource
+def get_pool():
+    return agent_pool.AgentPool("agent-1")
 
 # -------------------------------
 # System Prompt (schema-aware)
@@ -92,23 +163,64 @@ Your task:
 - If multiple tables could be relevant, infer reasonable join logic based on business context (e.g., linking orders with returns or managers).
 - Never hallucinate columns or tables not listed above.
 - Execute the SQL queries against the database to fetch results.
+- The full schema is listed below; do not call sql_db_list_tables or sql_db_schema.
+- Earlier turns of the conversation may be included with the question; use them to resolve follow-ups.
+
+Schema:
 """
 
 # -------------------------------
 # Agent Setup
 # -------------------------------
-toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-
-agent = create_sql_agent(
-    llm=llm,
-    toolkit=toolkit,
-    verbose=True,
-    agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION
-)
+# One agent per (database, data version, model, key), shared by reruns and sessions.
+# Built on the first uncached question; LangChain and Groq are imported only then.
+# The system prompt and catalog are the agent's fixed prompt prefix, identical on every
+# request; only the question (with trimmed history) and the scratchpad vary.
+@st.cache_resource(ttl="2h")
+def get_agent(_engine, _catalog, _catalog_text, db_identity, data_ver, model_name, api_key):
+    llm = agent_factory.groq_llm(api_key, model_name, streaming=True)
+    agent = agent_factory.sql_agent(
+        schema_catalog.sql_database(_engine, _catalog, guard=sql_guard.SQLGuard(_engine, "agent-1"),
+                                    results=get_result_store(), router=get_router(_engine, db_identity)), llm,
+        prefix=system_prompt + _catalog_text,
+        verbose=True,
+        agent_executor_kwargs={"return_intermediate_steps": True},
+    )
+    return agent, prompt_budget.attach(agent, model_name)
 
 # -------------------------------
 # Chat UI
 # -------------------------------
+profiling.serve_metrics_from_env()
+# Time from script start to a ready UI: cold start vs reruns with cached resources
+startup = profiling.record_script_run("agent-1", time.perf_counter() - _script_start)
+with st.sidebar.expander("🚀 Startup"):
+    st.write(startup)
+with st.sidebar.expander("⏱️ Slowest steps"):
+    slow_steps = profiling.slowest(limit=10, app="agent-1")
+    if slow_steps:
+        st.dataframe(slow_steps, use_container_width=True)
+    else:
+        st.caption("No profiled requests yet.")
+with st.sidebar.expander("🛡️ SQL guard"):
+    interventions = sql_guard.recent(limit=10, app="agent-1")
+    if interventions:
+        st.dataframe(interventions, use_container_width=True)
+    else:
+        st.caption("No queries limited or rejected yet.")
+with st.sidebar.expander("🧵 Agent pool"):
+    st.write(get_pool().stats())
+if router is not None:
+    with st.sidebar.expander("🔀 Read routing"):
+        st.write(router.freshness())
+        st.dataframe(router.stats(), use_container_width=True)
+with st.sidebar.expander("🧮 Tokens per turn"):
+    turns = st.session_state.get("token_turns", [])
+    if turns:
+        st.dataframe(turns[::-1], use_container_width=True)
+    else:
+        st.caption("No agent turns yet.")
+
 if "messages" not in st.session_state or st.sidebar.button("Clear message history"):
     st.session_state["messages"] = [{"role": "assistant", "content": "How can I help you?"}]
 
@@ -122,13 +234,67 @@ if user_query:
     st.chat_message("user").write(user_query)
 
     with st.chat_message("assistant"):
-        streamlit_callback = StreamlitCallbackHandler(st.container())
+        # Question plus as much recent history as the input budget allows
+        history = st.session_state.messages[1:-1]
+        agent_input, turn = prompt_budget.fit_input(user_query, history)
+
+        # Repeat questions against unchanged data skip the agent entirely; only
+        # follow-ups ("what about West?") are keyed on the history they were asked after
+        answer_key = cache_key(user_query, agent_input)
+        cached = query_cache.get(answer_key, db_identity, data_ver)
+        if cached is not None:
+            response = cached.answer
+            if cached.sql:
+                st.caption("⚡ Answered from cache")
+                st.code(cached.sql, language="sql")
+        else:
+            agent, budget = get_agent(engine, catalog, catalog_text, db_identity, data_ver, MODEL_NAME, api_key)
+            profiler = profiling.ProfilingHandler("agent-1", user_query)
+            # Similar past questions and their working SQL go into the input, not the prefix;
+            # the cache key never includes them
+            examples = example_index.search(user_query, db_identity)
+            run_input, turn = prompt_budget.fit_input(user_query, history, examples=examples)
+            # Let the agent run across all tables; the system prompt is already its prefix.
+            # It runs on the shared pool; this script polls it and draws its steps.
+            try:
+                job = get_pool().submit(agent_pool.session_user(), agent_runner.AgentJob(
+                    agent, {"input": run_input}, engine=engine, callbacks=[profiler]))
+            except agent_pool.PoolFull as e:
+                st.session_state.messages.pop()
+                st.warning(f"⏳ {e}. Please try again shortly.")
+                st.stop()
+            progress = st.empty()
 
-        # Prepend system prompt to user query
-        full_query = system_prompt + "\nUser question: " + user_query
+            def show(job):
+                snap, position = job.snapshot(), get_pool().position(job)
+                with progress.container():
+                    st.caption(f"⏳ {snap['status']}" + (f" (#{position} in line)" if position else "")
+                               + f" · {time.perf_counter() - job.started:.1f} s")
+                    for step in snap["steps"]:
+                        st.code(step["input"], language="sql" if step["tool"] == "sql_db_query" else None)
 
-        # Let the agent run across all tables with system prompt context
-        response = agent.run(full_query, callbacks=[streamlit_callback])
+            result = None
+            try:
+                agent_pool.follow(job, show)
+                result = job.result
+            finally:
+                turn = budget.report(turn, result and result.get("intermediate_steps")).add_usage(profiler.spans)
+                profiler.flush(queue_wait_ms=round((job.wait_seconds or 0) * 1000, 1), **asdict(turn))
+                st.session_state.setdefault("token_turns", []).append({"question": user_query[:60], **asdict(turn)})
+            progress.empty()
+            if job.error is not None:
+                raise job.error
+            response = result["output"]
+            observations = " ".join(str(obs) for _, obs in result.get("intermediate_steps") or [])
+            for result_id in result_store.ids_in(observations):
+                sql, frame = result_store.get(result_id)
+                st.download_button(f"⬇️ Full result ({len(frame):,} rows)", frame.to_csv(index=False),
+                                   file_name=f"result-{result_id}.csv", mime="text/csv", key=f"dl-{result_id}")
+            query_cache.put(answer_key, db_identity, data_ver,
+                            final_sql(result.get("intermediate_steps")), response)
+            example_sql = sql_examples.successful_sql(result.get("intermediate_steps"), response)
+            if example_sql:
+                example_index.add(user_query, example_sql, db_identity)
 
         st.session_state.messages.append({"role": "assistant", "content": response})
         st.write(response)
@@ -1,13 +1,28 @@
 # app_orders2_agent.py
 import os
+import time
+from typing import TYPE_CHECKING
+
 import streamlit as st
 from sqlalchemy import create_engine, text
-from langchain.agents import create_sql_agent
-from langchain.agents.agent_types import AgentType
-from langchain.agents.agent_toolkits import SQLDatabaseToolkit
-from langchain.callbacks import StreamlitCallbackHandler
-from langchain.sql_database import SQLDatabase
-from langchain_groq import ChatGroq
+
+import agent_factory
+import agent_pool
+import agent_runner
+import data_version
+import engine_router
+import intent_router
+import profiling
+import schema_catalog
+import sql_examples
+import sql_guard
+from result_shaper import ResultStore
+
+if TYPE_CHECKING:
+    from langchain.sql_database import SQLDatabase
+
+# Module imports are cached after the first run; LangChain loads lazily after this point
+_script_start = time.perf_counter()
 
 
 # ==============================
@@ -50,55 +65,100 @@ with st.sidebar:
 def build_connection_url(user: str, pwd: str, host: str, port: int, db: str) -> str:
     return f"mysql+mysqlconnector://{user}:{pwd}@{host}:{port}/{db}"
 
-def make_engine() -> SQLDatabase | None:
+# Full results of large agent queries: the model gets a summary, the user a download
+@st.cache_resource
+def get_result_store():
+    return ResultStore()
+
+# Question -> SQL pairs of past successful runs, retrieved as few-shot examples
+@st.cache_resource
+def get_example_index():
+    return sql_examples.ExampleIndex(os.path.join(os.path.dirname(__file__), ".sql_examples.sqlite"))
+
+# Agent runs from every session share one bounded worker pool (agent_pool.py)
+@st.cache_resource
+def get_pool():
+    return agent_pool.AgentPool("agent-2-new")
+
+# Agent reads go to AGENT_READ_URL / AGENT_READ_SNAPSHOT when set (engine_router.py);
+# one router, and one snapshot refresher, per database
+@st.cache_resource
+def get_router(_engine, db_key):
+    return engine_router.from_env(_engine, "agent-2-new")
+
+def load_catalog(engine) -> dict:
+    # Schema + sample rows come from the on-disk catalog, not a reflection per turn
+    catalog = schema_catalog.load_catalog(engine, str(engine.url), include_tables=["orders_2"])
+    st.session_state.catalog_version = catalog["version"]
+    st.session_state.db = None  # the agent's SQLDatabase is rebuilt from the new catalog when needed
+    return catalog
+
+def make_catalog_db(engine) -> "SQLDatabase":
+    # Agent SQL is EXPLAIN-checked, row-capped and timed out before it reaches MySQL
+    return schema_catalog.sql_database(engine, st.session_state.catalog,
+                                       guard=sql_guard.SQLGuard(engine, "agent-2-new"),
+                                       results=get_result_store(), router=get_router(engine, str(engine.url)))
+
+def agent_db() -> "SQLDatabase":
+    # Built (and LangChain imported) the first time a request goes to the agent
+    if st.session_state.get("db") is None:
+        st.session_state.db = make_catalog_db(st.session_state.engine)
+    return st.session_state.db
+
+def make_engine():
     try:
         url = build_connection_url(db_user, db_password, db_host, db_port, db_name)
         engine = create_engine(url, pool_pre_ping=True)
         # quick smoke test
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
-        return SQLDatabase(engine, include_tables=["orders_2"])
+        data_version.track_writes(engine)
+        get_router(engine, str(engine.url)).track(engine)  # a reconnect builds a new engine for the same database
+        st.session_state.catalog = load_catalog(engine)
+        return engine
     except Exception as e:
         st.error(f"❌ Connection failed: {e}")
         return None
 
 
-# Maintain connection/model in session
-if connect_btn or "db" not in st.session_state:
-    st.session_state.db = make_engine()
+# Maintain connection/catalog in session; reload the catalog after writes
+if connect_btn or "engine" not in st.session_state:
+    st.session_state.engine = make_engine()
+elif st.session_state.engine is not None:
+    if data_version.current(st.session_state.engine) != st.session_state.get("catalog_version"):
+        st.session_state.catalog = load_catalog(st.session_state.engine)
 
-# LLM setup
-if "llm" not in st.session_state or connect_btn:
-    if groq_api_key:
-        os.environ["GROQ_API_KEY"] = groq_api_key
-    try:
-        st.session_state.llm = ChatGroq(model_name=model_name, temperature=temperature)
-    except Exception as e:
-        st.error(f"❌ Could not initialize Groq LLM: {e}")
-        st.stop()
-
-# Agent setup
-def make_agent(db: SQLDatabase):
-    toolkit = SQLDatabaseToolkit(db=db, llm=st.session_state.llm)
-    return create_sql_agent(
-        llm=st.session_state.llm,
-        toolkit=toolkit,
-        agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+# LLM / agent setup: cached per (model, temperature, key) and per catalog version, shared
+# across reruns and sessions; nothing is built (or imported) until a request needs the agent
+if groq_api_key:
+    os.environ["GROQ_API_KEY"] = groq_api_key
+
+@st.cache_resource(ttl="2h")
+def get_llm(model_name, temperature, api_key):
+    return agent_factory.groq_llm(api_key or None, model_name, temperature, streaming=True)
+
+@st.cache_resource(ttl="2h", max_entries=16)
+def get_agent(_db, db_key, catalog_version, model_name, temperature, api_key):
+    return agent_factory.sql_agent(
+        _db, get_llm(model_name, temperature, api_key),
         verbose=True,
         handle_parsing_errors=True,
     )
 
-if st.session_state.get("db") is None:
+if st.session_state.get("engine") is None:
     st.stop()
 
-agent = make_agent(st.session_state.db)
+# Time from script start to a ready UI: cold start vs reruns with cached resources
+startup = profiling.record_script_run("agent-2-new", time.perf_counter() - _script_start)
+with st.sidebar.expander("🚀 Startup"):
+    st.write(startup)
 
 # ==============================
 # Schema Panel
 # ==============================
 with st.expander("📚 orders_2 schema", expanded=True):
     try:
-        info = st.session_state.db.get_table_info(["orders_2"])
+        info = schema_catalog.table_info(st.session_state.catalog)["orders_2"]
         st.code(info, language="sql")
     except Exception as e:
         st.warning(f"Could not load schema details: {e}")
@@ -134,42 +194,175 @@ col_run, col_clear = st.columns([1, 1])
 with col_clear:
     if st.button("Clear output"):
         st.session_state.pop("last_result", None)
+        st.session_state.pop("last_rows", None)
+        st.session_state.pop("last_result_ids", None)
         st.experimental_rerun()
 
 with col_run:
-    run_btn = st.button("Run", type="primary")
+    run_btn = st.button("Run", type="primary", disabled=st.session_state.get("job") is not None)
 
 trace_area = st.container()
 result_area = st.container()
 
-if run_btn and user_query.strip():
-    st_cb = StreamlitCallbackHandler(trace_area)
-
-    guardrail = (
-        "You are an SQL expert agent with full INSERT, UPDATE, DELETE, and SELECT rights "
-        "on the MySQL table `orders_2` in schema `super_market`. "
-        "Always generate valid SQL queries for this table and execute them. "
-        "Rules:\n"
-        "- The Delivered column can only be 'YES' or 'NO'.\n"
-        "- For returns: validate if the Order_Date is within 30 days of today. "
-        "Only then allow DELETE or mark as returned. If >30 days, politely deny.\n"
-        "- Never refuse otherwise. If the user asks something outside orders_2, explain that "
-        "you only manage this table.\n"
-        "- Always output valid SQL query reasoning for LangChain execution."
-    )
 
+def log_route(path: str, seconds: float, question: str, first_output: float | None = None):
+    profiling.record("agent-2-new", "intent", path, seconds * 1000, question=question.strip()[:80])
+    st.session_state.setdefault("route_log", []).append({
+        "path": path,
+        "ms": round(seconds * 1000, 1),
+        "first_output_ms": round((first_output if first_output is not None else seconds) * 1000, 1),
+        "question": question.strip()[:80],
+    })
+
+
+if run_btn and user_query.strip() and st.session_state.get("job") is None:
+    start = time.perf_counter()
+    st.session_state.last_rows = None
+    st.session_state.last_result_ids = []
     try:
-        prompt = f"{guardrail}\n\nUser question:\n{user_query}"
-        response = agent.invoke({"input": prompt}, {"callbacks": [st_cb]})
-        final_text = response.get("output", response)
-        st.session_state.last_result = final_text
+        # Common requests run prebuilt SQL; everything else goes to the agent
+        routed = intent_router.try_fast_path(st.session_state.engine, user_query)
     except Exception as e:
-        st.session_state.last_result = f"❌ Error: {e}"
+        routed = intent_router.RouteResult("fast:error", f"❌ Error: {e}")
+    if routed is not None:
+        profiling.record("agent-2-new", "sql", routed.path, routed.seconds * 1000, sql=routed.sql,
+                         rows=len(routed.rows))
+        st.session_state.last_result = routed.answer
+        st.session_state.last_rows = routed.rows
+        log_route(routed.path, time.perf_counter() - start, user_query)
+    else:
+        # The agent runs on a background thread; this and later reruns stream its progress
+        profiler = profiling.ProfilingHandler("agent-2-new", user_query)
+        guardrail = (
+            "You are an SQL expert agent with full INSERT, UPDATE, DELETE, and SELECT rights "
+            "on the MySQL table `orders_2` in schema `super_market`. "
+            "Always generate valid SQL queries for this table and execute them. "
+            "Rules:\n"
+            "- The Delivered column can only be 'YES' or 'NO'.\n"
+            "- For returns: validate if the Order_Date is within 30 days of today. "
+            "Only then allow DELETE or mark as returned. If >30 days, politely deny.\n"
+            "- Never refuse otherwise. If the user asks something outside orders_2, explain that "
+            "you only manage this table.\n"
+            "- Always output valid SQL query reasoning for LangChain execution.\n"
+            "- The orders_2 schema is below; do not call sql_db_list_tables or sql_db_schema.\n\n"
+            + schema_catalog.table_info(st.session_state.catalog)["orders_2"]
+        )
+
+        # Similar past questions and the SQL that answered them, as worked examples
+        examples = get_example_index().search(user_query, str(st.session_state.engine.url))
+        shots = f"{sql_examples.render(examples)}\n\n" if examples else ""
+        prompt = f"{guardrail}\n\n{shots}User question:\n{user_query}"
+        st.session_state.last_result = None
+        engine = st.session_state.engine
+        try:
+            agent = get_agent(agent_db(), str(engine.url), st.session_state.catalog_version,
+                              model_name, temperature, groq_api_key)
+        except Exception as e:
+            st.error(f"❌ Could not initialize Groq LLM: {e}")
+            st.stop()
+        try:
+            st.session_state.job = get_pool().submit(agent_pool.session_user(), agent_runner.AgentJob(
+                agent, {"input": prompt}, engine=engine, callbacks=[profiler]))
+        except agent_pool.PoolFull as e:
+            st.warning(f"⏳ {e}. Please try again shortly.")
+        else:
+            st.session_state.job_meta = {"question": user_query, "profiler": profiler, "examples": len(examples)}
+
+job = st.session_state.get("job")
+if job is not None:
+    with trace_area:
+        st.button("⏹️ Cancel", on_click=job.cancel)
+        status_box = st.empty()
+        steps_box = st.empty()
+    with result_area:
+        answer_box = st.empty()
+
+    while True:
+        finished = job.finished.is_set()
+        snap = job.snapshot()
+        position = get_pool().position(job)
+        status_box.caption(f"⏳ {snap['status']}" + (f" (#{position} in line)" if position else "")
+                           + f" · {time.perf_counter() - job.started:.1f} s")
+        with steps_box.container():
+            for step in snap["steps"]:
+                st.markdown(f"**{step['tool']}**")
+                st.code(step["input"], language="sql" if step["tool"] == "sql_db_query" else None)
+                if step["output"] is not None:
+                    st.text(step["output"][:500])
+            if not snap["answer"] and snap["thoughts"]:
+                st.text(snap["thoughts"].rsplit("\n\n", 1)[-1])
+        if snap["answer"]:
+            answer_box.markdown("### ✅ Answer\n" + snap["answer"])
+        if finished:
+            break
+        time.sleep(agent_runner.POLL_SECONDS)
+
+    meta = st.session_state.pop("job_meta", {})
+    st.session_state.job = None
+    if meta.get("profiler"):
+        meta["profiler"].flush(examples=meta.get("examples", 0))
+    if job.status == "cancelled":
+        st.session_state.last_result = "⏹️ Cancelled." + (f" Partial answer: {job.answer}" if job.answer else "")
+    elif job.error is not None:
+        st.session_state.last_result = f"❌ Error: {job.error}"
+    else:
+        st.session_state.last_result = job.answer
+        example_sql = sql_examples.successful_sql(job.snapshot()["steps"], job.answer)
+        if example_sql and meta.get("question"):
+            get_example_index().add(meta["question"], example_sql, str(job.engine.url))
+    st.session_state.last_result_ids = get_result_store().ids_in(
+        " ".join(step["output"] or "" for step in job.snapshot()["steps"]))
+    answer_box.empty()
+    path = "agent:cancelled" if job.status == "cancelled" else "agent:error" if job.error is not None else "agent"
+    log_route(path, job.seconds, meta.get("question", ""), job.first_output_seconds)
+    st.experimental_rerun()  # redraw with the Run button enabled again
 
 if st.session_state.get("last_result"):
     with result_area:
         st.markdown("### ✅ Answer")
         st.write(st.session_state["last_result"])
+        if st.session_state.get("last_rows"):
+            st.dataframe(st.session_state["last_rows"], use_container_width=True)
+        for result_id in st.session_state.get("last_result_ids") or []:
+            stored = get_result_store().get(result_id)
+            if stored is not None:
+                st.download_button(f"⬇️ Full result ({len(stored[1]):,} rows)", stored[1].to_csv(index=False),
+                                   file_name=f"result-{result_id}.csv", mime="text/csv", key=f"dl-{result_id}")
+
+with st.sidebar.expander("🚦 Request routing"):
+    log = st.session_state.get("route_log", [])
+    if log:
+        # Errors fail fast on either path and would skew the comparison
+        timed = [r for r in log if not r["path"].endswith(":error")]
+        fast = [r["ms"] for r in timed if r["path"].startswith("fast:")]
+        slow = [r["ms"] for r in timed if r["path"].startswith("agent")]
+        st.write(f"Fast path: {len(fast)} request(s)" + (f", avg {sum(fast) / len(fast):.1f} ms" if fast else ""))
+        st.write(f"Agent: {len(slow)} request(s)" + (f", avg {sum(slow) / len(slow):.0f} ms" if slow else ""))
+        st.dataframe(log[-20:][::-1], use_container_width=True)
+    else:
+        st.caption("No requests yet.")
+
+profiling.serve_metrics_from_env()
+with st.sidebar.expander("⏱️ Slowest steps"):
+    slow_steps = profiling.slowest(limit=10, app="agent-2-new")
+    if slow_steps:
+        st.dataframe(slow_steps, use_container_width=True)
+    else:
+        st.caption("No profiled requests yet.")
+with st.sidebar.expander("🧵 Agent pool"):
+    st.write(get_pool().stats())
+with st.sidebar.expander("🛡️ SQL guard"):
+    interventions = sql_guard.recent(limit=10, app="agent-2-new")
+    if interventions:
+        st.dataframe(interventions, use_container_width=True)
+    else:
+        st.caption("No queries limited or rejected yet.")
+with st.sidebar.expander("📖 SQL examples"):
+    st.write(get_example_index().stats())
+with st.sidebar.expander("🔀 Read routing"):
+    router = get_router(st.session_state.engine, str(st.session_state.engine.url))
+    st.write(router.freshness())
+    st.dataframe(router.stats(), use_container_width=True)
 
 # ==============================
 # Footer
@@ -1,96 +1,95 @@
+import os
+import pandas as pd
 import streamlit as st
-import mysql.connector
 from datetime import datetime
 
+import orders_store
+
 # ==============================
 # DB CONNECTION
 # ==============================
-def get_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="1a0qaeta",   # 🔑 replace with your MySQL password
-        database="super_market"     # 🔑 replace with your schema name
-    )
+# One bounded, health-checked pool per server process, shared across reruns and sessions.
+# Set ORDERS_SQLITE_PATH to run against a local SQLite file instead of MySQL.
+@st.cache_resource
+def get_store():
+    sqlite_path = os.getenv("ORDERS_SQLITE_PATH")
+    if sqlite_path:
+        pool = orders_store.sqlite_pool(sqlite_path)
+    else:
+        pool = orders_store.mysql_pool(
+            host="localhost",
+            user="root",
+            password="1a0qaeta",   # 🔑 replace with your MySQL password
+            database="super_market"     # 🔑 replace with your schema name
+        )
+    return orders_store.OrdersStore(pool)
 
 # ==============================
 # INSERT NEW ORDER
 # ==============================
 def insert_order(customer_name, customer_id, segment, country, state, postal_code,
                  region, category, product_name, quantity):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    query = """
-        INSERT INTO orders_2
-        (Customer_Name, Customer_ID, Segment, Country, State, Postal_Code, Region, Category, 
-        Product_Name, Quantity, Purchase_Date, Delivered)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-    """
-    values = (
-        customer_name, customer_id, segment, country, state, postal_code,
-        region, category, product_name, quantity,
-        datetime.today().date(), "NO"   # purchase_date auto, delivered = NO
-    )
-
-    cursor.execute(query, values)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    get_store().insert_order(customer_name, customer_id, segment, country, state, postal_code,
+                             region, category, product_name, quantity)
 
 # ==============================
 # GET UNDELIVERED ORDERS
 # ==============================
 def get_undelivered_orders():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT Customer_ID, Customer_Name, Product_Name, Quantity FROM orders_2 WHERE Delivered='NO'")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return rows
+    return get_store().get_undelivered_orders()
 
 # ==============================
 # UPDATE UNDELIVERED ORDER
 # ==============================
 def update_order(customer_id, new_product, new_quantity):
-    conn = get_connection()
-    cursor = conn.cursor()
-    query = "UPDATE orders_2 SET Product_Name=%s, Quantity=%s WHERE Customer_ID=%s AND Delivered='NO'"
-    cursor.execute(query, (new_product, new_quantity, customer_id))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    get_store().update_order(customer_id, new_product, new_quantity)
 
 # ==============================
 # MARK ORDER AS DELIVERED
 # ==============================
 def mark_delivered(customer_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    query = "UPDATE orders_2 SET Delivered='YES' WHERE Customer_ID=%s AND Delivered='NO'"
-    cursor.execute(query, (customer_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    get_store().mark_delivered(customer_id)
 
 # ==============================
 # GET ALL ORDERS
 # ==============================
 def get_orders():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT Customer_ID, Customer_Name, Product_Name, Purchase_Date, Delivered FROM orders_2")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return rows
+    return get_store().get_orders()
+
+# ==============================
+# ORDER PICKER (server-side search + keyset pages)
+# ==============================
+def order_picker(page, delivered=None, returnable=False):
+    """Search box + one page of matching orders; returns the selected order or None."""
+    store = get_store()
+    search = st.text_input("Search by Customer ID or Name", key=f"{page}_search").strip()
+    cursor = st.session_state.setdefault(f"{page}_cursor", {"search": search, "stack": [None]})
+    if cursor["search"] != search:
+        cursor.update(search=search, stack=[None])
+
+    orders, next_key = store.list_orders(delivered=delivered, search=search,
+                                         after_key=cursor["stack"][-1], returnable=returnable)
+    if not orders:
+        return None
+
+    by_key = {o["Order_Key"]: o for o in orders}
+    selected = st.selectbox(
+        "Select Order", list(by_key), key=f"{page}_select",
+        format_func=lambda k: f"#{k} · {by_key[k]['Customer_ID']} · {by_key[k]['Customer_Name']} · "
+                              f"{by_key[k]['Product_Name']}",
+    )
+    col_prev, col_next = st.columns(2)
+    col_prev.button("◀ Previous", key=f"{page}_prev", disabled=len(cursor["stack"]) == 1,
+                    on_click=cursor["stack"].pop)
+    col_next.button("Next ▶", key=f"{page}_next", disabled=next_key is None,
+                    on_click=cursor["stack"].append, args=(next_key,))
+    return by_key[selected]
 
 # ==============================
 # MARK RETURN
 # ==============================
-def mark_return(customer_id):
-    pass
+def mark_return(order_key):
+    return get_store().mark_return(order_key)
 
 # ==============================
 # STREAMLIT UI
@@ -98,7 +97,12 @@ def mark_return(customer_id):
 st.title("🛒 Super Market Order Management")
 
 menu = st.sidebar.radio("Choose Action", 
-                        ["Place New Order", "Modify Undelivered Order", "Mark Orders as Delivered", "Process Return"])
+                        ["Place New Order", "Modify Undelivered Order", "Mark Orders as Delivered", "Process Return",
+                         "Bulk Import / Deliver"])
+
+with st.sidebar.expander("DB timings"):
+    st.dataframe(get_store().timer.report(), use_container_width=True)
+    st.caption(f"Pool: {get_store().pool.stats}")
 
 # ---------------- PLACE NEW ORDER ----------------
 if menu == "Place New Order":
@@ -127,50 +131,43 @@ if menu == "Place New Order":
 elif menu == "Modify Undelivered Order":
     st.subheader("✏️ Modify Undelivered Orders")
 
-    orders = get_undelivered_orders()
-    if not orders:
+    order = order_picker("modify", delivered="NO")
+    if order is None:
         st.info("No undelivered orders found.")
     else:
-        selected = st.selectbox("Select Order by Customer ID", [o["Customer_ID"] for o in orders])
-        order = next(o for o in orders if o["Customer_ID"] == selected)
-
         new_product = st.text_input("New Product Name", value=order["Product_Name"])
         new_quantity = st.number_input("New Quantity", min_value=1, step=1, value=order["Quantity"])
 
         if st.button("Update Order"):
-            update_order(selected, new_product, new_quantity)
+            get_store().update_order_by_key(order["Order_Key"], new_product, new_quantity)
             st.success(f"✅ Order for {order['Customer_Name']} updated!")
 
 # ---------------- MARK AS DELIVERED ----------------
 elif menu == "Mark Orders as Delivered":
     st.subheader("📬 Mark Undelivered Orders as Delivered")
 
-    orders = get_undelivered_orders()
-    if not orders:
+    order = order_picker("deliver", delivered="NO")
+    if order is None:
         st.info("No undelivered orders to mark delivered.")
     else:
-        selected = st.selectbox("Select Order by Customer ID", [o["Customer_ID"] for o in orders])
-        order = next(o for o in orders if o["Customer_ID"] == selected)
-
         st.write(f"**Customer:** {order['Customer_Name']}")
         st.write(f"**Product:** {order['Product_Name']}")
         st.write(f"**Quantity:** {order['Quantity']}")
 
         if st.button("Mark Delivered"):
-            mark_delivered(selected)
+            get_store().mark_delivered_by_key(order["Order_Key"])
             st.success(f"✅ Order for {order['Customer_Name']} marked as Delivered!")
 
 # ---------------- PROCESS RETURNS ----------------
 elif menu == "Process Return":
     st.subheader("↩️ Process Eligible Returns")
+    st.caption(f"Delivered orders purchased on or after {orders_store.return_cutoff()} "
+               f"({orders_store.RETURN_WINDOW_DAYS}-day window).")
 
-    orders = get_orders()
-    if not orders:
-        st.info("No orders found.")
+    order = order_picker("return", returnable=True)
+    if order is None:
+        st.info("No orders are eligible for return.")
     else:
-        selected = st.selectbox("Select Order by Customer ID", [o["Customer_ID"] for o in orders])
-        order = next(o for o in orders if o["Customer_ID"] == selected)
-
         purchase_date = order["Purchase_Date"]
         days_diff = (datetime.today().date() - purchase_date).days
 
@@ -178,16 +175,52 @@ elif menu == "Process Return":
         st.write(f"**Product:** {order['Product_Name']}")
         st.write(f"**Purchase Date:** {purchase_date}")
         st.write(f"**Days Since Purchase:** {days_diff}")
-        st.write(f"**Current Status:** {order['Delivered']}")
 
-        if order["Delivered"] == "YES" and days_diff <= 30:
-            confirm = st.radio("Eligible for return. Do you want to confirm?", ["No", "Yes"])
-            if confirm == "Yes":
-                mark_return(selected)
+        confirm = st.radio("Eligible for return. Do you want to confirm?", ["No", "Yes"])
+        if confirm == "Yes" and st.button("Process Return"):
+            if mark_return(order["Order_Key"]):
                 st.success("✅ Return processed successfully!")
-        elif order["Delivered"] == "RETURNED":
-            st.warning("⚠️ This order has already been returned.")
-        elif order["Delivered"] == "NO":
-            st.error("❌ This order hasn’t been delivered yet, so it cannot be returned.")
+            else:
+                st.error("❌ This order is no longer eligible for return.")
+
+# ---------------- BULK IMPORT / DELIVER ----------------
+elif menu == "Bulk Import / Deliver":
+    st.subheader("📥 Import Orders from CSV")
+    st.caption("Columns: " + ", ".join(orders_store.IMPORT_COLUMNS))
+
+    upload = st.file_uploader("Orders CSV", type="csv")
+    if upload is not None:
+        try:
+            valid, rejected = orders_store.validate_orders(pd.read_csv(upload, dtype={"Postal_Code": str}))
+        except ValueError as e:
+            st.error(f"❌ {e}")
         else:
-            st.error("❌ This order is not eligible for return (older than 30 days).")
+            st.write(f"**Valid rows:** {len(valid)} · **Rejected rows:** {len(rejected)}")
+            if len(rejected):
+                st.dataframe(rejected, use_container_width=True)
+            if len(valid) and st.button(f"Import {len(valid)} orders"):
+                result = get_store().insert_orders(valid)
+                st.success(f"✅ Imported {result.rows} orders in {result.seconds:.2f}s "
+                           f"({result.rows_per_sec:,.0f} rows/sec)")
+
+    st.subheader("🚚 Mark a Shipment as Delivered")
+    keys_text = st.text_area("Order keys (comma or newline separated)")
+    if st.button("Mark All Delivered"):
+        keys = [k for k in keys_text.replace(",", "\n").split() if k]
+        if not all(k.isdigit() for k in keys):
+            st.error("❌ Order keys must be whole numbers.")
+        elif keys:
+            result = get_store().mark_delivered_keys([int(k) for k in keys])
+            st.success(f"✅ {result.rows} of {len(keys)} orders marked as Delivered in "
+                       f"{result.seconds:.2f}s ({result.rows_per_sec:,.0f} rows/sec)")
+
+# ---------------- DEBUG: READ CACHE ----------------
+# Rendered last so the counts include this rerun's queries.
+with st.sidebar.expander("Read cache"):
+    cache = get_store().cache.report()
+    col_rate, col_saved = st.columns(2)
+    col_rate.metric("Hit rate", f"{cache['hit_rate']:.0%}")
+    col_saved.metric("DB calls saved", cache["db_calls_saved"])
+    st.caption(f"{cache['hits']} hits · {cache['misses']} misses ({cache['stale']} after a write) · "
+               f"{cache['version_checks']} version checks · {cache['db_ms_saved']:,.0f} ms of queries saved · "
+               f"{cache['entries']} entries, {cache['rows']:,} rows")
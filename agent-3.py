@@ -1,12 +1,26 @@
+import time
+
 import streamlit as st
 from pathlib import Path
-from langchain.agents import create_sql_agent
-from langchain.sql_database import SQLDatabase
-from langchain.agents.agent_types import AgentType
-from langchain.agents.agent_toolkits import SQLDatabaseToolkit
 from sqlalchemy import create_engine
 import sqlite3
-from langchain_groq import ChatGroq
+
+import pandas as pd
+from dataclasses import asdict
+
+import agent_factory
+import agent_pool
+import agent_runner
+import data_version
+import engine_router
+import profiling
+import prompt_budget
+import schema_catalog
+from escalation import (BATCH_COLUMNS, DEFAULT_BATCH_WORKERS, ROLES, EscalationError, EscalationIndex,
+                        email_prompt, escalate_batch)
+
+# Module imports are cached after the first run; LangChain loads lazily after this point
+_script_start = time.perf_counter()
 
 # -------------------------------
 # Streamlit Config
@@ -38,11 +52,13 @@ if not db_uri or not api_key:
 # -------------------------------
 # LLM Model
 # -------------------------------
-llm = ChatGroq(
-    groq_api_key=api_key,
-    model_name="Llama3-8b-8192",
-    streaming=True
-)
+MODEL_NAME = agent_factory.DEFAULT_MODEL
+
+# Built once per (key, model) and reused across reruns; the Groq client is imported here
+@st.cache_resource(ttl="2h")
+def get_llm(api_key, model_name):
+    return agent_factory.groq_llm(api_key, model_name, streaming=True)
+
 
 # -------------------------------
 # Database Connection
@@ -52,28 +68,58 @@ def configure_db(db_uri, mysql_host=None, mysql_user=None, mysql_password=None,
     if db_uri == "USE_LOCALDB":
         dbfilepath = (Path(__file__).parent / "demo.db").absolute()
         creator = lambda: sqlite3.connect(f"file:{dbfilepath}?mode=ro", uri=True)
-        return SQLDatabase(create_engine("sqlite:///", creator=creator))
+        return create_engine("sqlite:///", creator=creator)
     elif db_uri == MYSQL:
-        engine = create_engine(
+        return create_engine(
             f"mysql+mysqlconnector://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}"
         )
-        return SQLDatabase(engine, include_tables=None)  # agent can use all 7 tables
+
+# Schema catalog: reflected once per data version instead of on every agent turn
+@st.cache_resource(ttl="2h")
+def configure_catalog(_engine, db_identity, data_ver):
+    catalog = schema_catalog.load_catalog(_engine, db_identity)  # agent can use all 7 tables
+    manager_tables = {t: m for t, m in catalog["tables"].items() if t.endswith("_managers")}
+    prompt_text = schema_catalog.render({**catalog, "tables": manager_tables})
+    return catalog, prompt_text
 
 if db_uri == MYSQL:
-    db = configure_db(db_uri, mysql_host, mysql_user, mysql_password, mysql_db)
+    engine = configure_db(db_uri, mysql_host, mysql_user, mysql_password, mysql_db)
+    db_identity = f"mysql://{mysql_host}/{mysql_db}"
 else:
-    db = configure_db(db_uri)
+    engine = configure_db(db_uri)
+    db_identity = "sqlite://demo.db"
+
+# Manager lookups: the four manager tables held in memory, rebuilt when the data changes
+@st.cache_resource(ttl="2h")
+def configure_escalation(_engine, db_identity, data_ver):
+    return EscalationIndex.load(_engine, data_ver)
+
+data_ver = data_version.current(engine)
+catalog, catalog_text = configure_catalog(engine, db_identity, data_ver)
+escalation_index = configure_escalation(engine, db_identity, data_ver)
 
 # -------------------------------
-# Agent Setup
+# Agent Setup (fallback when the lookup can't resolve a target)
 # -------------------------------
-toolkit = SQLDatabaseToolkit(db=db, llm=llm)
-sql_agent = create_sql_agent(
-    llm=llm,
-    toolkit=toolkit,
-    verbose=True,
-    agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION
-)
+# Built on first use only; LangChain's agent stack is not imported until then. The
+# system prompt and manager catalog form the agent's fixed prompt prefix.
+@st.cache_resource(ttl="2h")
+def get_sql_agent(_engine, _catalog, _catalog_text, db_identity, data_ver, api_key, model_name):
+    db = schema_catalog.sql_database(_engine, _catalog, router=get_router(_engine, db_identity))
+    agent = agent_factory.sql_agent(db, get_llm(api_key, model_name), prefix=system_prompt + _catalog_text,
+                                    verbose=True, agent_executor_kwargs={"return_intermediate_steps": True})
+    return agent, prompt_budget.attach(agent, model_name)
+
+# Agent runs from every session share one bounded worker pool (agent_pool.py)
+@st.cache_resource
+def get_pool():
+    return agent_pool.AgentPool("agent-3")
+
+# Fallback-agent reads go to AGENT_READ_URL / AGENT_READ_SNAPSHOT when set (engine_router.py);
+# the bundled SQLite file is already read-only, so only MySQL is routed
+@st.cache_resource(ttl="2h")
+def get_router(_engine, db_identity):
+    return engine_router.from_env(_engine, "agent-3") if db_uri == MYSQL else None
 
 # -------------------------------
 # System Prompt with Hierarchy
@@ -103,31 +149,124 @@ Steps:
    - Sender name and role
    - Issue description
    - State (if applicable)
+
+Manager tables (schema already loaded; do not call sql_db_list_tables or sql_db_schema):
 """
 
+profiling.serve_metrics_from_env()
+# Time from script start to a ready UI: cold start vs reruns with cached resources
+startup = profiling.record_script_run("agent-3", time.perf_counter() - _script_start)
+with st.sidebar.expander("🚀 Startup"):
+    st.write(startup)
+with st.sidebar.expander("⏱️ Slowest steps"):
+    slow_steps = profiling.slowest(limit=10, app="agent-3")
+    if slow_steps:
+        st.dataframe(slow_steps, use_container_width=True)
+    else:
+        st.caption("No profiled requests yet.")
+with st.sidebar.expander("🧵 Agent pool"):
+    st.write(get_pool().stats())
+router = get_router(engine, db_identity)
+if router is not None:
+    with st.sidebar.expander("🔀 Read routing"):
+        st.write(router.freshness())
+        st.dataframe(router.stats(), use_container_width=True)
+
 # -------------------------------
 # User Input Form
 # -------------------------------
 with st.form("hr_escalation_form"):
     user_name = st.text_input("Your Name")
-    user_role = st.selectbox(
-        "Your Role",
-        ["Category Manager", "Segment Manager", "Regional Manager", "State Manager", "Customer"]
-    )
+    user_role = st.selectbox("Your Role", ROLES)
     user_state = st.text_input("Your State (if applicable)")
+    user_segment = st.selectbox("Segment (Regional Managers)", ["", "Consumer", "Corporate", "Home Office"])
+    user_category = st.selectbox("Category (Segment Managers)", ["", "Furniture", "Office Supplies", "Technology"])
     issue_desc = st.text_area("Describe the issue to escalate")
     submitted = st.form_submit_button("Submit Issue")
 
+# -------------------------------
+# Batch Escalation (CSV)
+# -------------------------------
+with st.expander("📦 Batch escalation (CSV)"):
+    st.caption("Columns: " + ", ".join(BATCH_COLUMNS) + " (optional: segment, category)")
+    batch_file = st.file_uploader("Escalations CSV", type="csv")
+    batch_workers = st.slider("Parallel LLM calls", 1, 16, DEFAULT_BATCH_WORKERS)
+    run_batch = st.button("Run batch", disabled=batch_file is None)
+
+if run_batch:
+    batch = pd.read_csv(batch_file, dtype=str).fillna("")
+    batch.columns = [c.strip().lower() for c in batch.columns]
+    missing = [c for c in BATCH_COLUMNS if c not in batch.columns]
+    if missing:
+        st.error(f"Missing columns: {', '.join(missing)}")
+        st.stop()
+    if batch.empty:
+        st.warning("The CSV has no rows.")
+        st.stop()
+
+    progress = st.progress(0.0)
+    live_table = st.empty()
+    results, last_draw = [], 0.0
+    start = time.perf_counter()
+    # Results arrive as each distinct (target, issue) email is drafted
+    for done, item in enumerate(escalate_batch(batch.to_dict("records"), escalation_index, get_llm(api_key, MODEL_NAME),
+                                               workers=batch_workers), 1):
+        results.append(item.as_dict())
+        progress.progress(done / len(batch), text=f"{done}/{len(batch)} escalations")
+        if time.perf_counter() - last_draw > 0.25 or done == len(batch):
+            live_table.dataframe(pd.DataFrame(results)[["row", "name", "target_role", "target_name", "status"]],
+                                 use_container_width=True)
+            last_draw = time.perf_counter()
+    elapsed = time.perf_counter() - start
+
+    out = pd.DataFrame(results).sort_values("row")
+    emails = out.loc[out["status"] == "ok", "email"].nunique()
+    st.session_state.batch_result = {
+        "csv": out.to_csv(index=False),
+        "summary": (f"{len(out)} escalations in {elapsed:.1f} s ({len(out) / elapsed:.1f} rows/s); "
+                    f"{emails} distinct emails drafted ({emails / elapsed:.2f}/s), "
+                    f"{(out['status'] == 'unresolved').sum()} unresolved, {(out['status'] == 'failed').sum()} failed"),
+    }
+
+if st.session_state.get("batch_result"):
+    st.success(st.session_state.batch_result["summary"])
+    st.download_button("⬇️ Download escalations", st.session_state.batch_result["csv"],
+                       file_name="escalations.csv", mime="text/csv")
+
 # -------------------------------
 # Process Escalation
 # -------------------------------
 if submitted:
     st.write(f"📌 Thank you {user_name}, processing your escalation...")
 
-    # Create structured query for the agent
-    user_query = f"""
-    SYSTEM PROMPT: {system_prompt}
+    profiler = profiling.ProfilingHandler("agent-3", issue_desc)
+    start = time.perf_counter()
+    try:
+        target = escalation_index.resolve(user_role, state=user_state, segment=user_segment,
+                                          category=user_category)
+    except EscalationError as e:
+        target = None
+        st.warning(f"{e}; falling back to the SQL agent.")
+    resolve_us = (time.perf_counter() - start) * 1e6
+    profiler.record("tool", "resolve_escalation", round(resolve_us / 1000, 3),
+                    input=f"{user_role} / {user_state}", resolved=target is not None)
+
+    if target is not None:
+        # Only the email needs the model: one call, no tool loop
+        prompt = email_prompt(target, user_name, user_role, user_state, issue_desc)
+        try:
+            email = get_llm(api_key, MODEL_NAME).invoke(prompt, config={"callbacks": [profiler]}).content
+        finally:
+            profiler.flush()
+        st.subheader("📌 Escalation Recommendation")
+        st.write(f"{target.recommendation} ({target.reason})")
+        st.subheader("✉️ Escalation Email")
+        st.write(email)
+        st.caption(f"Target resolved in {resolve_us:.0f} µs; total {time.perf_counter() - start:.2f} s")
+        st.stop()
 
+    # Only the per-request details go in the input; the system prompt is the agent's prefix
+    user_query = f"""
     User Details:
     - Name: {user_name}
     - Role: {user_role}
@@ -141,7 +280,34 @@ if submitted:
     """
 
     # Run SQL Agent with LLM reasoning
-    response = sql_agent.run(user_query)
+    sql_agent, budget = get_sql_agent(engine, catalog, catalog_text, db_identity, data_ver, api_key, MODEL_NAME)
+    agent_input, turn = prompt_budget.fit_input(user_query)
+    try:
+        job = get_pool().submit(agent_pool.session_user(),
+                                agent_runner.AgentJob(sql_agent, {"input": agent_input}, engine=engine,
+                                                      callbacks=[profiler]))
+    except agent_pool.PoolFull as e:
+        st.warning(f"⏳ {e}. Please try again shortly.")
+        st.stop()
+    status = st.empty()
+
+    def show(job):
+        position = get_pool().position(job)
+        status.caption(f"⏳ {job.status}" + (f" (#{position} in line)" if position else "")
+                       + f" · {time.perf_counter() - job.started:.1f} s")
+
+    result = None
+    try:
+        agent_pool.follow(job, show)
+        result = job.result
+    finally:
+        turn = budget.report(turn, result and result.get("intermediate_steps")).add_usage(profiler.spans)
+        profiler.flush(queue_wait_ms=round((job.wait_seconds or 0) * 1000, 1), **asdict(turn))
+    status.empty()
+    if job.error is not None:
+        raise job.error
 
     st.subheader("📌 Escalation Recommendation")
-    st.write(response)
+    st.write(result["output"])
+    st.caption(f"Tokens: prefix {turn.prefix_tokens}, input {turn.input_tokens}, {turn.llm_calls} LLM calls, "
+               f"{turn.prompt_tokens} prompt / {turn.completion_tokens} completion")
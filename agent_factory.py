@@ -0,0 +1,41 @@
+# ==============================
+# LLM / agent construction with deferred imports
+# ==============================
+# LangChain and the Groq client are imported on first use, not when an app script
+# starts, so reruns that reuse a cached agent never pay for them. The apps wrap these
+# in st.cache_resource keyed on (db identity, data version, model, temperature, key).
+DEFAULT_MODEL = "Llama3-8b-8192"
+
+
+def groq_llm(api_key: str | None = None, model_name: str = DEFAULT_MODEL, temperature: float | None = None,
+             streaming: bool = False):
+    from langchain_groq import ChatGroq
+
+    kwargs = {"model_name": model_name, "streaming": streaming}
+    if api_key:
+        kwargs["groq_api_key"] = api_key
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    return ChatGroq(**kwargs)
+
+
+def sql_agent(db, llm, prefix: str | None = None, **kwargs):
+    """A ZERO_SHOT_REACT_DESCRIPTION SQL agent over `db`, as all three apps build it.
+
+    `prefix` replaces LangChain's default system text; it is placed before the tool
+    descriptions, so it stays identical across requests (see prompt_budget.py).
+    """
+    from langchain.agents import create_sql_agent
+    from langchain.agents.agent_toolkits import SQLDatabaseToolkit
+    from langchain.agents.agent_types import AgentType
+
+    if prefix is not None:
+        from prompt_budget import escape_template
+        kwargs["prefix"] = escape_template(prefix)
+    return create_sql_agent(
+        llm=llm,
+        toolkit=SQLDatabaseToolkit(db=db, llm=llm),
+        agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        **kwargs,
+    )
+
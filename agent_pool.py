@@ -0,0 +1,197 @@
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import profiling
+
+# ==============================
+# Shared worker pool for agent runs
+# ==============================
+# Each app process owns one AgentPool (st.cache_resource). Sessions submit jobs and
+# return at once; a fixed set of workers runs them in arrival order, so concurrent
+# users queue for a bounded number of agent runs instead of all hitting Groq and the
+# database at the same time. Admission is checked on submit: at most PER_USER jobs
+# queued or running per user, and at most MAX_QUEUE waiting in total.
+#
+# Agent jobs (agent_runner.AgentJob) hold a live LLM client and database engine, so
+# they always run on worker threads; MODE=process applies to CallJobs, plain
+# picklable function calls that are shipped to a process pool.
+WORKERS = int(os.getenv("AGENT_POOL_WORKERS", 4))
+MODE = os.getenv("AGENT_POOL_MODE", "thread")  # thread | process
+PER_USER = int(os.getenv("AGENT_POOL_PER_USER", 2))
+MAX_QUEUE = int(os.getenv("AGENT_POOL_MAX_QUEUE", 32))
+USER_HEADER = os.getenv("AGENT_POOL_USER_HEADER")  # e.g. X-Forwarded-User behind an auth proxy
+WAIT_HISTORY = 500
+
+
+class PoolFull(RuntimeError):
+    pass
+
+
+class UserLimitReached(PoolFull):
+    pass
+
+
+class CallJob:
+    """fn(*args) as a pool job; same status/wait/result surface as AgentJob, without streaming."""
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.result = None
+        self.error: Exception | None = None
+        self.started = time.perf_counter()
+        self.run_started: float | None = None
+        self.seconds: float | None = None
+        self.executor = None  # set by the pool in process mode
+
+    @property
+    def wait_seconds(self) -> float | None:
+        return None if self.run_started is None else self.run_started - self.started
+
+    @property
+    def status(self) -> str:
+        if not self.finished.is_set():
+            return "running" if self.run_started is not None else "queued"
+        if self.cancelled.is_set():
+            return "cancelled"
+        return "failed" if self.error else "done"
+
+    def cancel(self):
+        """Drop the job if it has not started; a running call finishes."""
+        self.cancelled.set()
+
+    def run(self):
+        if not self.cancelled.is_set():
+            self.run_started = time.perf_counter()
+            try:
+                if self.executor is not None:
+                    self.result = self.executor.submit(self.fn, *self.args).result()
+                else:
+                    self.result = self.fn(*self.args)
+            except Exception as e:
+                self.error = e
+        self.seconds = time.perf_counter() - self.started
+        self.finished.set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self.finished.wait(timeout)
+
+
+class AgentPool:
+    """Bounded worker pool with per-user admission and queue metrics."""
+
+    def __init__(self, app: str = "", workers: int = WORKERS, mode: str = MODE,
+                 per_user: int = PER_USER, max_queue: int = MAX_QUEUE):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"mode must be 'thread' or 'process', not {mode!r}")
+        self.app = app
+        self.workers = workers
+        self.mode = mode
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self._threads = ThreadPoolExecutor(workers, thread_name_prefix=f"agent-pool-{app}")
+        self._processes = ProcessPoolExecutor(workers) if mode == "process" else None
+        self._lock = threading.Lock()
+        self._active = defaultdict(int)  # user -> queued + running jobs
+        self._queue: deque = deque()  # jobs not yet picked up, oldest first
+        self.running = 0
+        self.waits: deque[float] = deque(maxlen=WAIT_HISTORY)
+        self.counts = {"submitted": 0, "completed": 0, "rejected_user": 0, "rejected_full": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def submit(self, user: str, job):
+        """Queue `job` (AgentJob or CallJob) for `user` and return it without waiting."""
+        with self._lock:
+            if self._active.get(user, 0) >= self.per_user:
+                self.counts["rejected_user"] += 1
+                raise UserLimitReached(f"{self._active[user]} request(s) already in progress "
+                                       f"(limit {self.per_user} per user)")
+            if len(self._queue) >= self.max_queue:
+                self.counts["rejected_full"] += 1
+                raise PoolFull(f"Server busy: {len(self._queue)} requests waiting")
+            self._active[user] += 1
+            self._queue.append(job)
+            self.counts["submitted"] += 1
+        if isinstance(job, CallJob) and self._processes is not None:
+            job.executor = self._processes
+        job.started = time.perf_counter()
+        self._publish()
+        self._threads.submit(self._work, user, job)
+        return job
+
+    def position(self, job) -> int | None:
+        """1-based place of `job` in the queue, or None once a worker has it."""
+        with self._lock:
+            try:
+                return self._queue.index(job) + 1
+            except ValueError:
+                return None
+
+    def _work(self, user: str, job):
+        wait = time.perf_counter() - job.started
+        with self._lock:
+            self._queue.remove(job)
+            self.running += 1
+            self.waits.append(wait)
+        profiling.METRICS.observe([{"app": self.app, "kind": "queue", "name": "wait", "ms": wait * 1000}])
+        self._publish()
+        try:
+            job.run()
+        finally:
+            with self._lock:
+                self.running -= 1
+                self._active[user] -= 1
+                if not self._active[user]:
+                    del self._active[user]
+                self.counts["completed"] += 1
+            self._publish()
+
+    def _publish(self):
+        profiling.METRICS.set_gauge("agent_pool_queued", self.app, self.queued)
+        profiling.METRICS.set_gauge("agent_pool_running", self.app, self.running)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = sorted(self.waits)
+            return {
+                "mode": self.mode, "workers": self.workers, "per_user": self.per_user,
+                "queued": len(self._queue), "running": self.running, "users": len(self._active),
+                **self.counts,
+                "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 1) if waits else None,
+                "wait_p95_ms": round(waits[min(int(len(waits) * 0.95), len(waits) - 1)] * 1000, 1)
+                if waits else None,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._threads.shutdown(wait=wait)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait)
+
+
+def follow(job, on_update, poll_seconds: float = 0.05):
+    """Call `on_update(job)` every `poll_seconds` until `job` finishes, then once more."""
+    while not job.finished.wait(poll_seconds):
+        on_update(job)
+    on_update(job)
+    return job
+
+
+def session_user() -> str:
+    """Who the per-user limit applies to: USER_HEADER if set and present, else the browser session."""
+    import streamlit as st
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+    if USER_HEADER:
+        headers = getattr(getattr(st, "context", None), "headers", None) or {}
+        if headers.get(USER_HEADER):
+            return headers[USER_HEADER]
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
@@ -0,0 +1,181 @@
+import functools
+import threading
+import time
+
+from sqlalchemy import event
+
+import sql_guard
+
+# ==============================
+# Background agent runs with streaming and cancel
+# ==============================
+# An AgentJob runs one agent invocation on its own thread, or on a worker of an
+# agent_pool.AgentPool. A callback handler copies tokens and tool steps onto the job
+# as they happen, so any Streamlit rerun can redraw the progress so far; cancel()
+# stops the chain at its next callback and interrupts the SQL statement it is waiting on.
+FINAL_ANSWER = "Final Answer:"
+POLL_SECONDS = 0.05
+MAX_OBSERVATION_CHARS = 2000
+
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    job = getattr(_local, "job", None)
+    if job is not None:
+        job._sql_connection = conn.connection.dbapi_connection
+        job._sql_engine = conn.engine
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    job = getattr(_local, "job", None)
+    if job is not None:
+        job._sql_connection = None
+
+
+def watch_sql(engine):
+    """Let jobs see which DB-API connection their SQL is running on (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_execute):
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        event.listen(engine, "after_cursor_execute", _after_execute)
+    return engine
+
+
+@functools.cache
+def _stream_handler_class():
+    """_StreamHandler, defined on first use so that importing this module does not load LangChain."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class _StreamHandler(BaseCallbackHandler):
+        raise_error = True  # JobCancelled must abort the chain, not be logged and swallowed
+
+        def __init__(self, job: "AgentJob"):
+            self.job = job
+            self._buffer = ""
+
+        def _check(self):
+            if self.job.cancelled.is_set():
+                raise JobCancelled()
+
+        def on_llm_start(self, *args, **kwargs):
+            self._check()
+            self._buffer = ""
+
+        def on_chat_model_start(self, *args, **kwargs):
+            self.on_llm_start()
+
+        def on_llm_new_token(self, token: str, **kwargs):
+            self._check()
+            before = self._buffer
+            self._buffer += token
+            with self.job.lock:
+                if FINAL_ANSWER in self._buffer:
+                    answer = self._buffer.split(FINAL_ANSWER, 1)[1].lstrip()
+                    self.job.answer = answer
+                    self.job.thoughts += token if FINAL_ANSWER not in before else ""
+                else:
+                    self.job.thoughts += token
+                self.job._first_output()
+
+        def on_agent_action(self, action, **kwargs):
+            self._check()
+            with self.job.lock:
+                self.job.steps.append({"tool": action.tool, "input": str(action.tool_input), "output": None})
+                self.job.thoughts += "\n\n"
+                self.job._first_output()
+
+        def on_tool_start(self, *args, **kwargs):
+            self._check()
+
+        def on_tool_end(self, output, **kwargs):
+            with self.job.lock:
+                if self.job.steps and self.job.steps[-1]["output"] is None:
+                    self.job.steps[-1]["output"] = str(output)[:MAX_OBSERVATION_CHARS]
+
+    return _StreamHandler
+
+
+class AgentJob:
+    """One agent.invoke() on a background thread, observable while it runs."""
+
+    def __init__(self, agent, inputs: dict, engine=None, callbacks=()):
+        self.agent = agent
+        self.inputs = inputs
+        self.engine = watch_sql(engine) if engine is not None else None
+        self.callbacks = [_stream_handler_class()(self), *callbacks]
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+        self.thoughts = ""
+        self.answer = ""
+        self.steps: list[dict] = []
+        self.result = None
+        self.error: Exception | None = None
+        self.started = time.perf_counter()  # submission; timings below include any queue wait
+        self.run_started: float | None = None
+        self.first_output_seconds: float | None = None
+        self.seconds: float | None = None
+        self._sql_connection = None
+        self._sql_engine = self.engine
+
+    def start(self) -> "AgentJob":
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    @property
+    def wait_seconds(self) -> float | None:
+        """Time spent queued before a worker picked the job up."""
+        return None if self.run_started is None else self.run_started - self.started
+
+    def _first_output(self):
+        if self.first_output_seconds is None:
+            self.first_output_seconds = time.perf_counter() - self.started
+
+    def run(self):
+        """Run the agent on the calling thread (skipped if cancelled while queued)."""
+        if self.cancelled.is_set():
+            self.seconds = time.perf_counter() - self.started
+            self.finished.set()
+            return
+        self.run_started = time.perf_counter()
+        _local.job = self
+        try:
+            self.result = self.agent.invoke(self.inputs, {"callbacks": self.callbacks})
+            with self.lock:
+                self.answer = self.result.get("output", self.answer)
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.error = e
+        finally:
+            _local.job = None
+            self.seconds = time.perf_counter() - self.started
+            self.finished.set()
+
+    @property
+    def status(self) -> str:
+        if not self.finished.is_set():
+            if self.cancelled.is_set():
+                return "cancelling"
+            return "running" if self.run_started is not None else "queued"
+        if self.cancelled.is_set():
+            return "cancelled"
+        return "failed" if self.error else "done"
+
+    def cancel(self):
+        """Stop at the next callback and interrupt the statement in flight, if any."""
+        self.cancelled.set()
+        conn = self._sql_connection
+        if conn is not None and self._sql_engine is not None:
+            sql_guard.interrupt(self._sql_engine, conn)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"thoughts": self.thoughts, "answer": self.answer,
+                    "steps": [dict(s) for s in self.steps], "status": self.status}
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self.finished.wait(timeout)
@@ -0,0 +1,73 @@
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import SimpleChatModel
+
+# ==============================
+# Scripted stand-in for ChatGroq
+# ==============================
+# Replays a fixed ReAct transcript, one response per model call, so the agent
+# loops can be timed without network access or API keys. `latency` simulates the
+# provider round trip.
+
+
+def react_step(tool: str, tool_input: str, thought: str = "I should query the database.") -> str:
+    return f"Thought: {thought}\nAction: {tool}\nAction Input: {tool_input}"
+
+
+def final_answer(answer: str) -> str:
+    return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+
+
+class ScriptedChatGroq(SimpleChatModel):
+    """Chat model that returns `responses` in order, restarting after the last one."""
+
+    responses: list[str]
+    latency: float = 0.0
+    calls: int = 0
+    prompt_chars: int = 0
+    i: int = 0
+
+    @classmethod
+    def from_steps(cls, steps: list[tuple[str, str]], answer: str, latency: float = 0.0):
+        """A transcript that calls each (tool, input) in turn, then answers."""
+        responses = [react_step(tool, tool_input) for tool, tool_input in steps]
+        return cls(responses=responses + [final_answer(answer)], latency=latency)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat-groq"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs: Any) -> str:
+        self.calls += 1
+        self.prompt_chars += sum(len(str(m.content)) for m in messages)
+        if self.latency:
+            time.sleep(self.latency)
+        response = self.responses[self.i]
+        self.i = (self.i + 1) % len(self.responses)
+        return response
+
+    def reset(self):
+        self.i = self.calls = self.prompt_chars = 0
+
+
+class ExampleAwareChatGroq(ScriptedChatGroq):
+    """Replays `cold` (wrong guesses before the working query) unless the prompt already
+    shows `sql`, the working query, as a few-shot example; then replays `warm`."""
+
+    cold: list[str]
+    warm: list[str]
+    sql: str
+
+    @classmethod
+    def for_query(cls, sql: str, wrong_sql: str, answer: str, latency: float = 0.0):
+        cold = [react_step("sql_db_query", wrong_sql), react_step("sql_db_schema", "orders"),
+                react_step("sql_db_query", sql), final_answer(answer)]
+        warm = [react_step("sql_db_query", sql), final_answer(answer)]
+        return cls(responses=cold, cold=cold, warm=warm, sql=sql, latency=latency)
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs: Any) -> str:
+        if self.i == 0:
+            prompt = " ".join(str(m.content) for m in messages)
+            self.responses = self.warm if self.sql in prompt else self.cold
+        return super()._call(messages, stop, run_manager, **kwargs)
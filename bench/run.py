@@ -0,0 +1,484 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+import agent_factory
+import agent_pool
+import agent_runner
+import index_advisor
+import ingestion
+import intent_router
+import prompt_budget
+import schema_catalog
+import sql_examples
+from escalation import EscalationIndex, email_prompt
+from orders_store import OrdersStore, ReadCache, sqlite_pool
+from query_cache import QueryCache
+
+from bench import synthetic
+from bench.fake_llm import ExampleAwareChatGroq, ScriptedChatGroq
+
+# ==============================
+# Offline benchmarks
+# ==============================
+# python -m bench.run --rows 100000 --suites ingestion,crud,agents --compare bench/results/<old>.json
+RESULTS_DIR = Path(__file__).parent / "results"
+SUITES = ("ingestion", "crud", "agents", "pool", "examples")
+REGRESSION_THRESHOLD = 0.20  # p95 more than 20% slower than the baseline
+
+
+def quiet(*args, **kwargs):
+    pass
+
+
+@dataclass
+class BenchResult:
+    name: str
+    latencies: list = field(default_factory=list)  # seconds per operation
+    units: int = 1  # rows / requests handled by one operation
+    extra: dict = field(default_factory=dict)  # suite-specific figures reported alongside
+
+    def summary(self) -> dict:
+        ordered = sorted(self.latencies)
+        total = sum(ordered)
+        return {
+            "count": len(ordered),
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p95_ms": percentile(ordered, 95) * 1000,
+            "mean_ms": total / len(ordered) * 1000,
+            "throughput_per_s": len(ordered) * self.units / total if total else 0.0,
+            "units_per_op": self.units,
+            **self.extra,
+        }
+
+
+def percentile(ordered: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(int(round(q / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def timed(name: str, fn, repeat: int, units: int = 1) -> BenchResult:
+    result = BenchResult(name, units=units)
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        result.latencies.append(time.perf_counter() - start)
+    return result
+
+
+# ==============================
+# Suites
+# ==============================
+def bench_ingestion(workdir: Path, args) -> list[BenchResult]:
+    """The four data-ingestion.py modes, each into a fresh SQLite file."""
+    workbook = workdir / "store.xlsx"
+    counts = synthetic.write_workbook(workbook, rows=min(args.rows, args.excel_rows), seed=args.seed)
+    rows = sum(counts.values())
+    target = workdir / "ingest.db"
+
+    def fresh_engine():
+        target.unlink(missing_ok=True)
+        return create_engine(f"sqlite:///{target}")
+
+    def replace():
+        engine, xls = fresh_engine(), pd.ExcelFile(workbook)
+        for sheet in xls.sheet_names:
+            xls.parse(sheet).to_sql(sheet, con=engine, if_exists="replace", index=False)
+
+    def bulk():
+        ingestion.bulk_load(pd.ExcelFile(workbook), fresh_engine(), chunksize=args.chunksize, report=quiet)
+
+    def incremental():
+        ingestion.incremental_load(pd.ExcelFile(workbook), fresh_engine(), chunksize=args.chunksize,
+                                   report=quiet)
+
+    def incremental_unchanged():
+        ingestion.incremental_load(pd.ExcelFile(workbook), create_engine(f"sqlite:///{target}"),
+                                   report=quiet)
+
+    def stream():
+        ingestion.stream_load(str(workbook), fresh_engine(), report=quiet)
+
+    repeat = args.ingest_repeat
+    return [
+        timed("ingest.replace", replace, repeat, rows),
+        timed("ingest.bulk", bulk, repeat, rows),
+        timed("ingest.incremental", incremental, repeat, rows),
+        timed("ingest.incremental_unchanged", incremental_unchanged, repeat, rows),
+        timed("ingest.stream", stream, repeat, rows),
+    ]
+
+
+def bench_crud(db_path: Path, args) -> list[BenchResult]:
+    """The agent-2.py CRUD operations, through the same OrdersStore the app uses.
+
+    crud.* reads run their query every time (read cache disabled), so they stay
+    comparable with baselines from before the cache; crud.cached.* are the same
+    reads served by a warm cache.
+    """
+    store = OrdersStore(sqlite_pool(str(db_path)))
+    store.cache = ReadCache(size=0)
+    cached = OrdersStore(sqlite_pool(str(db_path)))
+    rng = random.Random(args.seed)
+    customers = [r["Customer_ID"] for r in store.query("ids", "SELECT DISTINCT Customer_ID FROM orders_2")]
+    batch = synthetic.orders_2_frame(np.random.default_rng(args.seed), 1000, 1000)
+    n = args.repeat
+    return [
+        timed("crud.get_undelivered_orders", store.get_undelivered_orders, n),
+        timed("crud.get_orders", store.get_orders, max(n // 10, 3)),
+        timed("crud.list_orders", lambda: store.list_orders(delivered="NO"), n),
+        timed("crud.list_orders_search", lambda: store.list_orders(search=rng.choice(customers)[:5]), n),
+        timed("crud.cached.get_undelivered_orders", cached.get_undelivered_orders, n),
+        timed("crud.cached.list_orders", lambda: cached.list_orders(delivered="NO"), n),
+        timed("crud.insert_order", lambda: store.insert_order(
+            "Bench User", "C-99999", "Consumer", "United States", "Ohio", "43004", "East",
+            "Technology", "Product 0001", 3), n),
+        timed("crud.update_order", lambda: store.update_order(rng.choice(customers), "Product 0002", 4), n),
+        timed("crud.mark_delivered", lambda: store.mark_delivered(rng.choice(customers)), n),
+        timed("crud.insert_orders_1000", lambda: store.insert_orders(batch), max(n // 10, 3), len(batch)),
+    ]
+
+
+def _sql_agent(db, llm):
+    return agent_factory.sql_agent(db, llm, handle_parsing_errors=True,
+                                   agent_executor_kwargs={"return_intermediate_steps": True})
+
+
+def _import_seconds(module: str) -> float:
+    """Cold import time of `module` in a fresh interpreter."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True,
+                         check=True, cwd=Path(__file__).parent.parent)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def bench_agents(db_path: Path, workdir: Path, args) -> list[BenchResult]:
+    """The agent loops of agent-1.py, agent-2-new.py and agent-3.py against a scripted model."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    identity = f"sqlite://{db_path.name}"
+    catalog = schema_catalog.load_catalog(engine, identity, directory=workdir / "catalog")
+    db = schema_catalog.sql_database(engine, catalog)
+    catalog_text = schema_catalog.render(catalog)
+    n, latency = args.agent_repeat, args.llm_latency
+    results = []
+
+    def run(agent, llm, question):
+        def call():
+            llm.reset()
+            agent.invoke({"input": question})
+        return call
+
+    # ---- startup: what an uncached rerun used to pay on every widget interaction
+    results.append(BenchResult("startup.import_langchain_agents",
+                               [_import_seconds("langchain.agents") for _ in range(3)]))
+    results.append(timed("startup.build_sql_agent",
+                         lambda: _sql_agent(schema_catalog.sql_database(engine, catalog),
+                                            ScriptedChatGroq(responses=["-"])), max(n, 3)))
+
+    # ---- agent-1: analytics question, one query, answer cached afterwards
+    llm = ScriptedChatGroq.from_steps(
+        [("sql_db_query", "SELECT Region, ROUND(SUM(Sales), 2) FROM orders GROUP BY Region")],
+        "Sales by region listed above.", latency)
+    question = "What are total sales by region?"
+    results.append(timed("agent1.sql_agent", run(_sql_agent(db, llm), llm, catalog_text + question), n))
+    cache = QueryCache(workdir / "cache.sqlite")
+    cache.put(question, identity, catalog["version"], None, "Sales by region listed above.")
+    results.append(timed("agent1.cache_hit", lambda: cache.get(question, identity, catalog["version"]),
+                         args.repeat))
+
+    # ---- agent-2-new: fast-path intent vs agent fallback
+    results.append(timed("agent2.fast_path_undelivered",
+                         lambda: intent_router.try_fast_path(engine, "Show all undelivered orders."),
+                         args.repeat))
+    orders_db = schema_catalog.sql_database(
+        engine, {**catalog, "tables": {"orders_2": catalog["tables"]["orders_2"]}})
+    llm = ScriptedChatGroq.from_steps(
+        [("sql_db_query", "SELECT COUNT(*) FROM orders_2 WHERE Delivered = 'YES' "
+                          "AND Purchase_Date >= date('now', '-30 day')")],
+        "Delivered in the last 30 days: see count.", latency)
+    results.append(timed("agent2.sql_agent", run(_sql_agent(orders_db, llm), llm,
+                                                 "How many orders were delivered in the last 30 days?"), n))
+
+    # ---- agent-3: in-memory resolver + one email call vs the SQL agent
+    index = EscalationIndex.load(engine)
+    results.append(timed("agent3.index_load", lambda: EscalationIndex.load(engine), max(n, 3)))
+    email_llm = ScriptedChatGroq(responses=["Dear manager, ..."], latency=latency)
+
+    def resolve_and_email():
+        target = index.resolve("State Manager", state="Texas")
+        email_llm.invoke(email_prompt(target, "Bench User", "State Manager", "Texas", "Late deliveries"))
+
+    results.append(timed("agent3.resolve_and_email", resolve_and_email, args.repeat))
+    llm = ScriptedChatGroq.from_steps(
+        [("sql_db_query", "SELECT Region FROM state_managers WHERE State = 'Texas'"),
+         ("sql_db_query", "SELECT Manager FROM regional_managers WHERE Region = 'Central'")],
+        "Escalate this issue to [Regional Manager: ...]", latency)
+    results.append(timed("agent3.sql_agent", run(_sql_agent(db, llm), llm, catalog_text +
+                                                 "Escalate for a State Manager in Texas."), n))
+    return results
+
+
+_process_agents = {}
+
+
+def _fake_agent_run(db_path: str, catalog_dir: str, latency: float, question: str) -> str:
+    """One scripted agent run; module-level so process-pool workers can unpickle it."""
+    if db_path not in _process_agents:
+        engine = create_engine(f"sqlite:///{db_path}")
+        catalog = schema_catalog.load_catalog(engine, f"sqlite://{Path(db_path).name}", directory=Path(catalog_dir),
+                                              include_tables=["orders_2"])
+        llm = ScriptedChatGroq.from_steps([("sql_db_query", "SELECT COUNT(*) FROM orders_2")],
+                                          "Counted.", latency)
+        _process_agents[db_path] = (_sql_agent(schema_catalog.sql_database(engine, catalog), llm), llm)
+    agent, llm = _process_agents[db_path]
+    llm.reset()
+    return agent.invoke({"input": question})["output"]
+
+
+def bench_pool(db_path: Path, workdir: Path, args) -> list[BenchResult]:
+    """Concurrent users sharing one AgentPool: end-to-end latency and queue wait per request."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    catalog = schema_catalog.load_catalog(engine, f"sqlite://{db_path.name}", directory=workdir / "catalog",
+                                          include_tables=["orders_2"])
+    users, workers, latency = args.pool_users, args.pool_workers, args.llm_latency
+    per_user = max(args.agent_repeat // users, 1)
+    results = []
+
+    def drive(pool, make_job, name):
+        latencies, waits, lock = [], [], threading.Lock()
+
+        def user(u):
+            for _ in range(per_user):
+                job = pool.submit(f"user-{u}", make_job(u))
+                job.wait()
+                if job.error is not None:
+                    raise job.error
+                with lock:
+                    latencies.append(job.seconds)
+                    waits.append(job.wait_seconds)
+
+        threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        results.append(BenchResult(f"pool.{name}_request", latencies))
+        results.append(BenchResult(f"pool.{name}_queue_wait", waits))
+
+    # thread mode: the apps' AgentJobs; one scripted model per user, since a transcript is stateful
+    agents = []
+    for _ in range(users):
+        llm = ScriptedChatGroq.from_steps([("sql_db_query", "SELECT COUNT(*) FROM orders_2")], "Counted.", latency)
+        agents.append(_sql_agent(schema_catalog.sql_database(engine, catalog), llm))
+    pool = agent_pool.AgentPool("bench", workers=workers, mode="thread", per_user=1)
+    drive(pool, lambda u: agent_runner.AgentJob(agents[u], {"input": "How many orders?"}, engine=engine), "thread")
+    pool.shutdown()
+
+    # process mode: picklable calls, each worker process builds its own agent once
+    pool = agent_pool.AgentPool("bench", workers=workers, mode="process", per_user=1)
+    drive(pool, lambda u: agent_pool.CallJob(_fake_agent_run, str(db_path), str(workdir / "catalog"), latency,
+                                             "How many orders?"), "process")
+    pool.shutdown()
+    return results
+
+
+# Question families: paraphrases, the query that answers them and a plausible wrong first guess
+EXAMPLE_FAMILIES = [
+    (["What are total sales by region?", "Show sales totals for each region",
+      "Which region has the highest total sales?", "Total revenue per region"],
+     "SELECT Region, ROUND(SUM(Sales), 2) FROM orders GROUP BY Region",
+     "SELECT region_name, SUM(sales_amount) FROM orders GROUP BY region_name"),
+    (["How many orders were returned?", "Count the returned orders",
+      "Number of orders that got returned", "How many returns are there in total?"],
+     "SELECT COUNT(*) FROM returns WHERE Returned = 'Yes'",
+     "SELECT COUNT(*) FROM orders WHERE Returned = 'Yes'"),
+    (["What is the profit by category?", "Show total profit for each product category",
+      "Which category is most profitable?", "Profit per category"],
+     "SELECT Category, ROUND(SUM(Profit), 2) FROM orders GROUP BY Category",
+     "SELECT product_category, SUM(profit) FROM orders GROUP BY product_category"),
+    (["How many orders are not delivered yet?", "Count undelivered orders in orders_2",
+      "Number of orders still waiting for delivery", "How many orders_2 rows have Delivered = NO?"],
+     "SELECT COUNT(*) FROM orders_2 WHERE Delivered = 'NO'",
+     "SELECT COUNT(*) FROM orders_2 WHERE status = 'pending'"),
+    (["Who is the regional manager for the West?", "Name the manager of the West region",
+      "Which manager runs the West region?", "West region manager"],
+     "SELECT Manager FROM regional_managers WHERE Region = 'West'",
+     "SELECT name FROM managers WHERE region = 'West'"),
+]
+
+
+def bench_examples(db_path: Path, workdir: Path, args) -> list[BenchResult]:
+    """Retrieval recall of few-shot examples for paraphrased questions, and lookup time.
+
+    The first paraphrase of each family runs cold and, succeeding, seeds the index; the
+    others run without examples and then with the examples retrieved for them. Recall is
+    the share of those paraphrases whose family's SQL was retrieved, on the seeded index
+    and again on a full one. Steps and LLM calls are simulated: the scripted model skips
+    its wrong guesses exactly when the right query reached its prompt.
+    """
+    engine = create_engine(f"sqlite:///{db_path}")
+    identity = f"sqlite://{db_path.name}"
+    catalog = schema_catalog.load_catalog(engine, identity, directory=workdir / "catalog")
+    db = schema_catalog.sql_database(engine, catalog)
+    index = sql_examples.ExampleIndex(workdir / "examples.sqlite")
+    latency = args.llm_latency
+    runs = {"baseline": BenchResult("examples.agent_without"), "examples": BenchResult("examples.agent_with")}
+    counts = {name: {"steps": 0, "llm_calls": 0, "questions": 0} for name in runs}
+
+    def ask(agent, llm, question, name, examples=()):
+        agent_input, _ = prompt_budget.fit_input(question, examples=examples)
+        llm.reset()
+        start = time.perf_counter()
+        result = agent.invoke({"input": agent_input})
+        runs[name].latencies.append(time.perf_counter() - start)
+        counts[name]["steps"] += len(result["intermediate_steps"])
+        counts[name]["llm_calls"] += llm.calls
+        counts[name]["questions"] += 1
+        return result
+
+    def recall() -> float:
+        paraphrases = [(question, sql) for questions, sql, _ in EXAMPLE_FAMILIES for question in questions[1:]]
+        found = sum(any(e.sql == sql for e in index.search(question, identity)) for question, sql in paraphrases)
+        return found / len(paraphrases)
+
+    for questions, sql, wrong_sql in EXAMPLE_FAMILIES:
+        llm = ExampleAwareChatGroq.for_query(sql, wrong_sql, "See the query result.", latency)
+        agent = _sql_agent(db, llm)
+        first = ask(agent, llm, questions[0], "baseline")
+        index.add(questions[0], sql_examples.successful_sql(first["intermediate_steps"], first["output"]), identity)
+        for question in questions[1:]:
+            ask(agent, llm, question, "baseline")
+            ask(agent, llm, question, "examples", index.search(question, identity))
+
+    seeded_recall = recall()
+    print(f"examples: retrieval recall {seeded_recall:.0%} of paraphrases")
+    for name, result in runs.items():
+        c = counts[name]
+        result.extra = {"retrieval_recall": seeded_recall, "simulated_avg_steps": c["steps"] / c["questions"],
+                        "simulated_avg_llm_calls": c["llm_calls"] / c["questions"]}
+        print(f"examples: {name:8} {result.extra['simulated_avg_steps']:.2f} steps, "
+              f"{result.extra['simulated_avg_llm_calls']:.2f} LLM calls per question (simulated)")
+
+    # Lookup cost on a full index of distinct past questions over the schema's vocabulary
+    words = sorted({*(c["name"].lower() for meta in catalog["tables"].values() for c in meta["columns"]),
+                    *(s.lower() for s in synthetic.STATES), "total", "average", "top", "month", "year",
+                    "count", "highest", "lowest", "trend", "compare", "last", "per", "share"})
+    rng = random.Random(args.seed)
+    for i in range(sql_examples.DEFAULT_MAX_ENTRIES - index.stats()["entries"]):  # fill without evicting the seeds
+        index.add(" ".join(rng.sample(words, 5)) + f" {i}", "SELECT 1", identity)
+    lookup = timed("examples.search", lambda: index.search(rng.choice(EXAMPLE_FAMILIES)[0][-1], identity),
+                   args.repeat)
+    lookup.extra = {"retrieval_recall": recall()}
+    print(f"examples: retrieval recall {lookup.extra['retrieval_recall']:.0%} of paraphrases "
+          f"among {index.stats()['entries']} entries")
+    return [*runs.values(), lookup]
+
+
+# ==============================
+# Reports
+# ==============================
+def compare(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list[str]:
+    """Benchmarks whose p95 regressed by more than `threshold` against `baseline`."""
+    regressions = []
+    for key in ("rows", "llm_latency", "indexes"):
+        if current["meta"].get(key) != baseline["meta"].get(key):
+            print(f"Warning: baseline {key}={baseline['meta'].get(key)!r}, this run {current['meta'].get(key)!r}")
+    for name, now in current["results"].items():
+        before = baseline["results"].get(name)
+        if not before or not before["p95_ms"]:
+            continue
+        change = now["p95_ms"] / before["p95_ms"] - 1
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"{name:34} p95 {before['p95_ms']:10.2f} -> {now['p95_ms']:10.2f} ms ({change:+.0%}) {marker}")
+        if marker:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks on synthetic super_market data.")
+    parser.add_argument("--rows", type=int, default=10_000, help="Rows in the orders table (10k to 10M)")
+    parser.add_argument("--orders-2-rows", type=int, default=None, help="Rows in orders_2 (default rows/10)")
+    parser.add_argument("--excel-rows", type=int, default=20_000,
+                        help="Cap on orders rows written to the ingestion workbook")
+    parser.add_argument("--suites", default=",".join(SUITES), help="Comma-separated subset of " + ", ".join(SUITES))
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per CRUD / fast-path benchmark")
+    parser.add_argument("--agent-repeat", type=int, default=20, help="Iterations per agent benchmark")
+    parser.add_argument("--ingest-repeat", type=int, default=3, help="Iterations per ingestion mode")
+    parser.add_argument("--chunksize", type=int, default=ingestion.DEFAULT_CHUNKSIZE)
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Seconds the scripted model sleeps per call (simulates Groq)")
+    parser.add_argument("--pool-users", type=int, default=8, help="Concurrent users in the pool suite")
+    parser.add_argument("--pool-workers", type=int, default=agent_pool.WORKERS, help="Workers in the pool suite")
+    parser.add_argument("--indexes", action="store_true", help="Run the index advisor on the generated DB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="Keep generated files here instead of a temp dir")
+    parser.add_argument("--out", default=None, help="Result JSON (default bench/results/bench-<time>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline result JSON to check for regressions")
+    args = parser.parse_args(argv)
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir or tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        db_path = workdir / "super_market.db"
+        results = []
+        if {"crud", "agents", "pool", "examples"} & set(suites):
+            start = time.perf_counter()
+            counts = synthetic.generate(db_path, args.rows, args.orders_2_rows, seed=args.seed, report=quiet)
+            print(f"Generated {sum(counts.values()):,} rows in {time.perf_counter() - start:.1f}s")
+            if args.indexes:
+                index_advisor.build_indexes(create_engine(f"sqlite:///{db_path}"), report=quiet)
+        if "ingestion" in suites:
+            results += bench_ingestion(workdir, args)
+        if "agents" in suites:
+            results += bench_agents(db_path, workdir, args)
+        if "pool" in suites:
+            results += bench_pool(db_path, workdir, args)
+        if "examples" in suites:
+            results += bench_examples(db_path, workdir, args)
+        if "crud" in suites:  # last: it writes to orders_2
+            results += bench_crud(db_path, args)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **{k: v for k, v in vars(args).items() if k not in ("out", "compare", "workdir")},
+        },
+        "results": {r.name: r.summary() for r in results},
+    }
+    for name, s in report["results"].items():
+        print(f"{name:34} p50 {s['p50_ms']:9.2f} ms  p95 {s['p95_ms']:9.2f} ms  "
+              f"{s['throughput_per_s']:12,.1f}/s")
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"Results written to {out}")
+
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
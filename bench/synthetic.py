@@ -0,0 +1,192 @@
+import datetime
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ingestion import CATEGORICAL_DOMAINS
+
+# ==============================
+# Synthetic super_market data
+# ==============================
+# Same seven sheets as the store workbook plus the CRUD app's orders_2, with
+# Superstore-style column names. Everything is vectorized and written in chunks,
+# so 10M-row orders tables fit in a few hundred MB of memory.
+DEFAULT_CHUNK_ROWS = 200_000
+EXCEL_MAX_ROWS = 1_048_575
+BASE_DATE = datetime.date(2021, 1, 1)
+
+STATE_REGIONS = {
+    "Alabama": "South", "Arizona": "West", "Arkansas": "South", "California": "West",
+    "Colorado": "West", "Connecticut": "East", "Delaware": "East", "Florida": "South",
+    "Georgia": "South", "Idaho": "West", "Illinois": "Central", "Indiana": "Central",
+    "Iowa": "Central", "Kansas": "Central", "Kentucky": "South", "Louisiana": "South",
+    "Maine": "East", "Maryland": "East", "Massachusetts": "East", "Michigan": "Central",
+    "Minnesota": "Central", "Mississippi": "South", "Missouri": "Central", "Montana": "West",
+    "Nebraska": "Central", "Nevada": "West", "New Hampshire": "East", "New Jersey": "East",
+    "New Mexico": "West", "New York": "East", "North Carolina": "South", "North Dakota": "Central",
+    "Ohio": "East", "Oklahoma": "Central", "Oregon": "West", "Pennsylvania": "East",
+    "Rhode Island": "East", "South Carolina": "South", "South Dakota": "Central",
+    "Tennessee": "South", "Texas": "Central", "Utah": "West", "Vermont": "East",
+    "Virginia": "South", "Washington": "West", "West Virginia": "East", "Wisconsin": "Central",
+    "Wyoming": "West", "District of Columbia": "East",
+}
+FIRST_NAMES = ["Alice", "Brian", "Claire", "Dan", "Erin", "Frank", "Grace", "Hugo", "Ivy", "Jon",
+               "Kara", "Liam", "Maya", "Noah", "Olga", "Paul", "Rosa", "Sam", "Tina", "Victor"]
+LAST_NAMES = ["Green", "Hart", "Ito", "Jones", "Khan", "Lee", "Moss", "Nash", "Ortiz", "Park",
+              "Quinn", "Reyes", "Shaw", "Tran", "Usher", "Vance", "Wu", "Young", "Zane", "Bell"]
+SHIP_MODES = ["Standard Class", "Second Class", "First Class", "Same Day"]
+N_PRODUCTS = 500
+
+STATES = np.array(list(STATE_REGIONS))
+STATE_REGION = np.array(list(STATE_REGIONS.values()))
+SEGMENTS = np.array(CATEGORICAL_DOMAINS["Segment"])
+CATEGORIES = np.array(CATEGORICAL_DOMAINS["Category"])
+
+
+def _people(prefix: str, keys) -> pd.DataFrame:
+    names = [f"{FIRST_NAMES[i % 20]} {LAST_NAMES[(i * 7) % 20]}" for i in range(len(keys))]
+    return pd.DataFrame({prefix: list(keys), "Manager": names})
+
+
+def manager_tables() -> dict[str, pd.DataFrame]:
+    states = pd.DataFrame({"State": STATES, "Region": STATE_REGION})
+    states["Manager"] = _people("State", STATES)["Manager"]
+    success = _people("Region", CATEGORICAL_DOMAINS["Region"])
+    success["Manager"] = success["Manager"].to_numpy()[::-1]
+    return {
+        "state_managers": states,
+        "regional_managers": _people("Region", CATEGORICAL_DOMAINS["Region"]),
+        "segment_managers": _people("Segment", CATEGORICAL_DOMAINS["Segment"]),
+        "category_managers": _people("Category", CATEGORICAL_DOMAINS["Category"]),
+        "customer_success_managers": success,
+    }
+
+
+def _customers(ids: np.ndarray) -> tuple[pd.Series, pd.Series]:
+    customer_id = pd.Series(ids).map("C-{:05d}".format)
+    first = np.array(FIRST_NAMES)[ids % 20]
+    last = np.array(LAST_NAMES)[(ids // 20) % 20]
+    return customer_id, pd.Series(first) + " " + pd.Series(last)
+
+
+def orders_frame(rng, start: int, n: int, n_customers: int) -> pd.DataFrame:
+    """Rows `start`..`start+n` of the orders table (two line items per order)."""
+    row_id = np.arange(start + 1, start + n + 1)
+    customer = rng.integers(0, n_customers, n)
+    state = rng.integers(0, len(STATES), n)
+    product = rng.integers(0, N_PRODUCTS, n)
+    order_no = 100000 + (row_id - 1) // 2
+    # Both line items of an order share its date, so the year in the Order ID agrees
+    order_date = pd.to_datetime(BASE_DATE) + pd.to_timedelta(order_no * 7919 % (4 * 365), unit="D")
+    quantity = rng.integers(1, 15, n)
+    price = np.round(rng.gamma(2.0, 60.0, n), 2)
+    discount = rng.choice([0.0, 0.0, 0.1, 0.2, 0.5], n)
+    customer_id, customer_name = _customers(customer)
+    return pd.DataFrame({
+        "Row ID": row_id,
+        "Order ID": "CA-" + order_date.year.astype(str) + "-" + pd.Series(order_no).astype(str),
+        "Order Date": order_date,
+        "Ship Date": order_date + pd.to_timedelta(rng.integers(0, 7, n), unit="D"),
+        "Ship Mode": rng.choice(SHIP_MODES, n),
+        "Customer ID": customer_id,
+        "Customer Name": customer_name,
+        "Segment": SEGMENTS[customer % len(SEGMENTS)],
+        "Country": "United States",
+        "State": STATES[state],
+        "Postal Code": 10000 + state * 1000 + product % 1000,
+        "Region": STATE_REGION[state],
+        "Product ID": pd.Series(product).map("P-{:04d}".format),
+        "Category": CATEGORIES[product % len(CATEGORIES)],
+        "Product Name": pd.Series(product).map("Product {:04d}".format),
+        "Sales": np.round(price * quantity * (1 - discount), 2),
+        "Quantity": quantity,
+        "Discount": discount,
+        "Profit": np.round(price * quantity * (0.25 - discount), 2),
+    })
+
+
+def returns_frame(rng, orders: pd.DataFrame, rate: float = 0.08) -> pd.DataFrame:
+    order_ids = orders["Order ID"].drop_duplicates()
+    returned = order_ids[rng.random(len(order_ids)) < rate]
+    return pd.DataFrame({"Returned": "Yes", "Order ID": returned.to_numpy()})
+
+
+def orders_2_frame(rng, n: int, n_customers: int, today: datetime.date | None = None) -> pd.DataFrame:
+    """Live orders for the CRUD app, purchased over the last 90 days."""
+    today = today or datetime.date.today()
+    customer = rng.integers(0, n_customers, n)
+    state = rng.integers(0, len(STATES), n)
+    product = rng.integers(0, N_PRODUCTS, n)
+    customer_id, customer_name = _customers(customer)
+    purchase = pd.to_datetime(today) - pd.to_timedelta(rng.integers(0, 90, n), unit="D")
+    return pd.DataFrame({
+        "Customer_Name": customer_name,
+        "Customer_ID": customer_id,
+        "Segment": SEGMENTS[customer % len(SEGMENTS)],
+        "Country": "United States",
+        "State": STATES[state],
+        "Postal_Code": (10000 + state * 1000 + product % 1000).astype(str),
+        "Region": STATE_REGION[state],
+        "Category": CATEGORIES[product % len(CATEGORIES)],
+        "Product_Name": pd.Series(product).map("Product {:04d}".format),
+        "Quantity": rng.integers(1, 15, n),
+        "Purchase_Date": purchase.date,
+        "Delivered": np.where(rng.random(n) < 0.6, "YES", "NO"),
+    })
+
+
+def _customer_count(rows: int) -> int:
+    return max(rows // 10, 200)
+
+
+def generate(path, rows: int = 10_000, orders_2_rows: int | None = None, seed: int = 0,
+             chunk_rows: int = DEFAULT_CHUNK_ROWS, report=print) -> dict[str, int]:
+    """Write a fresh SQLite super_market database with `rows` order lines."""
+    path = Path(path)
+    path.unlink(missing_ok=True)
+    rng = np.random.default_rng(seed)
+    n_customers = _customer_count(rows)
+    orders_2_rows = rows // 10 if orders_2_rows is None else orders_2_rows
+    counts = {}
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        for table, df in manager_tables().items():
+            df.to_sql(table, conn, index=False)
+            counts[table] = len(df)
+
+        counts["orders"] = counts["returns"] = 0
+        for start in range(0, rows, chunk_rows):
+            chunk = orders_frame(rng, start, min(chunk_rows, rows - start), n_customers)
+            chunk.to_sql("orders", conn, index=False, if_exists="append")
+            returned = returns_frame(rng, chunk)
+            returned.to_sql("returns", conn, index=False, if_exists="append")
+            counts["orders"] += len(chunk)
+            counts["returns"] += len(returned)
+            report(f"orders: {counts['orders']:,}/{rows:,} rows")
+
+        for start in range(0, orders_2_rows, chunk_rows):
+            chunk = orders_2_frame(rng, min(chunk_rows, orders_2_rows - start), n_customers)
+            chunk.to_sql("orders_2", conn, index=False, if_exists="append")
+        counts["orders_2"] = orders_2_rows
+        conn.commit()
+    finally:
+        conn.close()
+    return counts
+
+
+def write_workbook(path, rows: int = 10_000, seed: int = 0) -> dict[str, int]:
+    """The same data as an .xlsx store workbook, for the ingestion benchmarks."""
+    rows = min(rows, EXCEL_MAX_ROWS)
+    rng = np.random.default_rng(seed)
+    n_customers = _customer_count(rows)
+    orders = orders_frame(rng, 0, rows, n_customers)
+    sheets = {"orders": orders, "returns": returns_frame(rng, orders), **manager_tables(),
+              "orders_2": orders_2_frame(rng, max(rows // 10, 1), n_customers)}
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            df.to_excel(writer, sheet_name=name, index=False)
+    return {name: len(df) for name, df in sheets.items()}
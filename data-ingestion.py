@@ -1,24 +1,86 @@
+import argparse
 import pandas as pd
 import mysql.connector
 from sqlalchemy import create_engine
 
+import data_version
+import index_advisor
+import ingestion
+import rollups
+
 # ---- Database connection ----
 username = "root"
 password = "1a0qaeta"
 host = "localhost"
 database = "super_market"
 
+# ---- Command line ----
+parser = argparse.ArgumentParser(description="Import every sheet of the store workbook as a table.")
+parser.add_argument("--excel", default="Synthetic_Store.xlsx", help="Workbook to import")
+parser.add_argument("--target", default=None,
+                    help="SQLAlchemy URL to load into (default: the MySQL super_market schema), "
+                         "e.g. sqlite:///bench.db")
+parser.add_argument("--mode", choices=["replace", "bulk", "incremental", "stream"], default="replace",
+                    help="replace: one to_sql per sheet (original behaviour); "
+                         "bulk: parallel sheets with chunked batch inserts; "
+                         "incremental: apply only changed rows, skip unchanged sheets; "
+                         "stream: bounded-memory batches into typed tables")
+parser.add_argument("--workers", type=int, default=ingestion.DEFAULT_WORKERS,
+                    help="Sheets written in parallel (bulk mode)")
+parser.add_argument("--chunksize", type=int, default=ingestion.DEFAULT_CHUNKSIZE,
+                    help="Rows per INSERT statement (bulk mode)")
+parser.add_argument("--batch-rows", type=int, default=ingestion.DEFAULT_BATCH_ROWS,
+                    help="Rows held in memory at once (stream mode)")
+parser.add_argument("--method", choices=ingestion.LOAD_METHODS, default=ingestion.DEFAULT_METHOD,
+                    help="Insert path for bulk, incremental and stream modes; "
+                         "'infile' uses LOAD DATA LOCAL INFILE (MySQL only)")
+parser.add_argument("--build-indexes", action="store_true",
+                    help="Declare keys and index the known join/filter columns after loading")
+parser.add_argument("--skip-rollups", action="store_true",
+                    help="Do not refresh the rollup tables agent-1 queries for aggregates")
+args = parser.parse_args()
+
 # Create SQLAlchemy engine
-engine = create_engine(f"mysql+mysqlconnector://{username}:{password}@{host}/{database}")
+target = args.target or f"mysql+mysqlconnector://{username}:{password}@{host}/{database}"
+connect_args = {"allow_local_infile": True} if args.method == "infile" else {}
+engine = create_engine(target, connect_args=connect_args)
 
 # ---- Read Excel ----
-excel_file = "Synthetic_Store.xlsx"
-xls = pd.ExcelFile(excel_file)
+excel_file = args.excel
+
+xls = pd.ExcelFile(excel_file) if args.mode != "stream" else None
+
+if args.mode == "stream":
+    # Read-only worksheet iterator; never materialises a whole sheet.
+    stats = ingestion.stream_load(excel_file, engine, batch_rows=args.batch_rows, method=args.method)
+    print(f"✅ Streamed {len(stats)} sheets into {engine.dialect.name}!")
+elif args.mode == "bulk":
+    stats = ingestion.bulk_load(xls, engine, workers=args.workers,
+                                chunksize=args.chunksize, method=args.method)
+    total_rows = sum(s.rows for s in stats)
+    print(f"✅ Bulk-loaded {len(stats)} sheets ({total_rows} rows) into {engine.dialect.name}!")
+elif args.mode == "incremental":
+    stats = ingestion.incremental_load(xls, engine, chunksize=args.chunksize, method=args.method)
+    skipped = sum(s.skipped for s in stats)
+    print(f"✅ Synced {len(stats) - skipped} sheets, {skipped} unchanged!")
+else:
+    # Loop through each sheet and save as a MySQL table
+    for sheet_name in xls.sheet_names:
+        df = xls.parse(sheet_name)
+        df.to_sql(sheet_name, con=engine, if_exists="replace", index=False)  # replace = overwrite if exists
+        data_version.bump(engine, sheet_name)  # invalidates the agents' caches
+        print(f"Imported sheet '{sheet_name}' into table '{sheet_name}'")
+
+    print("✅ All sheets imported successfully into MySQL!")
+
+# Reloaded tables lose the row keys the apps use (orders_2.Order_ID); add them back
+index_advisor.ensure_surrogate_keys(engine)
 
-# Loop through each sheet and save as a MySQL table
-for sheet_name in xls.sheet_names:
-    df = pd.read_excel(excel_file, sheet_name=sheet_name)
-    df.to_sql(sheet_name, con=engine, if_exists="replace", index=False)  # replace = overwrite if exists
-    print(f"Imported sheet '{sheet_name}' into table '{sheet_name}'")
+if args.build_indexes:
+    index_advisor.build_indexes(engine)
 
-print("✅ All sheets imported successfully into MySQL!")
+if not args.skip_rollups:
+    # Incremental syncs refresh only the months they touched; anything else is rebuilt
+    if args.mode == "incremental":
+        rollups.apply_sync(engine, stats)
+    rollups.ensure_fresh(engine)
@@ -0,0 +1,113 @@
+import hashlib
+import re
+
+from sqlalchemy import event, exc, inspect, text
+
+# ==============================
+# Per-table write counters
+# ==============================
+# Every write path (ingestion, the CRUD app, agent-issued DML) bumps the counter of
+# the tables it touched. Caches key their entries on `current()`, so any write makes
+# earlier entries unreachable.
+VERSION_TABLE = "_data_versions"
+
+_WRITE_RE = re.compile(
+    r"^\s*(?:INSERT\s+(?:IGNORE\s+)?INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|"
+    r"ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?|"
+    r"TRUNCATE(?:\s+TABLE)?|RENAME\s+TABLE|LOAD\s+DATA\s+(?:LOCAL\s+)?INFILE\s+'[^']*'\s+INTO\s+TABLE)"
+    r"\s+[`\"\[]?([\w ]+?)[`\"\]]?(?:\s|\(|$)",
+    re.IGNORECASE,
+)
+
+
+CREATE_SQL = (f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+              "table_name VARCHAR(128) PRIMARY KEY, version BIGINT NOT NULL)")
+
+
+def _bump_sql(dialect: str) -> str:
+    if dialect == "mysql":
+        return (f"INSERT INTO {VERSION_TABLE} (table_name, version) VALUES (%s, 1) "
+                "ON DUPLICATE KEY UPDATE version = version + 1")
+    return (f"INSERT INTO {VERSION_TABLE} (table_name, version) VALUES (?, 1) "
+            "ON CONFLICT(table_name) DO UPDATE SET version = version + 1")
+
+
+def written_table(statement: str) -> str | None:
+    """Return the table a DML/DDL statement writes to, or None for reads."""
+    match = _WRITE_RE.match(statement)
+    if match is None:
+        return None
+    table = match.group(1).strip()
+    return None if table == VERSION_TABLE else table
+
+
+def ensure_table(engine) -> bool:
+    """Create the counter table; returns False if the database is read-only."""
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(CREATE_SQL)
+        return True
+    except exc.DBAPIError:
+        return False
+
+
+def bump_cursor(cursor, *tables: str, dialect: str = "mysql"):
+    """Bump `tables` on a raw DB-API cursor, inside the caller's transaction.
+
+    The counter table must already exist (see `ensure_table`); creating it here
+    would implicitly commit the caller's transaction on MySQL.
+    """
+    for table in tables:
+        cursor.execute(_bump_sql(dialect), (table,))
+
+
+def read_cursor(cursor, table: str, dialect: str = "mysql") -> int:
+    """The current version of `table` on a raw DB-API cursor (0 if never written)."""
+    placeholder = "%s" if dialect == "mysql" else "?"
+    cursor.execute(f"SELECT version FROM {VERSION_TABLE} WHERE table_name = {placeholder}", (table,))
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump(engine, *tables: str):
+    """Bump `tables` in a transaction of their own."""
+    ensure_table(engine)
+    with engine.begin() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            bump_cursor(cursor, *tables, dialect=engine.dialect.name)
+        finally:
+            cursor.close()
+
+
+def current(engine) -> str:
+    """A token that changes whenever any table's data or schema changes."""
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(VERSION_TABLE):
+            return "0"
+        rows = conn.execute(
+            text(f"SELECT table_name, version FROM {VERSION_TABLE} ORDER BY table_name")
+        ).fetchall()
+    return hashlib.sha1(repr(rows).encode()).hexdigest()[:16]
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    table = written_table(statement)
+    if table is not None:
+        # A cursor of its own, so the write's rowcount still describes the write
+        bump = conn.connection.cursor()
+        try:
+            bump_cursor(bump, table, dialect=conn.dialect.name)
+        finally:
+            bump.close()
+
+
+def track_writes(engine):
+    """Bump the version of every table written through `engine`.
+
+    Catches DML the agents generate themselves. The bump runs on the same connection,
+    right after the write, so it commits or rolls back together with it.
+    """
+    if not event.contains(engine, "after_cursor_execute", _after_execute) and ensure_table(engine):
+        event.listen(engine, "after_cursor_execute", _after_execute)
+    return engine
@@ -0,0 +1,306 @@
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+import pandas as pd
+from sqlalchemy import Text, create_engine, event, exc, inspect, text
+from sqlalchemy.pool import NullPool
+
+import data_version
+import profiling
+from schema_catalog import is_internal
+from sql_guard import is_select
+
+# ==============================
+# Read/write engine routing for agent SQL
+# ==============================
+# Agent SELECTs can be served by a read engine instead of the primary that the CRUD
+# apps write to: a replica (AGENT_READ_URL) or a local SQLite snapshot of the
+# super_market tables (AGENT_READ_SNAPSHOT), refreshed in the background every
+# SNAPSHOT_REFRESH_SECONDS by re-copying only the tables whose data_version moved.
+# Writes, and reads of a table this process wrote since the read side last caught
+# up, go to the primary. A read the read engine cannot run (e.g. MySQL-only syntax
+# on the SQLite snapshot) is retried on the primary.
+#
+# Only the replica is answer-preserving. SQLite accepts some MySQL SQL and answers
+# it differently, without an error that would trigger the fallback: `3/4` is 0,
+# `||` concatenates, CONCAT and LENGTH treat NULLs and bytes differently, and date
+# literals compare as text. The snapshot therefore gets only SELECTs that avoid
+# these (see `snapshot_portable`), and its text columns use NOCASE so that string
+# comparisons, GROUP BY and DISTINCT ignore case as MySQL's default collation does.
+READ_URL = os.getenv("AGENT_READ_URL")
+SNAPSHOT_PATH = os.getenv("AGENT_READ_SNAPSHOT")
+SNAPSHOT_REFRESH_SECONDS = float(os.getenv("AGENT_SNAPSHOT_REFRESH_SECONDS", 300))
+REPLICA_LAG_SECONDS = float(os.getenv("AGENT_REPLICA_LAG_SECONDS", 5))  # assumed catch-up after a write
+SNAPSHOT_VERSIONS = "_snapshot_versions"
+COPY_CHUNK_ROWS = 50_000
+LATENCY_HISTORY = 500
+
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+[`\"\[]?(\w+)", re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_COMMENT_RE = re.compile(r"--[^\n]*|#[^\n]*|/\*.*?\*/", re.DOTALL)
+_DATE_LITERAL_RE = re.compile(r"^['\"]\d{4}-\d{1,2}-\d{1,2}")
+# Constructs SQLite runs without error but answers differently from MySQL
+_NON_PORTABLE_RE = re.compile(r"/|\|\||\b(?:CONCAT|CONCAT_WS|LENGTH|GROUP_CONCAT)\s*\(", re.IGNORECASE)
+
+
+def snapshot_portable(sql: str) -> bool:
+    """Whether the SQLite snapshot answers `sql` the way MySQL would.
+
+    Conservative: anything that may differ goes to the primary (integer division,
+    `||`, CONCAT/LENGTH/GROUP_CONCAT, double-quoted strings, date literals).
+    """
+    literals = _LITERAL_RE.findall(sql)
+    if any(lit.startswith('"') or _DATE_LITERAL_RE.match(lit) for lit in literals):
+        return False
+    code = _COMMENT_RE.sub(" ", _LITERAL_RE.sub("''", sql))
+    return not _NON_PORTABLE_RE.search(code)
+
+
+def _versions(conn) -> dict[str, int]:
+    if not inspect(conn).has_table(data_version.VERSION_TABLE):
+        return {}
+    rows = conn.execute(text(f"SELECT table_name, version FROM {data_version.VERSION_TABLE}"))
+    return {name: int(version) for name, version in rows}
+
+
+def snapshot_versions(path) -> dict[str, int | None] | None:
+    """Tables in the snapshot at `path` and the primary versions they were copied at."""
+    if not Path(path).exists():
+        return None
+    with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+        try:
+            return dict(conn.execute(f"SELECT table_name, version FROM {SNAPSHOT_VERSIONS}"))
+        except sqlite3.OperationalError:
+            return None
+
+
+def refresh_snapshot(primary, path, report=print) -> list[str]:
+    """Bring the SQLite snapshot at `path` up to date with `primary`; returns the tables copied.
+
+    Changed tables are copied into a copy of the current snapshot, which then replaces
+    it atomically, so readers see either the old or the new file, never a partial one.
+    Each table is tagged with the version read *before* copying it, so a write that
+    lands during the copy is picked up on the next refresh.
+    """
+    path = Path(path)
+    old = snapshot_versions(path) or {}
+    with primary.connect() as conn:
+        current = _versions(conn)
+        tables = [t for t in inspect(conn).get_table_names() if not is_internal(t)]
+    changed = [t for t in tables if t not in old or old[t] != current.get(t)]
+    dropped = [t for t in old if t not in tables]
+    if not changed and not dropped:
+        return []
+
+    fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=path.parent)
+    os.close(fd)
+    try:
+        if path.exists() and old:
+            shutil.copyfile(path, tmp)
+        target = create_engine(f"sqlite:///{tmp}", poolclass=NullPool)
+        with target.begin() as out:
+            out.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {SNAPSHOT_VERSIONS} "
+                                "(table_name TEXT PRIMARY KEY, version INTEGER, copied_at REAL)")
+            for table in dropped:
+                out.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}"')
+                out.exec_driver_sql(f"DELETE FROM {SNAPSHOT_VERSIONS} WHERE table_name = ?", (table,))
+        for table in changed:
+            start = time.perf_counter()
+            quoted = primary.dialect.identifier_preparer.quote(table)
+            with primary.connect() as conn, target.begin() as out:
+                out.exec_driver_sql(f'DROP TABLE IF EXISTS "{table}"')
+                rows = 0
+                for chunk in pd.read_sql(text(f"SELECT * FROM {quoted}"), conn, chunksize=COPY_CHUNK_ROWS):
+                    # Case-insensitive text, like MySQL's default collation (set when the first chunk creates the table)
+                    nocase = {c: Text(collation="NOCASE") for c in chunk.columns
+                              if pd.api.types.infer_dtype(chunk[c], skipna=True) == "string"}
+                    chunk.to_sql(table, out, index=False, if_exists="append", dtype=nocase)
+                    rows += len(chunk)
+                out.exec_driver_sql(f"INSERT OR REPLACE INTO {SNAPSHOT_VERSIONS} VALUES (?, ?, ?)",
+                                    (table, current.get(table), time.time()))
+            report(f"[router] snapshot {table}: {rows:,} rows in {time.perf_counter() - start:.2f}s")
+        target.dispose()
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return changed
+
+
+class EngineRouter:
+    """Sends agent reads to a replica or snapshot engine and everything else to the primary."""
+
+    def __init__(self, primary, app: str = "", read_url: str | None = None, snapshot_path=None,
+                 refresh_seconds: float = SNAPSHOT_REFRESH_SECONDS, report=print):
+        self.primary = primary
+        self.app = app
+        self.report = report
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+        self.refresh_seconds = refresh_seconds
+        if read_url:
+            self.route_name, self.read_engine = "replica", create_engine(read_url, pool_pre_ping=True)
+        elif self.snapshot_path:
+            # A new connection per query, so a replaced snapshot file is picked up at once
+            self.route_name = "snapshot"
+            self.read_engine = create_engine(f"sqlite:///file:{self.snapshot_path}?mode=ro&uri=true",
+                                             poolclass=NullPool)
+        else:
+            self.route_name, self.read_engine = "primary", None
+        self._read_db = None
+        self._lock = threading.Lock()
+        self._dirty: dict[str, float] = {}  # table -> time of this process's last write
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_HISTORY))
+        self.counts = defaultdict(int)
+        self.refreshed_at: float | None = None
+        self.refresh_error: str | None = None
+        self.track(primary)
+        if self.route_name == "snapshot":
+            if snapshot_versions(self.snapshot_path) is not None:
+                self.refreshed_at = self.snapshot_path.stat().st_mtime
+            threading.Thread(target=self._refresh_loop, daemon=True, name=f"snapshot-{app}").start()
+
+    # ---- snapshot upkeep
+    def refresh(self) -> list[str]:
+        started = time.time()
+        try:
+            copied = refresh_snapshot(self.primary, self.snapshot_path, report=self.report)
+        except Exception as e:  # keep serving the previous snapshot, or the primary
+            self.refresh_error = f"{type(e).__name__}: {e}"
+            self.report(f"[router] snapshot refresh failed: {self.refresh_error}")
+            return []
+        self.refresh_error = None
+        self.refreshed_at = started
+        with self._lock:
+            # Writes before the copies started are in the snapshot now
+            for table in [t for t, at in self._dirty.items() if at < started]:
+                del self._dirty[table]
+        return copied
+
+    def _refresh_loop(self):
+        while True:
+            self.refresh()
+            time.sleep(self.refresh_seconds)
+
+    def track(self, engine):
+        """Send reads of tables written through `engine` (another engine on the primary) to the primary."""
+        if not event.contains(engine, "after_cursor_execute", self._after_execute):
+            event.listen(engine, "after_cursor_execute", self._after_execute)
+        return engine
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        table = data_version.written_table(statement)
+        if table is not None:
+            with self._lock:
+                self._dirty[table] = time.time()
+
+    # ---- routing
+    def _reader(self):
+        if self.read_engine is None or (self.route_name == "snapshot" and self.refreshed_at is None):
+            return None
+        if self._read_db is None:
+            from langchain.sql_database import SQLDatabase
+
+            self._read_db = SQLDatabase(self.read_engine, sample_rows_in_table_info=0, lazy_table_reflection=True)
+        return self._read_db
+
+    def _must_use_primary(self, sql: str) -> bool:
+        if not is_select(sql) or data_version.written_table(sql) is not None:
+            return True
+        if self.route_name == "snapshot" and not snapshot_portable(sql):
+            return True
+        now = time.time()
+        with self._lock:
+            if self.route_name == "replica":
+                for table in [t for t, at in self._dirty.items() if now - at > REPLICA_LAG_SECONDS]:
+                    del self._dirty[table]
+            dirty = set(self._dirty)
+        return bool(dirty & {t for t in _TABLE_RE.findall(sql)})
+
+    def _record(self, route: str, started: float):
+        ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.latencies[route].append(ms)
+            self.counts[route] += 1
+        profiling.METRICS.observe([{"app": self.app, "kind": "route", "name": route, "ms": ms}])
+
+    def execute(self, execute, command, fetch="all", **kwargs):
+        """Run SQLDatabase._execute (`execute`, bound to the primary) on the engine `command` belongs on."""
+        reader = None
+        if isinstance(command, str) and fetch != "cursor" and not self._must_use_primary(command):
+            reader = self._reader()
+        if reader is not None:
+            started = time.perf_counter()
+            try:
+                rows = reader._execute(command, fetch, **kwargs)
+            except exc.SQLAlchemyError as e:
+                self._record(f"{self.route_name}:fallback", started)
+                self.report(f"[router] {self.route_name} could not run it, using the primary: "
+                            f"{str(e).splitlines()[0][:120]}")
+            else:
+                self._record(self.route_name, started)
+                return rows
+        started = time.perf_counter()
+        rows = execute(command, fetch, **kwargs)
+        self._record("primary", started)
+        return rows
+
+    # ---- reporting
+    def freshness(self) -> dict:
+        """How far the read side trails the primary."""
+        info = {"route": self.route_name}
+        if self.read_engine is None:
+            return info
+        with self._lock:
+            info["primary_only_tables"] = sorted(self._dirty)
+        try:
+            with self.primary.connect() as conn:
+                primary = _versions(conn)
+            if self.route_name == "snapshot":
+                copied = snapshot_versions(self.snapshot_path) or {}
+                info["age_s"] = round(time.time() - self.refreshed_at, 1) if self.refreshed_at else None
+                info["refresh_error"] = self.refresh_error
+            else:
+                with self.read_engine.connect() as conn:
+                    copied = _versions(conn)
+            info["behind_tables"] = sorted(t for t, v in primary.items()
+                                           if not is_internal(t) and copied.get(t) != v)
+        except exc.SQLAlchemyError as e:
+            info["error"] = str(e).splitlines()[0][:200]
+        return info
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            rows = []
+            for route, values in sorted(self.latencies.items()):
+                ordered = sorted(values)
+                rows.append({"route": route, "queries": self.counts[route],
+                             "p50_ms": round(ordered[len(ordered) // 2], 2),
+                             "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 2)})
+            return rows
+
+
+def from_env(primary, app: str = "") -> EngineRouter:
+    """A router configured from AGENT_READ_URL / AGENT_READ_SNAPSHOT (primary only if neither is set)."""
+    return EngineRouter(primary, app, read_url=READ_URL, snapshot_path=SNAPSHOT_PATH)
+
+
+def install(db, router: EngineRouter):
+    """Route `db._execute` (used by run() and the result shaper) through `router`."""
+    if router.read_engine is not None:
+        # Guard timeouts and job cancel interrupt reads on whichever engine runs them
+        import agent_runner
+        import sql_guard
+
+        sql_guard.watch(router.read_engine)
+        agent_runner.watch_sql(router.read_engine)
+    execute = db._execute
+    db._execute = lambda command, *args, **kwargs: router.execute(execute, command, *args, **kwargs)
+    db.router = router
+    return db
@@ -0,0 +1,295 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+
+from sqlalchemy import inspect, text
+
+# ==============================
+# Escalation hierarchy
+# ==============================
+# role -> (next role up, table holding that role's managers, key column of that table)
+HIERARCHY = {
+    "Customer": ("State Manager", "state_managers", "State"),
+    "State Manager": ("Regional Manager", "regional_managers", "Region"),
+    "Regional Manager": ("Segment Manager", "segment_managers", "Segment"),
+    "Segment Manager": ("Category Manager", "category_managers", "Category"),
+    "Category Manager": ("LOB/Executive", None, None),
+}
+ROLES = ["Category Manager", "Segment Manager", "Regional Manager", "State Manager", "Customer"]
+
+
+@dataclass
+class EscalationTarget:
+    role: str
+    name: str | None
+    key: str | None = None
+    reason: str = ""
+
+    @property
+    def recommendation(self) -> str:
+        if self.name is None:
+            return f"Escalate this issue to {self.role}"
+        return f"Escalate this issue to [{self.role}: {self.name}]"
+
+
+class EscalationError(LookupError):
+    pass
+
+
+class DraftError(RuntimeError):
+    """The LLM call for an email failed; `attempts` calls were made."""
+
+    def __init__(self, message: str, attempts: int):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+def _manager_column(columns: list[str], key: str) -> str:
+    for column in columns:
+        if column != key and "manager" in column.lower():
+            return column
+    others = [c for c in columns if c != key]
+    if not others:
+        raise EscalationError(f"No manager column next to {key}")
+    return others[0]
+
+
+def _key_column(columns: list[str], key: str) -> str:
+    for column in columns:
+        if column.lower() == key.lower():
+            return column
+    raise EscalationError(f"No {key} column in {columns}")
+
+
+@dataclass
+class EscalationIndex:
+    """In-memory copy of the manager tables, keyed for O(1) escalation lookups."""
+
+    managers: dict = field(default_factory=dict)  # table -> {key value (lower): (key, manager)}
+    state_region: dict = field(default_factory=dict)  # state (lower) -> region
+    version: str = ""
+    build_ms: float = 0.0
+
+    @classmethod
+    def load(cls, engine, version: str = "") -> "EscalationIndex":
+        start = time.perf_counter()
+        index = cls(version=version)
+        with engine.connect() as conn:
+            insp = inspect(conn)
+            quote = conn.dialect.identifier_preparer.quote
+            tables = set(insp.get_table_names())
+            for _, table, key in HIERARCHY.values():
+                if table is None or table not in tables:
+                    continue
+                columns = [c["name"] for c in insp.get_columns(table)]
+                key_col, manager_col = _key_column(columns, key), _manager_column(columns, key)
+                select = [key_col, manager_col]
+                region_col = next((c for c in columns if c.lower() == "region"), None)
+                if table == "state_managers" and region_col:
+                    select.append(region_col)
+                rows = conn.execute(text(
+                    f"SELECT {', '.join(quote(c) for c in select)} FROM {quote(table)}")).fetchall()
+                index.managers[table] = {str(r[0]).strip().lower(): (str(r[0]).strip(), r[1])
+                                         for r in rows if r[0] is not None}
+                if len(select) == 3:
+                    index.state_region.update({str(r[0]).strip().lower(): r[2] for r in rows if r[2]})
+
+            # Without a Region column on state_managers, take the state -> region map from orders.
+            if not index.state_region and "orders" in tables:
+                columns = [c["name"] for c in insp.get_columns("orders")]
+                state_col = next((c for c in columns if c.lower() == "state"), None)
+                region_col = next((c for c in columns if c.lower() == "region"), None)
+                if state_col and region_col:
+                    rows = conn.execute(text(
+                        f"SELECT DISTINCT {quote(state_col)}, {quote(region_col)} FROM orders")).fetchall()
+                    index.state_region = {str(s).strip().lower(): r for s, r in rows if s and r}
+        index.build_ms = (time.perf_counter() - start) * 1000
+        return index
+
+    def _lookup(self, table: str, value: str | None, role: str, reason: str) -> EscalationTarget:
+        if not value:
+            raise EscalationError(f"{reason} is needed to find the {role}")
+        match = self.managers.get(table, {}).get(str(value).strip().lower())
+        if match is None:
+            raise EscalationError(f"No {role} found for {value!r}")
+        key, name = match
+        return EscalationTarget(role, name, key, f"{reason}: {key}")
+
+    def resolve(self, role: str, state: str = "", region: str = "", segment: str = "",
+                category: str = "") -> EscalationTarget:
+        """The next manager up the hierarchy for someone in `role`."""
+        if role not in HIERARCHY:
+            raise EscalationError(f"Unknown role {role!r}")
+        target_role, table, _ = HIERARCHY[role]
+        if table is None:
+            return EscalationTarget(target_role, None, reason="Top of the hierarchy")
+        if role == "Customer":
+            return self._lookup(table, state, target_role, "State")
+        if role == "State Manager":
+            region = region or self.state_region.get(str(state).strip().lower())
+            return self._lookup(table, region, target_role, "Region")
+        if role == "Regional Manager":
+            return self._lookup(table, segment, target_role, "Segment")
+        return self._lookup(table, category, target_role, "Category")
+
+
+def email_prompt(target: EscalationTarget, user_name: str, user_role: str, user_state: str,
+                 issue: str) -> str:
+    return f"""You are an HR Escalation Agent. The escalation target has already been identified.
+
+Escalation target: {target.role}{f" {target.name}" if target.name else ""}
+Sender: {user_name} ({user_role})
+State: {user_state or "n/a"}
+Issue: {issue}
+
+Draft a short, polite escalation email addressed to the target, including the sender's name and
+role, the issue description and the state (if applicable). Return only the email."""
+
+
+def group_email_prompt(target: EscalationTarget, senders: list[tuple[str, str, str]], issue: str) -> str:
+    """Prompt for one email covering every sender who raised the same issue with the same target."""
+    if len(senders) == 1:
+        return email_prompt(target, *senders[0], issue)
+    listed = "\n".join(f"- {name} ({role}, {state or 'n/a'})" for name, role, state in senders)
+    return f"""You are an HR Escalation Agent. The escalation target has already been identified.
+
+Escalation target: {target.role}{f" {target.name}" if target.name else ""}
+Raised by {len(senders)} people:
+{listed}
+Issue: {issue}
+
+Draft a short, polite escalation email addressed to the target that lists everyone who raised the
+issue, the issue description and the states involved. Return only the email."""
+
+
+# ==============================
+# Batch escalation
+# ==============================
+DEFAULT_BATCH_WORKERS = 4
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+BATCH_COLUMNS = ["name", "role", "state", "issue"]
+
+
+@dataclass
+class BatchEscalation:
+    row: int
+    name: str
+    role: str
+    state: str
+    issue: str
+    target_role: str = ""
+    target_name: str = ""
+    email: str = ""
+    status: str = "ok"  # ok | unresolved | failed
+    group_size: int = 1
+    attempts: int = 0
+    seconds: float = 0.0
+    error: str = ""
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _is_rate_limited(exc: Exception) -> bool:
+    return ("ratelimit" in type(exc).__name__.lower() or getattr(exc, "status_code", None) == 429
+            or "429" in str(exc) or "rate limit" in str(exc).lower())
+
+
+def _retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateGate:
+    """Shared pause: once any worker is rate limited, every worker waits it out."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def wait(self):
+        while True:
+            with self._lock:
+                delay = self._resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+def draft_email(llm, prompt: str, gate: RateGate | None = None, max_retries: int = MAX_RETRIES,
+                backoff: float = BACKOFF_SECONDS) -> tuple[str, int]:
+    """(email, attempts); rate-limit errors are retried with exponential backoff and jitter.
+
+    Raises DraftError, carrying the attempts made, once a call fails for good.
+    """
+    gate = gate or RateGate()
+    for attempt in range(1, max_retries + 1):
+        gate.wait()
+        try:
+            return llm.invoke(prompt).content, attempt
+        except Exception as e:
+            if not _is_rate_limited(e) or attempt == max_retries:
+                raise DraftError(str(e), attempt) from e
+            gate.pause(_retry_after(e) or backoff * 2 ** (attempt - 1) * (1 + random.random()))
+    raise RuntimeError("unreachable")
+
+
+def _issue_key(issue: str) -> str:
+    return " ".join(str(issue).lower().split())
+
+
+def escalate_batch(rows: list[dict], index: EscalationIndex, llm, workers: int = DEFAULT_BATCH_WORKERS,
+                   max_retries: int = MAX_RETRIES, backoff: float = BACKOFF_SECONDS):
+    """Yield a BatchEscalation per input row, in completion order.
+
+    Rows that resolve to the same target with the same issue share one drafted email,
+    so the LLM is called once per distinct (target, issue) pair, `workers` at a time.
+    """
+    groups: dict[tuple, list[BatchEscalation]] = {}
+    for i, row in enumerate(rows):
+        item = BatchEscalation(i, str(row.get("name", "")), str(row.get("role", "")),
+                               str(row.get("state", "") or ""), str(row.get("issue", "")))
+        try:
+            target = index.resolve(item.role, state=item.state, segment=str(row.get("segment", "") or ""),
+                                   category=str(row.get("category", "") or ""))
+        except EscalationError as e:
+            item.status, item.error = "unresolved", str(e)
+            yield item
+            continue
+        item.target_role, item.target_name = target.role, target.name or ""
+        groups.setdefault((target.role, target.name, _issue_key(item.issue)), []).append(item)
+
+    gate = RateGate()
+
+    def draft(members: list[BatchEscalation]) -> tuple[str, int, float]:
+        start = time.perf_counter()
+        first = members[0]
+        target = EscalationTarget(first.target_role, first.target_name or None)
+        senders = list(dict.fromkeys((m.name, m.role, m.state) for m in members))
+        email, attempts = draft_email(llm, group_email_prompt(target, senders, first.issue), gate,
+                                      max_retries, backoff)
+        return email, attempts, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {pool.submit(draft, members): members for members in groups.values()}
+        for future in as_completed(futures):
+            members = futures[future]
+            try:
+                email, attempts, seconds = future.result()
+            except Exception as e:
+                email, attempts, seconds = "", e.attempts if isinstance(e, DraftError) else 0, 0.0
+                for m in members:
+                    m.status, m.error = "failed", str(e)[:300]
+            for m in members:
+                m.email, m.attempts, m.seconds, m.group_size = email, attempts, seconds, len(members)
+                yield m
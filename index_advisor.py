@@ -0,0 +1,275 @@
+import datetime
+import re
+from dataclasses import dataclass, field
+
+from sqlalchemy import inspect, text
+
+import data_version
+
+# ==============================
+# Known keys and access paths
+# ==============================
+# Logical column -> spellings used by the different sheets/exports.
+COLUMN_ALIASES = {
+    "row_id": ["Row ID", "Row_ID"],
+    "order_id": ["Order ID", "Order_ID"],
+    "customer_id": ["Customer ID", "Customer_ID"],
+    "customer_name": ["Customer Name", "Customer_Name"],
+    "delivered": ["Delivered"],
+    "purchase_date": ["Purchase_Date", "Order Date", "Order_Date"],
+    "state": ["State"],
+    "region": ["Region"],
+    "segment": ["Segment"],
+    "category": ["Category"],
+}
+
+# table -> (primary key, secondary indexes), in logical column names.
+INDEX_PLAN = {
+    "orders": (["row_id"], [["order_id"], ["customer_id"], ["state"], ["region"], ["purchase_date"]]),
+    "orders_2": (["order_id"], [["customer_id", "delivered"], ["delivered", "purchase_date"], ["purchase_date"],
+                                ["customer_name"]]),
+    "returns": ([], [["order_id"]]),
+    "state_managers": (["state"], [["region"]]),
+    "regional_managers": (["region"], []),
+    "segment_managers": (["segment"], []),
+    "category_managers": (["category"], []),
+    "customer_success_managers": (["region"], []),
+}
+
+# Row keys the apps address rows by, added to the loaded table when the sheet has none.
+# MySQL only: SQLite tables already have `rowid`.
+SURROGATE_KEYS = {"orders_2": "Order_ID"}
+
+# Queries the apps issue (agent-2.py pages and the agent-1 joins), used to show
+# the plan before and after indexing.
+PROBE_QUERIES = [
+    ("orders_2", "undelivered orders for a customer",
+     "SELECT * FROM {orders_2} WHERE {orders_2.customer_id} = :customer_id "
+     "AND {orders_2.delivered} = 'NO'"),
+    ("orders_2", "undelivered order list",
+     "SELECT * FROM {orders_2} WHERE {orders_2.delivered} = 'NO'"),
+    ("orders_2", "return-eligible orders",
+     "SELECT * FROM {orders_2} WHERE {orders_2.delivered} = 'YES' "
+     "AND {orders_2.purchase_date} >= :cutoff"),
+    ("orders", "orders joined with returns",
+     "SELECT COUNT(*) FROM {returns} r JOIN {orders} o ON o.{orders.order_id} = r.{returns.order_id}"),
+    ("orders", "orders joined with state managers",
+     "SELECT COUNT(*) FROM {state_managers} m JOIN {orders} o ON o.{orders.state} = m.{state_managers.state}"),
+]
+
+# MySQL cannot index TEXT columns without a prefix length.
+TEXT_PREFIX = 64
+
+
+@dataclass
+class IndexReport:
+    created: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    improved: list = field(default_factory=list)
+
+    def __str__(self) -> str:
+        lines = [f"Created: {c}" for c in self.created]
+        lines += [f"Skipped: {s}" for s in self.skipped]
+        lines += [f"Faster: {name} ({before} -> {after})" for name, before, after in self.improved]
+        return "\n".join(lines) or "Nothing to do"
+
+
+def resolve_column(columns, logical: str) -> str | None:
+    for name in COLUMN_ALIASES.get(logical, [logical]):
+        if name in columns:
+            return name
+    return None
+
+
+def _index_name(table: str, columns: list[str]) -> str:
+    return re.sub(r"\W+", "_", f"ix_{table}_{'_'.join(columns)}").lower()[:64]
+
+
+def _is_text(col_type) -> bool:
+    return type(col_type).__name__.upper() in {"TEXT", "MEDIUMTEXT", "LONGTEXT", "BLOB"}
+
+
+def _column_sql(conn, name: str, col_type) -> str:
+    quoted = conn.dialect.identifier_preparer.quote(name)
+    if conn.dialect.name == "mysql" and _is_text(col_type):
+        return f"{quoted}({TEXT_PREFIX})"
+    return quoted
+
+
+def _is_unique(conn, table: str, columns: list[str]) -> bool:
+    quote = conn.dialect.identifier_preparer.quote
+    cols = ", ".join(quote(c) for c in columns)
+    not_null = " AND ".join(f"{quote(c)} IS NOT NULL" for c in columns)
+    total, distinct = conn.execute(text(
+        f"SELECT COUNT(*), (SELECT COUNT(*) FROM (SELECT DISTINCT {cols} FROM {quote(table)} "
+        f"WHERE {not_null}) d) FROM {quote(table)}"
+    )).one()
+    return total == distinct
+
+
+# ==============================
+# EXPLAIN helpers
+# ==============================
+def explain(conn, sql: str, params: dict | None = None) -> list[str]:
+    """Return the plan for `sql` as one line per table access."""
+    if conn.dialect.name == "sqlite":
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params or {}).fetchall()
+        return [row[-1] for row in rows]
+    rows = conn.execute(text(f"EXPLAIN {sql}"), params or {}).mappings().fetchall()
+    return [f"{r['table']}: type={r['type']} key={r['key']} rows={r['rows']}" for r in rows]
+
+
+def full_scans(plan: list[str]) -> int:
+    return sum(1 for step in plan
+               if re.match(r"SCAN \S+$", step) or "type=ALL" in step)
+
+
+def _render_probe(template: str, tables: dict) -> str | None:
+    def _sub(match):
+        table, _, logical = match.group(1).partition(".")
+        if table not in tables:
+            raise KeyError(table)
+        if not logical:
+            return tables[table]["quoted"]
+        column = resolve_column(tables[table]["columns"], logical)
+        if column is None:
+            raise KeyError(logical)
+        return tables[table]["quote"](column)
+
+    try:
+        return re.sub(r"\{([\w.]+)\}", _sub, template)
+    except KeyError:
+        return None
+
+
+def _probe_params(conn, tables: dict) -> dict:
+    cutoff = datetime.date.today() - datetime.timedelta(days=30)
+    info = tables.get("orders_2")
+    column = resolve_column(info["columns"], "customer_id") if info else None
+    if column is None:
+        return {"customer_id": None, "cutoff": cutoff}
+    value = conn.execute(text(
+        f"SELECT {info['quote'](column)} FROM {info['quoted']} LIMIT 1")).scalar()
+    return {"customer_id": value, "cutoff": cutoff}
+
+
+def _probe_plans(conn, tables: dict) -> dict:
+    params = _probe_params(conn, tables)
+    plans = {}
+    for _, name, template in PROBE_QUERIES:
+        sql = _render_probe(template, tables)
+        if sql is not None:
+            plans[name] = explain(conn, sql, {k: v for k, v in params.items() if f":{k}" in sql})
+    return plans
+
+
+# ==============================
+# Index builder
+# ==============================
+def _table_info(conn) -> dict:
+    insp = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    tables = {}
+    for table in insp.get_table_names():
+        columns = {c["name"]: c["type"] for c in insp.get_columns(table)}
+        existing = {tuple(ix["column_names"]) for ix in insp.get_indexes(table)}
+        pk = insp.get_pk_constraint(table).get("constrained_columns") or []
+        if pk:
+            existing.add(tuple(pk))
+        tables[table] = {"columns": columns, "existing": existing, "has_pk": bool(pk),
+                         "quote": quote, "quoted": quote(table)}
+    return tables
+
+
+def _create_key(conn, table: str, info: dict, columns: list[str], report: IndexReport):
+    quote = conn.dialect.identifier_preparer.quote
+    if tuple(columns) in info["existing"]:
+        return
+    if not _is_unique(conn, table, columns):
+        report.skipped.append(f"{table}({', '.join(columns)}) is not unique; indexing instead")
+        _create_index(conn, table, info, columns, report)
+        return
+    text_cols = [c for c in columns
+                 if conn.dialect.name == "mysql" and _is_text(info["columns"][c])]
+    col_sql = ", ".join(_column_sql(conn, c, info["columns"][c]) for c in columns)
+    if conn.dialect.name == "mysql" and not info["has_pk"] and not text_cols:
+        conn.execute(text(f"ALTER TABLE {quote(table)} ADD PRIMARY KEY ({col_sql})"))
+        report.created.append(f"PRIMARY KEY {table}({', '.join(columns)})")
+    else:
+        # SQLite cannot add a primary key to an existing table; a unique index gives
+        # the same lookups. MySQL TEXT keys only get a prefix, so they can't be unique.
+        unique = "UNIQUE " if not text_cols else ""
+        name = _index_name(table, columns)
+        conn.execute(text(f"CREATE {unique}INDEX {quote(name)} ON {quote(table)} ({col_sql})"))
+        report.created.append(f"{unique}INDEX {name}")
+    info["existing"].add(tuple(columns))
+
+
+def _create_index(conn, table: str, info: dict, columns: list[str], report: IndexReport):
+    quote = conn.dialect.identifier_preparer.quote
+    if tuple(columns) in info["existing"]:
+        return
+    col_sql = ", ".join(_column_sql(conn, c, info["columns"][c]) for c in columns)
+    name = _index_name(table, columns)
+    conn.execute(text(f"CREATE INDEX {quote(name)} ON {quote(table)} ({col_sql})"))
+    info["existing"].add(tuple(columns))
+    report.created.append(f"INDEX {name}")
+
+
+def ensure_surrogate_keys(engine, report=print) -> list[str]:
+    """Add the SURROGATE_KEYS columns (AUTO_INCREMENT) to loaded tables that lack them.
+
+    Run after every load: replace, bulk and stream loads rebuild a table from its
+    sheet, which has no such column. Returns the tables that were altered.
+    """
+    if engine.dialect.name != "mysql":
+        return []
+    added = []
+    with engine.begin() as conn:
+        insp = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for table, column in SURROGATE_KEYS.items():
+            if not insp.has_table(table) or column in {c["name"] for c in insp.get_columns(table)}:
+                continue
+            key = "UNIQUE" if insp.get_pk_constraint(table).get("constrained_columns") else "PRIMARY KEY"
+            conn.execute(text(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(column)} "
+                              f"BIGINT NOT NULL AUTO_INCREMENT {key} FIRST"))
+            report(f"Added key {table}({column})")
+            added.append(table)
+    if added:
+        data_version.bump(engine, *added)
+    return added
+
+
+def build_indexes(engine, report=print) -> IndexReport:
+    """Declare keys and add indexes on the known join/filter columns of ingested tables.
+
+    Idempotent: keys and indexes that already exist are left alone. The plans of
+    PROBE_QUERIES are captured before and after so the effect can be checked.
+    """
+    result = IndexReport()
+    with engine.begin() as conn:
+        tables = _table_info(conn)
+        before = _probe_plans(conn, tables)
+        for table, (key, indexes) in INDEX_PLAN.items():
+            info = tables.get(table)
+            if info is None:
+                continue
+            resolved_key = [resolve_column(info["columns"], c) for c in key]
+            if key and None not in resolved_key:
+                _create_key(conn, table, info, resolved_key, result)
+            for logical in indexes:
+                columns = [resolve_column(info["columns"], c) for c in logical]
+                if None in columns:
+                    result.skipped.append(f"{table}: no column for {', '.join(logical)}")
+                    continue
+                _create_index(conn, table, info, columns, result)
+        after = _probe_plans(conn, tables)
+
+    for name, plan in before.items():
+        report(f"EXPLAIN {name}\n  before: {plan}\n  after:  {after[name]}")
+        if full_scans(after[name]) < full_scans(plan):
+            result.improved.append((name, f"{full_scans(plan)} full scans",
+                                    f"{full_scans(after[name])} full scans"))
+    report(str(result))
+    return result
@@ -0,0 +1,671 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+from sqlalchemy import DateTime, bindparam, inspect, text
+from sqlalchemy.engine import Engine
+
+import data_version
+
+# ==============================
+# Loader settings
+# ==============================
+DEFAULT_CHUNKSIZE = 5000
+DEFAULT_WORKERS = 4
+
+# Bound-parameter limit of SQLite builds before 3.32, used when the connection can't say.
+LEGACY_SQLITE_MAX_VARIABLES = 999
+
+LOAD_METHODS = ("executemany", "multi", "infile")
+# One prepared INSERT run over each chunk: sqlite3 binds rows without re-parsing and
+# mysql-connector rewrites the batch into multi-row INSERTs itself. "multi" builds one
+# huge statement per chunk instead; it measured over 10x slower on SQLite.
+DEFAULT_METHOD = "executemany"
+
+
+@dataclass
+class LoadStat:
+    table: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else float("inf")
+
+    def __str__(self) -> str:
+        return (f"Imported {self.rows} rows into '{self.table}' "
+                f"in {self.seconds:.2f}s ({self.rows_per_sec:,.0f} rows/sec)")
+
+
+# ==============================
+# LOAD DATA LOCAL INFILE (MySQL only)
+# ==============================
+def _infile_field(value) -> str:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _load_data_infile(pd_table, conn, keys, data_iter):
+    """pandas.to_sql insert method that streams a chunk through a temp CSV file."""
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as fh:
+            for row in data_iter:
+                fh.write(",".join(_infile_field(v) for v in row) + "\n")
+        columns = ", ".join(f"`{k}`" for k in keys)
+        infile = path.replace("\\", "/")
+        conn.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE '{infile}' INTO TABLE `{pd_table.name}` "
+            "CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '\\n' ({columns})"
+        )
+    finally:
+        os.remove(path)
+
+
+# ==============================
+# Bulk loader
+# ==============================
+def _insert_method(method: str, dialect: str):
+    if method == "infile":
+        if dialect != "mysql":
+            raise ValueError("LOAD DATA LOCAL INFILE is only available on MySQL targets")
+        return _load_data_infile
+    if method == "multi":
+        return "multi"
+    if method == "executemany":
+        return None
+    raise ValueError(f"Unknown load method {method!r}; expected one of {LOAD_METHODS}")
+
+
+def _max_variables(bind) -> int:
+    """Bound parameters one SQLite statement may carry, read from the connection."""
+    import sqlite3
+
+    if isinstance(bind, Engine):
+        with bind.connect() as conn:
+            return _max_variables(conn)
+    dbapi = bind.connection.dbapi_connection
+    if hasattr(dbapi, "getlimit"):  # Python 3.11+
+        return dbapi.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return 32766 if sqlite3.sqlite_version_info >= (3, 32) else LEGACY_SQLITE_MAX_VARIABLES
+
+
+def _effective_chunksize(chunksize: int, method: str, bind, n_columns: int) -> int:
+    """Cap multi-row INSERT chunks on SQLite so a statement stays under the parameter limit."""
+    if method == "multi" and bind.dialect.name == "sqlite":
+        return max(1, min(chunksize, _max_variables(bind) // max(n_columns, 1)))
+    return chunksize
+
+
+def write_table(df: pd.DataFrame, table: str, engine, chunksize: int = DEFAULT_CHUNKSIZE,
+                method: str = DEFAULT_METHOD) -> LoadStat:
+    """Replace `table` with the contents of `df` using chunked batch inserts."""
+    dialect = engine.dialect.name
+    start = time.perf_counter()
+    df.to_sql(
+        table,
+        con=engine,
+        if_exists="replace",
+        index=False,
+        chunksize=_effective_chunksize(chunksize, method, engine, len(df.columns)),
+        method=_insert_method(method, dialect),
+    )
+    data_version.bump(engine, table)
+    return LoadStat(table, len(df), time.perf_counter() - start)
+
+
+def bulk_load(excel_file, engine, workers: int = DEFAULT_WORKERS,
+              chunksize: int = DEFAULT_CHUNKSIZE, method: str = DEFAULT_METHOD, report=print):
+    """Load every sheet of `excel_file` into `engine`, one table per sheet.
+
+    The workbook is opened once and each sheet is parsed from it exactly once.
+    Parsing is serialised on the shared workbook handle while the table writes
+    run on a thread pool, so the next sheet is parsed while earlier ones are
+    still being inserted. SQLite only allows a single writer, so writes to a
+    SQLite target are serialised as well.
+    """
+    xls = excel_file if isinstance(excel_file, pd.ExcelFile) else pd.ExcelFile(excel_file)
+    write_lock = threading.Lock() if engine.dialect.name == "sqlite" else None
+
+    def _write(df, sheet_name):
+        if write_lock is None:
+            stat = write_table(df, sheet_name, engine, chunksize, method)
+        else:
+            with write_lock:
+                stat = write_table(df, sheet_name, engine, chunksize, method)
+        report(str(stat))
+        return stat
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(_write, xls.parse(sheet_name), sheet_name)
+                   for sheet_name in xls.sheet_names]
+        return [f.result() for f in futures]
+
+
+# ==============================
+# Incremental (upsert) loader
+# ==============================
+INGEST_STATE_TABLE = "_ingest_state"
+INGEST_ROWS_TABLE = "_ingest_rows"
+KEY_BATCH_ROWS = 200  # changed keys per SELECT/DELETE; also bounds the OR chain the database parses
+
+# Candidate natural keys per sheet; the first one present and unique in the sheet wins.
+SHEET_KEYS = {
+    "orders": [["Row ID"], ["Row_ID"], ["Order ID", "Product ID"]],
+    "orders_2": [["Order_ID"], ["Customer_ID", "Product_Name", "Purchase_Date"]],
+    "returns": [["Order ID"], ["Order_ID"]],
+    "state_managers": [["State"]],
+    "regional_managers": [["Region"]],
+    "segment_managers": [["Segment"]],
+    "category_managers": [["Category"]],
+    "customer_success_managers": [["Region"]],
+}
+
+
+@dataclass
+class SyncStat:
+    table: str
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    skipped: bool = False
+    full_reload: bool = False
+    seconds: float = 0.0
+    # Rows written and the previous versions of changed/removed rows (used by rollups.py)
+    upserted_rows: pd.DataFrame | None = field(default=None, repr=False)
+    replaced_rows: pd.DataFrame | None = field(default=None, repr=False)
+
+    def __str__(self) -> str:
+        if self.skipped:
+            return f"Skipped '{self.table}' (unchanged)"
+        how = "reloaded" if self.full_reload else "synced"
+        return (f"{how.capitalize()} '{self.table}': +{self.inserted} ~{self.updated} "
+                f"-{self.deleted} in {self.seconds:.2f}s")
+
+
+def _hex_hashes(df: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(df, index=False).map("{:016x}".format)
+
+
+def sheet_fingerprint(df: pd.DataFrame, row_hashes: pd.Series | None = None) -> str:
+    if row_hashes is None:
+        row_hashes = _hex_hashes(df)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    digest.update("".join(row_hashes).encode())
+    return digest.hexdigest()
+
+
+def resolve_key(table: str, df: pd.DataFrame) -> list[str]:
+    candidates = SHEET_KEYS.get(table, []) + [[c] for c in df.columns[:1]]
+    for candidate in candidates:
+        if all(c in df.columns for c in candidate) and not df.duplicated(candidate).any():
+            return list(candidate)
+    return []
+
+
+def _plain(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    return value.item() if hasattr(value, "item") else value
+
+
+def _ensure_state_tables(conn):
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {INGEST_STATE_TABLE} ("
+        "sheet VARCHAR(128) PRIMARY KEY, fingerprint CHAR(64) NOT NULL, "
+        "key_columns TEXT NOT NULL, columns_json TEXT NOT NULL, row_count BIGINT NOT NULL)"
+    )
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {INGEST_ROWS_TABLE} ("
+        "sheet VARCHAR(128) NOT NULL, row_key CHAR(16) NOT NULL, row_hash CHAR(16) NOT NULL, "
+        "key_values TEXT NOT NULL, PRIMARY KEY (sheet, row_key))"
+    )
+
+
+def _stored_state(conn, table: str):
+    row = conn.execute(
+        text(f"SELECT fingerprint, key_columns, columns_json FROM {INGEST_STATE_TABLE} "
+             "WHERE sheet = :sheet"),
+        {"sheet": table},
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], json.loads(row[1]), json.loads(row[2])
+
+
+def _save_state(conn, table, fingerprint, key, df, rows: pd.DataFrame | None, keep_rows: bool = False):
+    """Record the sheet's fingerprint and replace its row hashes with `rows` (none if it has no key).
+
+    `keep_rows` leaves the row hashes alone, for a diff that already updated them.
+    """
+    conn.execute(text(f"DELETE FROM {INGEST_STATE_TABLE} WHERE sheet = :sheet"), {"sheet": table})
+    conn.execute(
+        text(f"INSERT INTO {INGEST_STATE_TABLE} (sheet, fingerprint, key_columns, columns_json, "
+             "row_count) VALUES (:sheet, :fp, :key, :cols, :n)"),
+        {"sheet": table, "fp": fingerprint, "key": json.dumps(key),
+         "cols": json.dumps([str(c) for c in df.columns]), "n": len(df)},
+    )
+    if not keep_rows:
+        conn.execute(text(f"DELETE FROM {INGEST_ROWS_TABLE} WHERE sheet = :sheet"), {"sheet": table})
+        if rows is not None:
+            _insert_row_hashes(conn, table, rows)
+
+
+def _insert_row_hashes(conn, table: str, rows: pd.DataFrame):
+    if rows.empty:
+        return
+    conn.execute(
+        text(f"INSERT INTO {INGEST_ROWS_TABLE} (sheet, row_key, row_hash, key_values) "
+             "VALUES (:sheet, :row_key, :row_hash, :key_values)"),
+        [{"sheet": table, **r} for r in rows[["row_key", "row_hash", "key_values"]].to_dict("records")],
+    )
+
+
+def _row_index(df: pd.DataFrame, key: list[str]) -> pd.DataFrame:
+    keys = df[key]
+    return pd.DataFrame({
+        "row_key": _hex_hashes(keys).values,
+        "row_hash": _hex_hashes(df).values,
+        "key_values": [json.dumps([_plain(v) for v in r]) for r in keys.itertuples(index=False)],
+    })
+
+
+def _key_batches(conn, verb: str, table: str, key: list[str], key_values: pd.Series, dtypes: pd.Series):
+    """(statement, params) pairs applying `verb` to the rows of `key_values`, KEY_BATCH_ROWS keys each."""
+    quote = conn.dialect.identifier_preparer.quote
+    # Null-safe equality, so a key part that is NULL in the sheet still matches its row
+    same = {"mysql": "<=>", "sqlite": "IS"}.get(conn.dialect.name, "IS NOT DISTINCT FROM")
+    # Timestamps were stored as text; bind them as DateTime so they match the stored format.
+    is_ts = [pd.api.types.is_datetime64_any_dtype(dtypes[c]) for c in key]
+    per_statement = KEY_BATCH_ROWS
+    if conn.dialect.name == "sqlite":
+        per_statement = max(1, min(per_statement, _max_variables(conn) // len(key)))
+    values = [json.loads(kv) for kv in key_values]
+    for start in range(0, len(values), per_statement):
+        batch = values[start:start + per_statement]
+        where = " OR ".join("(" + " AND ".join(f"{quote(c)} {same} :k{j}_{i}" for i, c in enumerate(key)) + ")"
+                            for j in range(len(batch)))
+        stmt = text(f"{verb} {quote(table)} WHERE {where}").bindparams(
+            *(bindparam(f"k{j}_{i}", type_=DateTime) for j in range(len(batch)) for i, ts in enumerate(is_ts) if ts))
+        yield stmt, {f"k{j}_{i}": pd.Timestamp(v).to_pydatetime() if ts and v is not None else v
+                     for j, row in enumerate(batch) for i, (v, ts) in enumerate(zip(row, is_ts))}
+
+
+def _delete_keys(conn, table: str, key: list[str], key_values: pd.Series, dtypes: pd.Series):
+    for stmt, params in _key_batches(conn, "DELETE FROM", table, key, key_values, dtypes):
+        conn.execute(stmt, params)
+
+
+def _select_keys(conn, table: str, key: list[str], key_values: pd.Series, dtypes: pd.Series) -> pd.DataFrame:
+    return pd.DataFrame([dict(r) for stmt, params in _key_batches(conn, "SELECT * FROM", table, key, key_values, dtypes)
+                         for r in conn.execute(stmt, params).mappings()])
+
+
+def _promote_staging(conn, staging: str, table: str):
+    """Atomically replace `table` with the already-loaded `staging` table."""
+    quote = conn.dialect.identifier_preparer.quote
+    retired = f"{table}__retired"
+    if not inspect(conn).has_table(table):
+        conn.execute(text(f"ALTER TABLE {quote(staging)} RENAME TO {quote(table)}"))
+    elif conn.dialect.name == "mysql":
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote(retired)}"))
+        conn.execute(text(f"RENAME TABLE {quote(table)} TO {quote(retired)}, "
+                          f"{quote(staging)} TO {quote(table)}"))
+        conn.execute(text(f"DROP TABLE {quote(retired)}"))
+    else:
+        conn.execute(text(f"DROP TABLE {quote(table)}"))
+        conn.execute(text(f"ALTER TABLE {quote(staging)} RENAME TO {quote(table)}"))
+
+
+def _swap_in(df: pd.DataFrame, table: str, engine, chunksize: int, method: str = DEFAULT_METHOD):
+    """Load `df` into a staging table, then atomically rename it over `table`."""
+    staging = f"{table}__staging"
+    df.to_sql(staging, engine, if_exists="replace", index=False, chunksize=chunksize,
+              method=_insert_method(method, engine.dialect.name))
+    with engine.begin() as conn:
+        _promote_staging(conn, staging, table)
+
+
+def sync_table(df: pd.DataFrame, table: str, engine, chunksize: int = DEFAULT_CHUNKSIZE,
+               method: str = DEFAULT_METHOD) -> SyncStat:
+    """Bring `table` in line with `df` by applying only the changed rows.
+
+    Each sheet's fingerprint and per-row hashes from the previous run are kept in
+    `_ingest_state` / `_ingest_rows`. Unchanged sheets are skipped outright;
+    otherwise rows are matched on the sheet's natural key (see SHEET_KEYS) and the
+    resulting inserts, updates and deletes are applied in a single transaction, so
+    readers never observe a missing or half-loaded table. Sheets without a usable
+    key are rewritten in one transaction; new tables and column changes are built
+    in a staging table and renamed into place.
+    """
+    start = time.perf_counter()
+    stat = SyncStat(table)
+    insert_chunk = _effective_chunksize(chunksize, method, engine, len(df.columns))
+    insert_method = _insert_method(method, engine.dialect.name)
+    key = resolve_key(table, df)
+    rows = _row_index(df, key) if key else None
+    fingerprint = sheet_fingerprint(df, rows["row_hash"] if rows is not None else None)
+
+    with engine.begin() as conn:
+        _ensure_state_tables(conn)
+        stored = _stored_state(conn, table)
+        exists = inspect(conn).has_table(table)
+
+    if exists and stored and stored[0] == fingerprint:
+        stat.skipped = True
+        stat.seconds = time.perf_counter() - start
+        return stat
+
+    columns = [str(c) for c in df.columns]
+    if not exists or not stored or stored[2] != columns:
+        # New table or changed columns: build a replacement and swap it in.
+        _swap_in(df, table, engine, insert_chunk, method)
+        with engine.begin() as conn:
+            _save_state(conn, table, fingerprint, key, df, rows)
+        stat.inserted, stat.full_reload = len(df), True
+        stat.seconds = time.perf_counter() - start
+        return stat
+
+    if not key or stored[1] != key:
+        # Same columns but no usable key to diff on: rewrite the rows in one transaction.
+        with engine.begin() as conn:
+            conn.execute(text(f"DELETE FROM {conn.dialect.identifier_preparer.quote(table)}"))
+            df.to_sql(table, conn, if_exists="append", index=False,
+                      chunksize=insert_chunk, method=insert_method)
+            _save_state(conn, table, fingerprint, key, df, rows)
+        stat.inserted, stat.full_reload = len(df), True
+        stat.seconds = time.perf_counter() - start
+        return stat
+
+    with engine.begin() as conn:
+        old = pd.read_sql(
+            text(f"SELECT row_key, row_hash, key_values FROM {INGEST_ROWS_TABLE} WHERE sheet = :sheet"),
+            conn, params={"sheet": table},
+        )
+        merged = rows.merge(old, on="row_key", how="outer", suffixes=("", "_old"), indicator=True)
+        added = merged["_merge"] == "left_only"
+        removed = merged["_merge"] == "right_only"
+        changed = (merged["_merge"] == "both") & (merged["row_hash"] != merged["row_hash_old"])
+
+        stale_keys = merged.loc[removed | changed, "key_values_old"]
+        stat.replaced_rows = _select_keys(conn, table, key, stale_keys, df.dtypes)
+        _delete_keys(conn, table, key, stale_keys, df.dtypes)
+        upserts = rows["row_key"].isin(merged.loc[added | changed, "row_key"]).values
+        stat.upserted_rows = df[upserts]
+        if upserts.any():
+            df[upserts].to_sql(table, conn, if_exists="append", index=False,
+                               chunksize=insert_chunk, method=insert_method)
+
+        stale = merged.loc[removed | changed, "row_key"].tolist()
+        if stale:
+            conn.execute(
+                text(f"DELETE FROM {INGEST_ROWS_TABLE} WHERE sheet = :sheet AND row_key = :row_key"),
+                [{"sheet": table, "row_key": k} for k in stale],
+            )
+        _insert_row_hashes(conn, table, rows[upserts])
+        _save_state(conn, table, fingerprint, key, df, None, keep_rows=True)
+
+    stat.inserted, stat.updated, stat.deleted = int(added.sum()), int(changed.sum()), int(removed.sum())
+    stat.seconds = time.perf_counter() - start
+    return stat
+
+
+def incremental_load(excel_file, engine, chunksize: int = DEFAULT_CHUNKSIZE, method: str = DEFAULT_METHOD,
+                     report=print):
+    """Sync every sheet of `excel_file` into `engine`, touching only changed rows."""
+    xls = excel_file if isinstance(excel_file, pd.ExcelFile) else pd.ExcelFile(excel_file)
+    stats = []
+    for sheet_name in xls.sheet_names:
+        stat = sync_table(xls.parse(sheet_name), sheet_name, engine, chunksize, method)
+        if not stat.skipped:
+            data_version.bump(engine, sheet_name)
+        report(str(stat))
+        stats.append(stat)
+    return stats
+
+
+# ==============================
+# Streaming loader (bounded memory, typed DDL)
+# ==============================
+DEFAULT_BATCH_ROWS = 5000
+
+# Low-cardinality columns and their known values (the options the CRUD form offers).
+CATEGORICAL_DOMAINS = {
+    "Region": ["Central", "East", "South", "West"],
+    "Segment": ["Consumer", "Corporate", "Home Office"],
+    "Category": ["Furniture", "Office Supplies", "Technology"],
+}
+DATE_COLUMNS = {"Purchase_Date", "Order Date", "Ship Date", "Order_Date", "Ship_Date"}
+
+# (MySQL type, pandas nullable dtype, min, max), narrowest first.
+INT_TYPES = [
+    ("TINYINT", "Int8", -2**7, 2**7 - 1),
+    ("SMALLINT", "Int16", -2**15, 2**15 - 1),
+    ("INT", "Int32", -2**31, 2**31 - 1),
+    ("BIGINT", "Int64", -2**63, 2**63 - 1),
+]
+# Integer widths are chosen with this much headroom over the sampled range.
+INT_HEADROOM = 4
+
+
+@dataclass
+class ColumnSpec:
+    name: str
+    kind: str  # category | date | datetime | bool | int | float | text
+    int_type: int = 0  # index into INT_TYPES
+    text_len: int = 0
+
+    def sql_type(self, dialect: str) -> str:
+        mysql = dialect == "mysql"
+        if self.kind == "category":
+            if mysql:
+                return "ENUM(" + ", ".join(f"'{v}'" for v in CATEGORICAL_DOMAINS[self.name]) + ")"
+            return "TEXT"
+        if self.kind == "date":
+            return "DATE"
+        if self.kind == "datetime":
+            return "DATETIME"
+        if self.kind == "bool":
+            return "BOOLEAN"
+        if self.kind == "int":
+            return INT_TYPES[self.int_type][0] if mysql else "INTEGER"
+        if self.kind == "float":
+            return "DOUBLE" if mysql else "REAL"
+        if mysql and self.text_len <= 255:
+            return f"VARCHAR({max(self.text_len, 1)})"
+        return "TEXT"
+
+    def convert(self, values: list) -> pd.Series:
+        if self.kind == "category":
+            return pd.Series(pd.Categorical(values, categories=CATEGORICAL_DOMAINS[self.name]))
+        if self.kind == "date":
+            return pd.Series(pd.to_datetime(values).date, dtype=object).where(pd.notna(values), None)
+        if self.kind == "datetime":
+            return pd.Series(pd.to_datetime(values))
+        if self.kind == "bool":
+            return pd.Series(values, dtype="boolean")
+        if self.kind == "int":
+            return pd.Series(values, dtype=INT_TYPES[self.int_type][1])
+        if self.kind == "float":
+            return pd.Series(values, dtype="float64")
+        return pd.Series(values, dtype=object)
+
+    def fits(self, values: list) -> bool:
+        """Whether every value in `values` can be stored without loss in this column."""
+        present = [v for v in values if v is not None and v != ""]
+        if self.kind == "category":
+            return set(present) <= set(CATEGORICAL_DOMAINS[self.name])
+        if self.kind in ("date", "datetime"):
+            return all(isinstance(v, (datetime.date, datetime.datetime)) for v in present)
+        if self.kind == "bool":
+            return all(isinstance(v, bool) for v in present)
+        if self.kind == "int":
+            _, _, lo, hi = INT_TYPES[self.int_type]
+            return all((isinstance(v, int) or (isinstance(v, float) and v.is_integer())) and lo <= v <= hi
+                       for v in present)
+        if self.kind == "float":
+            return all(isinstance(v, (int, float)) for v in present)
+        return self.text_len > 255 or all(len(str(v)) <= self.text_len for v in present)
+
+
+# Column types come from the first batch. A later batch that does not fit (a value
+# outside a categorical domain, a longer string, a larger integer, a new kind of
+# value) widens the column in place instead of losing the value or failing the load.
+def _widen(spec: ColumnSpec, values: list) -> ColumnSpec:
+    """The narrowest column that holds both what `spec` holds and `values`."""
+    if spec.fits(values):
+        return spec
+    new = _infer_column(spec.name, values)
+    kinds = {spec.kind, new.kind}
+    if kinds == {"int"}:
+        return ColumnSpec(spec.name, "int", int_type=max(spec.int_type, new.int_type))
+    if kinds <= {"bool", "int"}:
+        return new if new.kind == "int" else ColumnSpec(spec.name, "int", int_type=spec.int_type)
+    if kinds <= {"bool", "int", "float"}:
+        return ColumnSpec(spec.name, "float")
+    if kinds <= {"date", "datetime"}:
+        return ColumnSpec(spec.name, "datetime")
+    longest = max(len(str(v)) for v in values if v is not None)
+    old = max(map(len, CATEGORICAL_DOMAINS[spec.name])) if spec.kind == "category" else spec.text_len
+    return ColumnSpec(spec.name, "text", text_len=max(old, 255 if 2 * longest <= 255 else 256))
+
+
+def _infer_column(name: str, values: list) -> ColumnSpec:
+    present = [v for v in values if v is not None and v != ""]
+    if not present:
+        return ColumnSpec(name, "text", text_len=255)
+    if name in CATEGORICAL_DOMAINS and set(present) <= set(CATEGORICAL_DOMAINS[name]):
+        return ColumnSpec(name, "category")
+    if all(isinstance(v, (datetime.date, datetime.datetime)) for v in present):
+        midnight = all(not isinstance(v, datetime.datetime) or v.time() == datetime.time() for v in present)
+        return ColumnSpec(name, "date" if name in DATE_COLUMNS or midnight else "datetime")
+    if all(isinstance(v, bool) for v in present):
+        return ColumnSpec(name, "bool")
+    if all(isinstance(v, int) or (isinstance(v, float) and v.is_integer()) for v in present):
+        low, high = min(present) * INT_HEADROOM, max(present) * INT_HEADROOM
+        width = next((i for i, (_, _, lo, hi) in enumerate(INT_TYPES) if lo <= low and high <= hi), None)
+        if width is not None:
+            return ColumnSpec(name, "int", int_type=width)
+        return ColumnSpec(name, "float")
+    if all(isinstance(v, (int, float)) for v in present):
+        return ColumnSpec(name, "float")
+    # VARCHAR storage is variable-length, so only very long samples need TEXT.
+    longest = max(len(str(v)) for v in present)
+    return ColumnSpec(name, "text", text_len=255 if 2 * longest <= 255 else 256)
+
+
+def infer_schema(header: list[str], sample: list[tuple]) -> list[ColumnSpec]:
+    """Pick a compact column type for each column from a sample of rows."""
+    return [_infer_column(name, [row[i] for row in sample]) for i, name in enumerate(header)]
+
+
+def typed_ddl(table: str, specs: list[ColumnSpec], dialect) -> str:
+    quote = dialect.identifier_preparer.quote
+    columns = ",\n  ".join(f"{quote(c.name)} {c.sql_type(dialect.name)}" for c in specs)
+    return f"CREATE TABLE {quote(table)} (\n  {columns}\n)"
+
+
+def iter_sheet_batches(worksheet, batch_rows: int = DEFAULT_BATCH_ROWS):
+    """Yield (header, rows) batches from a read-only openpyxl worksheet."""
+    rows = worksheet.iter_rows(values_only=True)
+    header = [str(h) for h in next(rows, ())]
+    batch = []
+    for row in rows:
+        if any(v is not None for v in row):
+            batch.append(row[:len(header)])
+        if len(batch) >= batch_rows:
+            yield header, batch
+            batch = []
+    if batch:
+        yield header, batch
+
+
+def _batch_frame(specs: list[ColumnSpec], batch: list[tuple]) -> pd.DataFrame:
+    columns = {}
+    for i, spec in enumerate(specs):
+        try:
+            columns[spec.name] = spec.convert([row[i] for row in batch])
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"Column '{spec.name}' could not be converted to {spec.kind}") from e
+    return pd.DataFrame(columns)
+
+
+def _widen_columns(conn, table: str, specs: list[ColumnSpec], batch: list[tuple],
+                   report=print) -> list[ColumnSpec]:
+    """Widen the columns of `table` that `batch` does not fit; returns the new specs."""
+    widened = [_widen(spec, [row[i] for row in batch]) for i, spec in enumerate(specs)]
+    quote = conn.dialect.identifier_preparer.quote
+    for old, new in zip(specs, widened):
+        if new is old:
+            continue
+        report(f"[ingest] {table}.{old.name}: {old.sql_type(conn.dialect.name)} -> "
+               f"{new.sql_type(conn.dialect.name)}")
+        if conn.dialect.name == "mysql":  # SQLite keeps whatever value it is given
+            conn.execute(text(f"ALTER TABLE {quote(table)} MODIFY COLUMN {quote(new.name)} "
+                              f"{new.sql_type(conn.dialect.name)}"))
+    return widened
+
+
+def stream_table(worksheet, table: str, engine, batch_rows: int = DEFAULT_BATCH_ROWS,
+                 method: str = DEFAULT_METHOD, report=print) -> LoadStat:
+    """Load one worksheet in bounded batches into a table created from inferred DDL.
+
+    Column types are inferred from the first batch and widened when a later batch
+    does not fit them. Rows are written to a staging table which replaces `table`
+    only once the whole sheet has been loaded.
+    """
+    start = time.perf_counter()
+    staging = f"{table}__staging"
+    specs, total = None, 0
+    with engine.begin() as conn:
+        quote = conn.dialect.identifier_preparer.quote
+        conn.execute(text(f"DROP TABLE IF EXISTS {quote(staging)}"))
+        for header, batch in iter_sheet_batches(worksheet, batch_rows):
+            if specs is None:
+                specs = infer_schema(header, batch)
+                conn.execute(text(typed_ddl(staging, specs, conn.dialect)))
+            else:
+                specs = _widen_columns(conn, staging, specs, batch, report)
+            frame = _batch_frame(specs, batch)
+            frame.to_sql(staging, conn, if_exists="append", index=False,
+                         method=_insert_method(method, conn.dialect.name),
+                         chunksize=_effective_chunksize(batch_rows, method, conn, len(specs)))
+            total += len(batch)
+        if specs is not None:
+            _promote_staging(conn, staging, table)
+    return LoadStat(table, total, time.perf_counter() - start)
+
+
+def stream_load(excel_file: str, engine, batch_rows: int = DEFAULT_BATCH_ROWS, method: str = DEFAULT_METHOD,
+                report=print):
+    """Stream every sheet of `excel_file` into `engine` with flat peak memory."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    stats = []
+    try:
+        for sheet_name in workbook.sheetnames:
+            stat = stream_table(workbook[sheet_name], sheet_name, engine, batch_rows, method, report)
+            data_version.bump(engine, sheet_name)
+            report(str(stat))
+            stats.append(stat)
+    finally:
+        workbook.close()
+    return stats
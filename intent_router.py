@@ -0,0 +1,166 @@
+import re
+import time
+from dataclasses import dataclass, field
+from sqlalchemy import inspect, text
+
+import rollups
+from orders_store import RETURN_SQL, RETURN_WINDOW_DAYS, order_key, return_cutoff, return_orders
+
+# ==============================
+# Fast path for the common orders_2 requests
+# ==============================
+# Each intent is a regex over the question plus a parameterized statement. Questions
+# that match none of them go to the SQL agent unchanged.
+DEFAULT_TOP_N = 5
+
+_NAME = r"(?P<name>[A-Za-z][\w.'\- ]*?)"
+_CUSTOMER_ID = r"(?P<customer_id>[A-Za-z]{1,4}-?\d+)"
+_QUOTE = r"[`'\"]?"
+_WHO = rf"(?:customer[_ ]?id )?{_QUOTE}(?:{_CUSTOMER_ID}|{_NAME}){_QUOTE}"
+
+
+@dataclass
+class RouteResult:
+    path: str  # "fast:<intent>" or "agent"
+    answer: str
+    rows: list = field(default_factory=list)
+    sql: str | None = None
+    seconds: float = 0.0
+
+
+def _customer_filter(groups: dict) -> tuple[str, dict]:
+    if groups.get("customer_id"):
+        return "Customer_ID = :who", {"who": groups["customer_id"]}
+    return "Customer_Name = :who", {"who": groups["name"].strip()}
+
+
+def _undelivered(conn, groups):
+    sql = ("SELECT Customer_ID, Customer_Name, Product_Name, Quantity, Purchase_Date "
+           "FROM orders_2 WHERE Delivered = 'NO' ORDER BY Purchase_Date")
+    rows = conn.execute(text(sql)).mappings().all()
+    return f"{len(rows)} undelivered order(s).", rows, sql
+
+
+def _mark_delivered(conn, groups):
+    sql = "UPDATE orders_2 SET Delivered = 'YES' WHERE Customer_ID = :cid AND Delivered = 'NO'"
+    count = conn.execute(text(sql), {"cid": groups["customer_id"]}).rowcount
+    if not count:
+        return f"No undelivered orders found for Customer_ID {groups['customer_id']}.", [], sql
+    rollups.refresh_where(conn, "orders_2", "Customer_ID = :cid", {"cid": groups["customer_id"]})
+    return f"Marked {count} order(s) for Customer_ID {groups['customer_id']} as delivered.", [], sql
+
+
+def _singular(name: str) -> str:
+    """"Office Chairs" -> "Office Chair", "Boxes" -> "Box"; "Glass" and "Address" stay as they are."""
+    lower = name.lower()
+    if lower.endswith("ies") and len(name) > 4:
+        return name[:-3] + ("Y" if name[-3:].isupper() else "y")
+    if lower.endswith(("sses", "shes", "ches", "xes", "zes")):
+        return name[:-2]
+    if lower.endswith("s") and not lower.endswith(("ss", "us", "is")):
+        return name[:-1]
+    return name
+
+
+def _update_quantity(conn, groups):
+    where, params = _customer_filter(groups)
+    product = groups["product"].strip()
+    params.update(qty=int(groups["quantity"]), product=product)
+    sql = (f"UPDATE orders_2 SET Quantity = :qty WHERE {where} AND Delivered = 'NO' "
+           "AND Product_Name = :product")
+    count = conn.execute(text(sql), params).rowcount
+    statements = 1
+    if not count and _singular(product) != product:
+        # "7 Office Chairs" should match the product "Office Chair", but only if no
+        # product is named exactly as asked
+        params["product"] = _singular(product)
+        count = conn.execute(text(sql), params).rowcount
+        statements += 1
+    if not count:
+        return f"No undelivered {product} order found for {params['who']}.", [], sql
+    rollups.refresh_where(conn, "orders_2", where, params, bumps=statements)  # one bump per UPDATE
+    return f"Updated {count} {product} order(s) for {params['who']} to quantity {params['qty']}.", [], sql
+
+
+def _return_check(conn, groups):
+    where, params = _customer_filter(groups)
+    params["cutoff"] = return_cutoff()
+    key = order_key(conn.dialect.name)
+    sql = (f"SELECT {key} AS Order_Key, Customer_ID, Customer_Name, Product_Name, Purchase_Date, Delivered, "
+           "CASE WHEN Delivered = 'YES' AND Purchase_Date >= :cutoff THEN 1 ELSE 0 END AS Eligible "
+           f"FROM orders_2 WHERE {where}")
+    rows = conn.execute(text(sql), params).mappings().all()
+    if not rows:
+        return f"No orders found for {params['who']}.", [], sql
+    eligible = [r for r in rows if r["Eligible"]]
+    if not eligible:
+        return (f"Sorry, {params['who']} has no delivered order within the {RETURN_WINDOW_DAYS}-day "
+                "return window, so the return is denied."), rows, sql
+    if groups.get("check"):
+        return f"{len(eligible)} order(s) for {params['who']} are eligible for return.", rows, sql
+
+    # Same transition as agent-2's Process Return page: RETURNED plus a `returns` row each
+    insp = inspect(conn)
+    returns_columns = [c["name"] for c in insp.get_columns("returns")] if insp.has_table("returns") else []
+    returned = return_orders(conn, [r["Order_Key"] for r in eligible], returns_columns, conn.dialect.name)
+    return (f"Returned {len(returned)} order(s) for {params['who']} (within {RETURN_WINDOW_DAYS} days).",
+            rows, RETURN_SQL.format(key=key))
+
+
+def _top_products(conn, groups):
+    sql = ("SELECT Product_Name, SUM(Quantity) AS Total_Quantity FROM orders_2 "
+           "GROUP BY Product_Name ORDER BY Total_Quantity DESC LIMIT :n")
+    rows = conn.execute(text(sql), {"n": int(groups.get("n") or DEFAULT_TOP_N)}).mappings().all()
+    return f"Top {len(rows)} product(s) by total quantity ordered.", rows, sql
+
+
+# (intent, handler, writes, patterns) — first match wins
+INTENTS = [
+    ("undelivered", _undelivered, False, [
+        r"^(?:show|list|get|display)(?: me)?(?: all)?(?: the)? (?:undelivered|pending|not delivered) orders$",
+        r"^which orders (?:are|have) not (?:been )?delivered(?: yet)?$",
+    ]),
+    ("mark_delivered", _mark_delivered, True, [
+        rf"^mark (?:customer[_ ]?id )?{_QUOTE}{_CUSTOMER_ID}{_QUOTE}(?:'s)?(?: orders?)? as delivered$",
+    ]),
+    ("update_quantity", _update_quantity, True, [
+        rf"^(?:update|change|set) {_NAME}'s? order to "
+        rf"(?P<quantity>\d+) {_QUOTE}(?P<product>[^`'\"]+?){_QUOTE}$",
+        rf"^(?:update|change|set) (?:the )?quantity (?:of|for) (?:customer[_ ]?id )?{_QUOTE}{_CUSTOMER_ID}{_QUOTE}"
+        rf"(?:'s)? {_QUOTE}(?P<product>[^`'\"]+?){_QUOTE}(?: order)? to (?P<quantity>\d+)$",
+    ]),
+    ("return_check", _return_check, True, [
+        rf"^(?P<check>(?:check )?(?:is|are|can) ){_WHO}(?:'s?)? orders? "
+        r"(?:eligible for (?:a )?return|returnable|be returned)(?: within 30 days)?$",
+        rf"^return {_WHO}(?:'s?)? orders?"
+        r"(?: if (?:it is |it's )?(?:eligible|within (?:the )?30 days(?: of purchase)?))?$",
+    ]),
+    ("top_products", _top_products, False, [
+        r"^(?:show|list|what are)(?: me)?(?: the)? top (?P<n>\d+)? ?products(?: by (?:total )?quantity(?: ordered)?)?$",
+    ]),
+]
+_COMPILED = [(name, handler, writes, [re.compile(p, re.IGNORECASE) for p in patterns])
+             for name, handler, writes, patterns in INTENTS]
+
+
+def match(question: str):
+    """(intent, handler, writes, params) for a recognized question, else None."""
+    question = re.sub(r"\s+", " ", question.strip().replace("\u2019", "'")).rstrip("?.! ")
+    for name, handler, writes, patterns in _COMPILED:
+        for pattern in patterns:
+            m = pattern.match(question)
+            if m:
+                return name, handler, writes, {k: v for k, v in m.groupdict().items() if v}
+    return None
+
+
+def try_fast_path(engine, question: str) -> RouteResult | None:
+    """Serve `question` with prebuilt SQL, or return None to fall back to the agent."""
+    start = time.perf_counter()
+    matched = match(question)
+    if matched is None:
+        return None
+    name, handler, writes, params = matched
+    with (engine.begin() if writes else engine.connect()) as conn:
+        answer, rows, sql = handler(conn, params)
+    return RouteResult(f"fast:{name}", answer, [dict(r) for r in rows], sql, time.perf_counter() - start)
@@ -0,0 +1,641 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import inspect
+
+import data_version
+import rollups
+from index_advisor import SURROGATE_KEYS, TEXT_PREFIX, resolve_column
+from ingestion import CATEGORICAL_DOMAINS
+
+# ==============================
+# Connection pool
+# ==============================
+DEFAULT_POOL_SIZE = 5
+DEFAULT_CHECKOUT_TIMEOUT = 10.0
+# Connections idle for longer than this are pinged before being handed out.
+DEFAULT_PING_AFTER = 30.0
+
+
+class PoolTimeout(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """A small bounded pool shared by every Streamlit session of the app.
+
+    Connections are created lazily up to `size`, health-checked when they have
+    been idle for `ping_after` seconds, and discarded if they fail the check or
+    error while checked out.
+    """
+
+    def __init__(self, connect, backend: str, size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_CHECKOUT_TIMEOUT, ping_after: float = DEFAULT_PING_AFTER):
+        self._connect = connect
+        self.backend = backend
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.stats = {"created": 0, "reused": 0, "pinged": 0, "discarded": 0, "waits": 0}
+
+    def _count(self, name: str):
+        with self._lock:  # sessions check out from several threads
+            self.stats[name] += 1
+
+    def _new(self):
+        conn = self._connect()
+        self._count("created")
+        return conn
+
+    def _healthy(self, conn) -> bool:
+        self._count("pinged")
+        try:
+            if hasattr(conn, "ping"):
+                conn.ping(reconnect=False)
+            else:
+                conn.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self.stats["discarded"] += 1
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _checkout(self):
+        try:
+            conn, idle_since = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    return self._new()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            self._count("waits")
+            try:
+                conn, idle_since = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise PoolTimeout(f"No database connection free after {self.timeout}s "
+                                  f"(pool size {self.size})") from None
+        if time.monotonic() - idle_since > self.ping_after and not self._healthy(conn):
+            self._discard(conn)
+            return self._checkout()
+        self._count("reused")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                self._discard(conn)  # broken connection; the next checkout opens a new one
+            else:
+                self._idle.put((conn, time.monotonic()))
+            raise
+        self._idle.put((conn, time.monotonic()))
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+def mysql_pool(host: str, user: str, password: str, database: str, **kwargs) -> ConnectionPool:
+    import mysql.connector
+
+    def connect():
+        return mysql.connector.connect(host=host, user=user, password=password, database=database)
+
+    return ConnectionPool(connect, "mysql", **kwargs)
+
+
+def sqlite_pool(path: str, **kwargs) -> ConnectionPool:
+    def connect():
+        conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    return ConnectionPool(connect, "sqlite", **kwargs)
+
+
+# ==============================
+# Statement timing
+# ==============================
+class StatementTimer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = {}
+
+    @contextmanager
+    def time(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                count, total, worst = self.timings.get(name, (0, 0.0, 0.0))
+                self.timings[name] = (count + 1, total + elapsed, max(worst, elapsed))
+
+    def report(self) -> list[dict]:
+        with self._lock:
+            return [{"statement": name, "calls": count, "avg_ms": round(total / count, 2),
+                     "max_ms": round(worst, 2), "total_ms": round(total, 2)}
+                    for name, (count, total, worst) in sorted(self.timings.items())]
+
+
+# ==============================
+# Read cache
+# ==============================
+# Streamlit reruns the whole page on every click, repeating the same listing queries.
+# Results are cached per (statement, params) together with the orders_2 version from
+# data_version, and served while that version is unchanged. The version is re-read
+# after this store's own writes and at most every VERSION_CHECK_SECONDS otherwise, so
+# writes from other processes (agent-2-new, ingestion) show up within that interval.
+CACHE_ENTRIES = 256
+CACHE_ROWS = 100_000  # across all entries; least recently used entries go first
+VERSION_CHECK_SECONDS = float(os.getenv("ORDERS_CACHE_VERSION_CHECK_SECONDS", 5))
+
+
+class ReadCache:
+    def __init__(self, size: int = CACHE_ENTRIES, max_rows: int = CACHE_ROWS):
+        self.size = size
+        self.max_rows = max_rows
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple, tuple[int, list[dict], float]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "version_checks": 0, "saved_ms": 0.0}
+
+    def get(self, key: tuple, version: int) -> list[dict] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.stats["misses"] += 1
+                self.stats["stale"] += entry is not None
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["saved_ms"] += entry[2]
+            return [dict(r) for r in entry[1]]
+
+    def put(self, key: tuple, version: int, rows: list[dict], elapsed_ms: float):
+        if len(rows) > self.max_rows:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            self._rows += len(rows) - (len(old[1]) if old else 0)
+            self._entries[key] = (version, [dict(r) for r in rows], elapsed_ms)
+            while len(self._entries) > self.size or self._rows > self.max_rows:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._rows -= len(evicted)
+
+    def count_version_check(self):
+        with self._lock:
+            self.stats["version_checks"] += 1
+
+    def report(self) -> dict:
+        with self._lock:
+            s = dict(self.stats)
+            entries, rows = len(self._entries), self._rows
+        lookups = s["hits"] + s["misses"]
+        return {"hits": s["hits"], "misses": s["misses"], "stale": s["stale"],
+                "hit_rate": round(s["hits"] / lookups, 3) if lookups else 0.0,
+                # each hit skips a query; version checks are the cache's own DB calls
+                "db_calls_saved": s["hits"] - s["version_checks"],
+                "version_checks": s["version_checks"], "db_ms_saved": round(s["saved_ms"], 1),
+                "entries": entries, "rows": rows}
+
+
+# ==============================
+# orders_2 data access
+# ==============================
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value[:10]).date()
+    return value
+
+
+DEFAULT_PAGE_SIZE = 50
+ORDER_COLUMNS = "Customer_ID, Customer_Name, Product_Name, Quantity, Purchase_Date, Delivered"
+
+# Columns a batch import must provide, in INSERT order.
+IMPORT_COLUMNS = ["Customer_Name", "Customer_ID", "Segment", "Country", "State", "Postal_Code",
+                  "Region", "Category", "Product_Name", "Quantity"]
+# Keys per statement for bulk IN (...) updates.
+BULK_KEY_CHUNK = 1000
+
+# Delivered orders can be returned for this many days after purchase. Eligibility is a
+# range over this index, so it lapses without any per-row state to expire.
+RETURN_WINDOW_DAYS = 30
+RETURN_INDEX = "ix_orders_2_delivered_purchase_date"
+# `returns` rows written for orders_2 orders, which have no Superstore Order ID
+RETURN_ORDER_ID = "orders_2-{}"
+RETURN_SQL = ("UPDATE orders_2 SET Delivered='RETURNED' "
+              "WHERE {key}=%s AND Delivered='YES' AND Purchase_Date >= %s")
+
+
+def order_key(dialect: str) -> str:
+    """The column orders_2 rows are addressed by (see OrdersStore)."""
+    return SURROGATE_KEYS["orders_2"] if dialect == "mysql" else "rowid"
+
+
+def return_cutoff() -> date:
+    """Earliest Purchase_Date still inside the return window."""
+    return date.today() - timedelta(days=RETURN_WINDOW_DAYS)
+
+
+def _run(target, dialect: str, sql: str, params, many: bool = False) -> int:
+    if dialect == "sqlite":
+        sql = sql.replace("%s", "?")
+    if hasattr(target, "exec_driver_sql"):
+        return target.exec_driver_sql(sql, list(params) if many else tuple(params)).rowcount
+    (target.executemany if many else target.execute)(sql, params)
+    return target.rowcount
+
+
+def return_orders(target, order_keys, returns_columns: list[str], dialect: str) -> list:
+    """Move the returnable orders among `order_keys` to RETURNED and add their `returns` rows.
+
+    Shared by OrdersStore.mark_return and the agent-2-new fast path, so a return is
+    recorded the same way in both apps. `target` is a DB-API cursor or a SQLAlchemy
+    connection (whose writes data_version.track_writes versions); the caller owns the
+    transaction. Orders that are undelivered, already returned or past the window are
+    left alone. Returns the keys that were returned.
+    """
+    key = order_key(dialect)
+    cutoff = return_cutoff()
+    update = RETURN_SQL.format(key=key)
+    returned = [k for k in order_keys if _run(target, dialect, update, (k, cutoff)) == 1]
+    if not returned:
+        return []
+    cursor = not hasattr(target, "exec_driver_sql")
+    if cursor:
+        data_version.bump_cursor(target, "orders_2", dialect=dialect)
+    maintained = cursor or inspect(target).has_table(rollups.STATE_TABLE)
+    if maintained:
+        # One version bump here, or one per UPDATE above under data_version.track_writes
+        rollups.refresh_cursor(target, "orders_2", f"{key} IN ({', '.join(['%s'] * len(returned))})",
+                               returned, dialect=dialect, bumps=1 if cursor else len(order_keys))
+    order_id = resolve_column(returns_columns, "order_id")
+    if order_id:
+        columns = [order_id] + (["Returned"] if "Returned" in returns_columns else [])
+        rows = [(RETURN_ORDER_ID.format(k), "Yes")[:len(columns)] for k in returned]
+        _run(target, dialect, f"INSERT INTO returns ({', '.join(f'`{c}`' for c in columns)}) "
+                              f"VALUES ({', '.join(['%s'] * len(columns))})", rows, many=True)
+        if cursor:
+            data_version.bump_cursor(target, "returns", dialect=dialect)
+        if maintained:
+            # The rows match no `orders` line, so rollup_sales is still current
+            rollups.record_cursor(target, "returns", dialect=dialect)
+    return returned
+
+
+@dataclass
+class BatchResult:
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else float("inf")
+
+
+def validate_orders(df: pd.DataFrame):
+    """Split an uploaded batch into (valid, rejected) frames with column-wise checks.
+
+    Rejected rows carry an `Error` column listing every failed check.
+    """
+    missing = [c for c in IMPORT_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    df = df.copy()
+    text_cols = [c for c in IMPORT_COLUMNS if c != "Quantity"]
+    df[text_cols] = df[text_cols].astype("string").apply(lambda col: col.str.strip())
+    quantity = pd.to_numeric(df["Quantity"], errors="coerce")
+
+    checks = {
+        "Customer_ID is empty": df["Customer_ID"].fillna("").eq(""),
+        "Customer_Name is empty": df["Customer_Name"].fillna("").eq(""),
+        "Product_Name is empty": df["Product_Name"].fillna("").eq(""),
+        "Quantity must be a whole number >= 1": ~(quantity.ge(1) & quantity.mod(1).eq(0)),
+    }
+    for column, allowed in CATEGORICAL_DOMAINS.items():
+        checks[f"{column} must be one of {', '.join(allowed)}"] = ~df[column].isin(allowed)
+    failed = pd.DataFrame(checks)
+
+    bad = failed.any(axis=1)
+    errors = pd.Series(["; ".join(failed.columns[row]) for row in failed[bad].to_numpy()],
+                       index=df.index[bad], dtype=str)
+    valid = df.loc[~bad, IMPORT_COLUMNS].assign(Quantity=quantity[~bad].astype(int))
+    rejected = df.loc[bad].assign(Error=errors)
+    return valid, rejected
+
+
+class OrdersStore:
+    """Every read and write the CRUD app makes against `orders_2`.
+
+    Orders are addressed by a unique, indexed key: the AUTO_INCREMENT `Order_ID`
+    that data-ingestion.py adds on MySQL (index_advisor.SURROGATE_KEYS) and the
+    implicit `rowid` on SQLite. Listings page over that key.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.timer = StatementTimer()
+        self.cache = ReadCache()
+        self._version = None
+        self._version_checked = 0.0
+        self.key = order_key(pool.backend)
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(data_version.CREATE_SQL)
+            cursor.execute(rollups.CREATE_STATE_SQL)
+            self._check_key(cursor)
+            self._ensure_return_index(cursor)
+            self.returns_columns = self._columns(cursor, "returns")
+            cursor.close()
+            conn.commit()
+
+    def _columns(self, cursor, table: str) -> list[str]:
+        if self.pool.backend == "mysql":
+            cursor.execute("SHOW TABLES LIKE %s", (table,))
+        else:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if not cursor.fetchall():
+            return []
+        cursor.execute(f"SELECT * FROM `{table}` LIMIT 0")
+        names = [d[0] for d in cursor.description]
+        cursor.fetchall()
+        return names
+
+    def _check_key(self, cursor):
+        """Fail clearly if orders_2 was rebuilt without its key (e.g. loaded by another tool)."""
+        if self.pool.backend != "mysql":
+            return
+        cursor.execute(f"SHOW COLUMNS FROM orders_2 LIKE '{self.key}'")
+        if not cursor.fetchall():
+            raise RuntimeError(f"orders_2 has no {self.key} column. Reload it with data-ingestion.py, "
+                               "which adds it, or run index_advisor.ensure_surrogate_keys(engine).")
+
+    def _ensure_return_index(self, cursor):
+        if self.pool.backend == "sqlite":
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {RETURN_INDEX} ON orders_2 (Delivered, Purchase_Date)")
+            return
+        cursor.execute(f"SHOW INDEX FROM orders_2 WHERE Key_name = '{RETURN_INDEX}'")
+        if cursor.fetchall():
+            return
+        cursor.execute("SHOW COLUMNS FROM orders_2 LIKE 'Delivered'")
+        column = cursor.fetchall()
+        if not column:  # nothing to index; return checks then scan
+            return
+        is_text = "text" in str(column[0][1]).lower()
+        delivered = f"Delivered({TEXT_PREFIX})" if is_text else "Delivered"
+        cursor.execute(f"CREATE INDEX {RETURN_INDEX} ON orders_2 ({delivered}, Purchase_Date)")
+
+    def _sql(self, query: str) -> str:
+        return query.replace("%s", "?") if self.pool.backend == "sqlite" else query
+
+    def _cursor(self, conn):
+        return conn.cursor(dictionary=True) if self.pool.backend == "mysql" else conn.cursor()
+
+    def _rows(self, cursor) -> list[dict]:
+        rows = [dict(r) for r in cursor.fetchall()]
+        for row in rows:
+            if "Purchase_Date" in row:
+                row["Purchase_Date"] = _as_date(row["Purchase_Date"])
+        return rows
+
+    def version(self) -> int:
+        """orders_2's data_version counter, re-read at most every VERSION_CHECK_SECONDS."""
+        if self._version is None or time.monotonic() - self._version_checked > VERSION_CHECK_SECONDS:
+            with self.pool.connection() as conn, self.timer.time("version_check"):
+                cursor = conn.cursor()
+                version = data_version.read_cursor(cursor, "orders_2", dialect=self.pool.backend)
+                if self._version is not None and version != self._version:
+                    self._check_key(cursor)  # a reload may have replaced the table
+                self._version = version
+                cursor.close()
+                if self.pool.backend == "mysql":
+                    conn.commit()
+            self._version_checked = time.monotonic()
+            self.cache.count_version_check()
+        return self._version
+
+    def query(self, name: str, query: str, params=()) -> list[dict]:
+        key = (query, tuple(params))
+        version = self.version()
+        rows = self.cache.get(key, version)
+        if rows is not None:
+            return rows
+        start = time.perf_counter()
+        with self.pool.connection() as conn, self.timer.time(name):
+            cursor = self._cursor(conn)
+            cursor.execute(self._sql(query), params)
+            rows = self._rows(cursor)
+            cursor.close()
+            if self.pool.backend == "mysql":
+                conn.commit()  # end the read snapshot so the next checkout sees fresh data
+        self.cache.put(key, version, rows, (time.perf_counter() - start) * 1000)
+        return rows
+
+    def _written(self, cursor, touched):
+        """Bump the version and refresh the rollup months of the `touched` (where, params) rows."""
+        data_version.bump_cursor(cursor, "orders_2", dialect=self.pool.backend)
+        if touched is not None:
+            with self.timer.time("refresh_rollups"):
+                rollups.refresh_cursor(cursor, "orders_2", *touched, dialect=self.pool.backend)
+
+    def execute_many(self, name: str, query: str, seq_of_params, touched=None) -> int:
+        """Run `query` for every parameter tuple in one transaction."""
+        with self.pool.connection() as conn, self.timer.time(name):
+            cursor = conn.cursor()
+            cursor.executemany(self._sql(query), seq_of_params)
+            affected = cursor.rowcount
+            self._written(cursor, touched)
+            conn.commit()
+            cursor.close()
+        self._version = None  # re-read on the next query: cached rows predate this write
+        return affected
+
+    def execute(self, name: str, query: str, params=(), touched=None) -> int:
+        with self.pool.connection() as conn, self.timer.time(name):
+            cursor = conn.cursor()
+            cursor.execute(self._sql(query), params)
+            affected = cursor.rowcount
+            self._written(cursor, touched)
+            conn.commit()
+            cursor.close()
+        self._version = None  # re-read on the next query: cached rows predate this write
+        return affected
+
+    # ---- the five CRUD operations ----
+    def insert_order(self, customer_name, customer_id, segment, country, state, postal_code,
+                     region, category, product_name, quantity):
+        query = """
+            INSERT INTO orders_2
+            (Customer_Name, Customer_ID, Segment, Country, State, Postal_Code, Region, Category,
+            Product_Name, Quantity, Purchase_Date, Delivered)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        """
+        values = (
+            customer_name, customer_id, segment, country, state, postal_code,
+            region, category, product_name, quantity,
+            date.today(), "NO"   # purchase_date auto, delivered = NO
+        )
+        return self.execute("insert_order", query, values, touched=("Purchase_Date = %s", (date.today(),)))
+
+    def get_undelivered_orders(self):
+        return self.query(
+            "get_undelivered_orders",
+            "SELECT Customer_ID, Customer_Name, Product_Name, Quantity FROM orders_2 WHERE Delivered='NO'",
+        )
+
+    def update_order(self, customer_id, new_product, new_quantity):
+        query = "UPDATE orders_2 SET Product_Name=%s, Quantity=%s WHERE Customer_ID=%s AND Delivered='NO'"
+        return self.execute("update_order", query, (new_product, new_quantity, customer_id),
+                            touched=("Customer_ID = %s", (customer_id,)))
+
+    def mark_delivered(self, customer_id):
+        query = "UPDATE orders_2 SET Delivered='YES' WHERE Customer_ID=%s AND Delivered='NO'"
+        return self.execute("mark_delivered", query, (customer_id,), touched=("Customer_ID = %s", (customer_id,)))
+
+    def get_orders(self):
+        return self.query(
+            "get_orders",
+            "SELECT Customer_ID, Customer_Name, Product_Name, Purchase_Date, Delivered FROM orders_2",
+        )
+
+    # ---- keyset-paginated listings ----
+    def list_orders(self, delivered: str | None = None, search: str = "", after_key=None,
+                    limit: int = DEFAULT_PAGE_SIZE, returnable: bool = False):
+        """One page of orders with keys greater than `after_key`.
+
+        Returns (rows, next_key); next_key is None on the last page. `search`
+        matches a Customer_ID or Customer_Name prefix. Cost depends on the page
+        size, not on the table size, since the scan starts at `after_key`.
+        `returnable` keeps only orders within the return window (see `mark_return`).
+        """
+        where, params = [], []
+        if returnable:
+            where.append("Delivered = 'YES' AND Purchase_Date >= %s")
+            params.append(return_cutoff())
+        if delivered is not None:
+            where.append("Delivered = %s")
+            params.append(delivered)
+        if search:
+            where.append("(Customer_ID LIKE %s OR Customer_Name LIKE %s)")
+            params += [f"{search}%", f"{search}%"]
+        if after_key is not None:
+            where.append(f"{self.key} > %s")
+            params.append(after_key)
+        query = (f"SELECT {self.key} AS Order_Key, {ORDER_COLUMNS} FROM orders_2"
+                 + (" WHERE " + " AND ".join(where) if where else "")
+                 + f" ORDER BY {self.key} LIMIT %s")
+        rows = self.query("list_orders", query, params + [limit + 1])
+        if len(rows) > limit:
+            return rows[:limit], rows[limit - 1]["Order_Key"]
+        return rows, None
+
+    def get_order(self, order_key):
+        rows = self.query(
+            "get_order",
+            f"SELECT {self.key} AS Order_Key, {ORDER_COLUMNS} FROM orders_2 WHERE {self.key} = %s",
+            (order_key,),
+        )
+        return rows[0] if rows else None
+
+    def update_order_by_key(self, order_key, new_product, new_quantity):
+        query = (f"UPDATE orders_2 SET Product_Name=%s, Quantity=%s "
+                 f"WHERE {self.key}=%s AND Delivered='NO'")
+        return self.execute("update_order", query, (new_product, new_quantity, order_key),
+                            touched=(f"{self.key} = %s", (order_key,)))
+
+    def mark_delivered_by_key(self, order_key):
+        query = f"UPDATE orders_2 SET Delivered='YES' WHERE {self.key}=%s AND Delivered='NO'"
+        return self.execute("mark_delivered", query, (order_key,), touched=(f"{self.key} = %s", (order_key,)))
+
+    # ---- returns ----
+    def mark_return(self, order_key) -> bool:
+        """Move a returnable order to RETURNED and record it in `returns`, atomically.
+
+        Returns False (and changes nothing) if the order is undelivered, already
+        returned or past the return window. See `return_orders`.
+        """
+        with self.pool.connection() as conn, self.timer.time("mark_return"):
+            cursor = conn.cursor()
+            returned = bool(return_orders(cursor, [order_key], self.returns_columns, self.pool.backend))
+            conn.commit()
+            cursor.close()
+        if returned:
+            self._version = None
+        return returned
+
+    # ---- batch import / bulk transitions ----
+    def insert_orders(self, orders: pd.DataFrame) -> BatchResult:
+        """Insert validated orders (see `validate_orders`) in a single transaction."""
+        start = time.perf_counter()
+        today = date.today()
+        values = orders[IMPORT_COLUMNS].astype(object)
+        values = values.where(values.notna(), None)  # pd.NA is not a valid DB-API parameter
+        rows = [tuple(r) + (today, "NO") for r in values.itertuples(index=False)]
+        if rows:
+            query = (f"INSERT INTO orders_2 ({', '.join(IMPORT_COLUMNS)}, Purchase_Date, Delivered) "
+                     f"VALUES ({', '.join(['%s'] * (len(IMPORT_COLUMNS) + 2))})")
+            self.execute_many("insert_orders", query, rows, touched=("Purchase_Date = %s", (today,)))
+        return BatchResult(len(rows), time.perf_counter() - start)
+
+    def mark_delivered_keys(self, order_keys) -> BatchResult:
+        """Move every undelivered order in `order_keys` to Delivered='YES' atomically."""
+        start = time.perf_counter()
+        keys = list(dict.fromkeys(order_keys))
+        updated = 0
+        with self.pool.connection() as conn, self.timer.time("mark_delivered_keys"):
+            cursor = conn.cursor()
+            for i in range(0, len(keys), BULK_KEY_CHUNK):
+                chunk = keys[i:i + BULK_KEY_CHUNK]
+                cursor.execute(self._sql(
+                    f"UPDATE orders_2 SET Delivered='YES' WHERE Delivered='NO' "
+                    f"AND {self.key} IN ({', '.join(['%s'] * len(chunk))})"), chunk)
+                updated += cursor.rowcount
+            # Delivered orders can span any months: refresh the rollup months they fall in
+            data_version.bump_cursor(cursor, "orders_2", dialect=self.pool.backend)
+            for i in range(0, len(keys), BULK_KEY_CHUNK):
+                chunk = keys[i:i + BULK_KEY_CHUNK]
+                rollups.refresh_cursor(cursor, "orders_2", f"{self.key} IN ({', '.join(['%s'] * len(chunk))})",
+                                       chunk, dialect=self.pool.backend)
+            conn.commit()
+            cursor.close()
+        self._version = None
+        return BatchResult(updated, time.perf_counter() - start)
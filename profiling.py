@@ -0,0 +1,404 @@
+import argparse
+import functools
+import heapq
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# ==============================
+# Per-step agent profiling
+# ==============================
+# One ProfilingHandler per request records a span for every LLM call, tool call and
+# SQL execution. `flush()` appends the spans to a JSONL trace and folds them into
+# process-wide Prometheus metrics, written to a text file (and optionally served).
+PROFILE_DIR = Path(__file__).parent / ".profiling"
+TRACE_FILE = PROFILE_DIR / "trace.jsonl"
+METRICS_FILE = PROFILE_DIR / "metrics.prom"
+LATENCY_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SQL_TOOLS = {"sql_db_query"}
+CHARS_PER_TOKEN = 4  # estimate when the provider reports no usage
+
+
+def _rows_in(output) -> int | None:
+    """Rows in a SQLDatabase.run() result string such as "[(1, 'a'), (2, 'b')]"."""
+    text = str(output).strip()
+    if not text or text == "[]":
+        return 0
+    if text.startswith("[("):
+        return text.count("), (") + 1
+    head = text.split(" rows x ", 1)[0]
+    if head != text and head.replace(",", "").isdigit():
+        return int(head.replace(",", ""))  # result_shaper summary
+    return None
+
+
+def _token_usage(response) -> tuple[int | None, int | None]:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if not usage:
+        for generations in response.generations:
+            for gen in generations:
+                message = getattr(gen, "message", None)
+                meta = getattr(message, "usage_metadata", None) or {}
+                if meta:
+                    return meta.get("input_tokens"), meta.get("output_tokens")
+                usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or usage
+    return usage.get("prompt_tokens"), usage.get("completion_tokens")
+
+
+@functools.cache
+def _handler_class():
+    """ProfilingHandler, defined on first use so that importing this module does not load LangChain."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class ProfilingHandler(BaseCallbackHandler):
+        """Callback handler that times LLM, tool and SQL steps of one agent request."""
+
+        def __init__(self, app: str, question: str = "", trace_file: Path = TRACE_FILE):
+            self.app = app
+            self.question = question[:200]
+            self.trace_file = Path(trace_file)
+            self.trace_id = uuid.uuid4().hex[:12]
+            self.started = time.perf_counter()
+            self.spans: list[dict] = []
+            self._open: dict = {}
+            self._lock = threading.Lock()
+
+        # ---- span bookkeeping ----
+        def _start(self, run_id, **fields):
+            with self._lock:
+                self._open[run_id] = (time.perf_counter(), fields)
+
+        def _end(self, run_id, **fields) -> dict | None:
+            with self._lock:
+                started = self._open.pop(run_id, None)
+            if started is None:
+                return None
+            start, span = started
+            span.update(fields, ms=round((time.perf_counter() - start) * 1000, 3))
+            return self.record(**span)
+
+        def record(self, kind: str, name: str, ms: float, **fields) -> dict:
+            """Add a finished span (also used for steps outside LangChain, e.g. the fast path)."""
+            span = {"ts": round(time.time(), 3), "app": self.app, "trace_id": self.trace_id,
+                    "kind": kind, "name": name, "ms": ms, **fields}
+            with self._lock:
+                self.spans.append(span)
+            return span
+
+        # ---- LLM ----
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            chars = sum(len(p) for p in prompts)
+            self._start(run_id, kind="llm", name=self._model(serialized, kwargs), prompt_chars=chars)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            chars = sum(len(str(m.content)) for batch in messages for m in batch)
+            self._start(run_id, kind="llm", name=self._model(serialized, kwargs), prompt_chars=chars)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            prompt_tokens, completion_tokens = _token_usage(response)
+            text = "".join(g.text for gens in response.generations for g in gens)
+            estimated = prompt_tokens is None
+            with self._lock:
+                chars = self._open.get(run_id, (0, {}))[1].get("prompt_chars", 0)
+            self._end(run_id,
+                      prompt_tokens=prompt_tokens if not estimated else chars // CHARS_PER_TOKEN,
+                      completion_tokens=completion_tokens if not estimated else len(text) // CHARS_PER_TOKEN,
+                      tokens_estimated=estimated)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, error=str(error)[:200])
+
+        @staticmethod
+        def _model(serialized, kwargs) -> str:
+            params = kwargs.get("invocation_params") or {}
+            return params.get("model_name") or params.get("model") or (serialized or {}).get("name") or "llm"
+
+        # ---- tools / SQL ----
+        def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+            name = (serialized or {}).get("name") or "tool"
+            if name in SQL_TOOLS:
+                self._start(run_id, kind="sql", name=name, sql=str(input_str)[:2000])
+            else:
+                self._start(run_id, kind="tool", name=name, input=str(input_str)[:200])
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            with self._lock:
+                kind = self._open.get(run_id, (0, {}))[1].get("kind")
+            # the SQL tool does nothing but run the statement, so its wall time is the DB time
+            self._end(run_id, rows=_rows_in(output) if kind == "sql" else None)
+
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            self._end(run_id, error=str(error)[:200])
+
+        # ---- output ----
+        def flush(self, **request_fields) -> list[dict]:
+            """Append this request's spans to the trace and update the metrics file.
+
+            `request_fields` (e.g. the prompt budget of the turn) are added to the request span.
+            """
+            with self._lock:
+                spans, self.spans = self.spans, []
+            if not spans:
+                return spans
+            total = (time.perf_counter() - self.started) * 1000
+            self.started = time.perf_counter()
+            spans.append({"ts": round(time.time(), 3), "app": self.app, "trace_id": self.trace_id,
+                          "kind": "request", "name": self.question, "ms": round(total, 3), **request_fields})
+            jsonl_log(self.trace_file).append(spans)
+            METRICS.observe(spans)
+            METRICS.write(self.trace_file.parent / METRICS_FILE.name)
+            return spans
+
+    return ProfilingHandler
+
+
+def __getattr__(name):
+    if name == "ProfilingHandler":
+        return _handler_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ==============================
+# Bounded JSONL logs
+# ==============================
+# The trace and the SQL guard log are appended to on every request and read on every
+# Streamlit rerun. Reads come from an in-memory ring of the newest records (seeded
+# from the end of the file when the process starts), and the file is rotated to
+# `<name>.1` once it passes LOG_MAX_BYTES, so neither cost grows with uptime.
+LOG_MAX_BYTES = int(os.getenv("AGENT_LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_KEEP_RECORDS = 5000
+
+
+class JsonlLog:
+    """Append-only JSONL file with size rotation and an in-memory tail."""
+
+    def __init__(self, path, max_bytes: int = LOG_MAX_BYTES, keep: int = LOG_KEEP_RECORDS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._tail: deque | None = None
+        self._keep = keep
+
+    def _load_tail(self) -> deque:
+        tail = deque(maxlen=self._keep)
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                start = max(f.seek(0, os.SEEK_END) - self.max_bytes, 0)
+                f.seek(start)
+                lines = f.read().splitlines()
+            for line in lines[1:] if start else lines:  # the first line may be cut off
+                try:
+                    tail.append(json.loads(line))
+                except ValueError:
+                    continue
+        return tail
+
+    def append(self, records: list[dict]):
+        with self._lock:
+            if self._tail is None:
+                self._tail = self._load_tail()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.writelines(json.dumps(r, default=str) + "\n" for r in records)
+                size = f.tell()
+            if size > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            self._tail.extend(records)
+
+    def records(self) -> list[dict]:
+        """The newest records, oldest first."""
+        with self._lock:
+            if self._tail is None:
+                self._tail = self._load_tail()
+            return list(self._tail)
+
+
+_logs: dict[Path, JsonlLog] = {}
+_logs_lock = threading.Lock()
+
+
+def jsonl_log(path) -> JsonlLog:
+    """The process-wide JsonlLog for `path`."""
+    path = Path(path).resolve()
+    with _logs_lock:
+        if path not in _logs:
+            _logs[path] = JsonlLog(path)
+        return _logs[path]
+
+
+# ==============================
+# Prometheus text metrics
+# ==============================
+class Metrics:
+    """Process-wide step latency histograms and token/row counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self.sums = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.tokens = defaultdict(int)
+        self.rows = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.gauges = {}
+
+    def set_gauge(self, name: str, app: str, value: float):
+        with self._lock:
+            self.gauges[(name, app)] = value
+
+    def observe(self, spans: list[dict]):
+        with self._lock:
+            for span in spans:
+                step = span["kind"] if span["kind"] in ("llm", "request") else span["name"]
+                key = (span["app"], span["kind"], step)
+                seconds = span["ms"] / 1000
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if seconds <= bound:
+                        self.buckets[key][i] += 1
+                self.sums[key] += seconds
+                self.counts[key] += 1
+                if span.get("error"):
+                    self.errors[key] += 1
+                for kind in ("prompt", "completion"):
+                    if span.get(f"{kind}_tokens"):
+                        self.tokens[(span["app"], kind)] += span[f"{kind}_tokens"]
+                if span.get("rows"):
+                    self.rows[span["app"]] += span["rows"]
+
+    def render(self) -> str:
+        lines = ["# HELP agent_step_seconds Latency of agent steps (LLM calls, tools, SQL) and whole requests.",
+                 "# TYPE agent_step_seconds histogram"]
+        with self._lock:
+            for (app, kind, name), counts in sorted(self.buckets.items()):
+                labels = f'app="{app}",kind="{kind}",step="{name}"'
+                for bound, count in zip(LATENCY_BUCKETS, counts):
+                    lines.append(f'agent_step_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'agent_step_seconds_bucket{{{labels},le="+Inf"}} {self.counts[(app, kind, name)]}')
+                lines.append(f"agent_step_seconds_sum{{{labels}}} {self.sums[(app, kind, name)]:.6f}")
+                lines.append(f"agent_step_seconds_count{{{labels}}} {self.counts[(app, kind, name)]}")
+            lines += ["# HELP agent_step_errors_total Agent steps that raised.",
+                      "# TYPE agent_step_errors_total counter"]
+            lines += [f'agent_step_errors_total{{app="{a}",kind="{k}",step="{n}"}} {v}'
+                      for (a, k, n), v in sorted(self.errors.items())]
+            lines += ["# HELP agent_tokens_total Prompt and completion tokens sent to the LLM.",
+                      "# TYPE agent_tokens_total counter"]
+            lines += [f'agent_tokens_total{{app="{a}",type="{t}"}} {v}' for (a, t), v in sorted(self.tokens.items())]
+            lines += ["# HELP agent_sql_rows_total Rows returned by agent SQL.",
+                      "# TYPE agent_sql_rows_total counter"]
+            lines += [f'agent_sql_rows_total{{app="{a}"}} {v}' for a, v in sorted(self.rows.items())]
+            for name in sorted({n for n, _ in self.gauges}):
+                lines += [f"# TYPE {name} gauge"]
+                lines += [f'{name}{{app="{a}"}} {v}' for (n, a), v in sorted(self.gauges.items()) if n == name]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path = METRICS_FILE):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        tmp.replace(path)  # scrapers never see a half-written file
+
+
+METRICS = Metrics()
+_server = None
+
+
+def record(app: str, kind: str, name: str, ms: float, trace_file: Path = TRACE_FILE, **fields) -> dict:
+    """Log one step that no ProfilingHandler saw (e.g. a fast-path answer) to the trace and metrics."""
+    span = {"ts": round(time.time(), 3), "app": app, "trace_id": uuid.uuid4().hex[:12], "kind": kind,
+            "name": name, "ms": round(ms, 3), **fields}
+    jsonl_log(trace_file).append([span])
+    METRICS.observe([span])
+    METRICS.write(Path(trace_file).parent / METRICS_FILE.name)
+    return span
+
+
+# ==============================
+# Script run timing (cold start vs rerun)
+# ==============================
+RERUN_HISTORY = 200
+_script_lock = threading.Lock()
+_cold_start: dict[str, float] = {}
+_reruns: dict[str, list[float]] = defaultdict(list)
+
+
+def record_script_run(app: str, seconds: float) -> dict:
+    """Time from script start to a ready UI; the first run in the process is the cold start."""
+    with _script_lock:
+        cold = app not in _cold_start
+        if cold:
+            _cold_start[app] = seconds
+        else:
+            runs = _reruns[app]
+            runs.append(seconds)
+            del runs[:-RERUN_HISTORY]
+        reruns = sorted(_reruns[app])
+        stats = {
+            "cold_start_ms": round(_cold_start[app] * 1000, 1),
+            "last_run_ms": round(seconds * 1000, 1),
+            "median_rerun_ms": round(reruns[len(reruns) // 2] * 1000, 1) if reruns else None,
+            "reruns": len(reruns),
+        }
+    METRICS.observe([{"app": app, "kind": "script", "name": "cold_start" if cold else "rerun",
+                      "ms": seconds * 1000}])
+    return stats
+
+
+def serve_metrics_from_env(var: str = "AGENT_METRICS_PORT"):
+    """Start the metrics endpoint if `var` names a port (on AGENT_METRICS_HOST, default 127.0.0.1)."""
+    if os.getenv(var):
+        serve_metrics(int(os.environ[var]), os.getenv("AGENT_METRICS_HOST", "127.0.0.1"))
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1"):
+    """Serve METRICS at http://<host>:<port>/metrics from a daemon thread (once per process)."""
+    global _server
+    if _server is not None:
+        return _server
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = METRICS.render().encode()
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+
+# ==============================
+# Report
+# ==============================
+def slowest(trace_file: Path = TRACE_FILE, limit: int = 10, kind: str | None = None,
+            app: str | None = None) -> list[dict]:
+    """The `limit` slowest of the newest spans in the trace (see JsonlLog), optionally of one kind/app."""
+    spans = [s for s in jsonl_log(trace_file).records()
+             if (kind is None or s["kind"] == kind) and (app is None or s["app"] == app)]
+    return heapq.nlargest(limit, spans, key=lambda s: s["ms"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Slowest agent steps from the profiling trace.")
+    parser.add_argument("--trace", default=str(TRACE_FILE))
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--app", default=None)
+    args = parser.parse_args()
+    for kind in ("request", "llm", "tool", "sql"):
+        spans = slowest(Path(args.trace), args.limit, kind, args.app)
+        if spans:
+            print(f"\nSlowest {kind} steps:")
+            for s in spans:
+                detail = s.get("sql") or s.get("input") or s["name"]
+                tokens = f" tokens={s.get('prompt_tokens')}/{s.get('completion_tokens')}" if kind == "llm" else ""
+                rows = f" rows={s.get('rows')}" if kind == "sql" else ""
+                print(f"{s['ms']:10.1f} ms  {s['app']:12} {detail[:90]!r}{tokens}{rows}")
@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+
+import sql_examples
+
+# ==============================
+# Prompt assembly under a token budget
+# ==============================
+# Stable content (system rules, table catalog, tool descriptions) goes into the
+# agent's prompt prefix once, when the cached agent is built, so every request starts
+# with the same bytes and the provider can reuse its prefix cache. Per request only
+# the input (recent history + question) and the ReAct scratchpad vary; each gets an
+# allowance so that prefix + input + scratchpad + reply fits the model's context:
+#   - few-shot examples (sql_examples.py) get up to half of what the question leaves;
+#   - history is kept newest-first until the input allowance is spent;
+#   - older scratchpad observations are shortened, then dropped, as the loop grows.
+CHARS_PER_TOKEN = 4  # same estimate as profiling.py when the provider reports no usage
+CONTEXT_TOKENS = {
+    "Llama3-8b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "mixtral-8x7b-32768": 32768,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+RESERVED_OUTPUT_TOKENS = 512  # one ReAct step: thought + action, or the final answer
+INPUT_TOKENS = 1024
+TRIMMED_OBSERVATION_CHARS = 200
+
+
+def estimate_tokens(text) -> int:
+    return len(str(text or "")) // CHARS_PER_TOKEN + 1
+
+
+def escape_template(text: str) -> str:
+    """Escape braces for create_sql_agent, which .format()s the prefix and then templates it."""
+    return text.replace("{", "{{{{").replace("}", "}}}}")
+
+
+def static_prompt(agent) -> str | None:
+    """The agent prompt with only {input} and {agent_scratchpad} left empty, if it can be found."""
+    runnable = getattr(getattr(agent, "agent", None), "runnable", None)
+    for step in getattr(runnable, "steps", []):
+        if hasattr(step, "template") and hasattr(step, "format"):
+            return step.format(**{name: "" for name in step.input_variables})
+    return None
+
+
+@dataclass
+class BudgetReport:
+    input_tokens: int
+    history_kept: int
+    history_dropped: int
+    examples: int = 0
+    prefix_tokens: int = 0
+    steps: int = 0
+    steps_trimmed: int = 0
+    steps_dropped: int = 0
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add_usage(self, spans: list[dict]) -> "BudgetReport":
+        """Add the provider-reported tokens of a request's LLM spans (see profiling.py)."""
+        for span in spans:
+            if span["kind"] == "llm":
+                self.llm_calls += 1
+                self.prompt_tokens += span.get("prompt_tokens") or 0
+                self.completion_tokens += span.get("completion_tokens") or 0
+        return self
+
+
+def fit_input(question: str, history: list[dict] = (), input_tokens: int = INPUT_TOKENS,
+              examples: list = ()) -> tuple[str, BudgetReport]:
+    """Question plus as much recent history ({"role", "content"} dicts) as `input_tokens` holds.
+
+    `examples` (sql_examples.Example, most similar first) are added while they fit in
+    half of the allowance the question leaves.
+    """
+    question_part = f"User question: {question}"
+    remaining = input_tokens - estimate_tokens(question_part)
+    if remaining < 0:
+        question_part = question_part[:input_tokens * CHARS_PER_TOKEN]
+    shots = []
+    for example in examples:
+        candidate = shots + [example]
+        if estimate_tokens(sql_examples.render(candidate)) > remaining // 2:
+            break
+        shots = candidate
+    if shots:
+        remaining -= estimate_tokens(sql_examples.render(shots))
+    kept = []
+    for msg in reversed(history):
+        line = f"{msg['role']}: {msg['content']}"
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        kept.insert(0, line)
+        remaining -= cost
+    dropped = len(history) - len(kept)
+    parts = []
+    if kept:
+        header = "Conversation so far" + (f" ({dropped} earlier messages omitted)" if dropped else "")
+        parts.append(header + ":\n" + "\n".join(kept))
+    if shots:
+        parts.append(sql_examples.render(shots))
+    parts.append(question_part)
+    text = "\n\n".join(parts)
+    return text, BudgetReport(estimate_tokens(text), len(kept), dropped, len(shots))
+
+
+class PromptBudget:
+    """Token allowances for one cached agent: fixed prefix, per-request input, scratchpad."""
+
+    def __init__(self, prefix_tokens: int, model_name: str = "",
+                 context_tokens: int | None = None, input_tokens: int = INPUT_TOKENS,
+                 reserve_tokens: int = RESERVED_OUTPUT_TOKENS):
+        self.prefix_tokens = prefix_tokens
+        self.context_tokens = context_tokens or CONTEXT_TOKENS.get(model_name, DEFAULT_CONTEXT_TOKENS)
+        self.input_tokens = input_tokens
+        self.reserve_tokens = reserve_tokens
+
+    @property
+    def scratchpad_tokens(self) -> int:
+        return max(self.context_tokens - self.reserve_tokens - self.prefix_tokens - self.input_tokens, 0)
+
+    def trim_steps(self, steps: list) -> list:
+        """AgentExecutor trim_intermediate_steps hook: fit (action, observation) pairs in the scratchpad."""
+        return self._trim(steps)[0]
+
+    def _trim(self, steps: list) -> tuple[list, int, int]:
+        budget = self.scratchpad_tokens
+        cost = lambda action, obs: estimate_tokens(getattr(action, "log", "")) + estimate_tokens(obs)
+        if sum(cost(a, o) for a, o in steps) <= budget:
+            return list(steps), 0, 0
+        # Over budget: older observations are shortened, the oldest steps dropped. The
+        # newest step is what the model reacts to next; it is cut only if it alone overflows.
+        kept, trimmed = [], 0
+        for i, (action, obs) in enumerate(reversed(steps)):
+            if i == 0:
+                room = (budget - estimate_tokens(getattr(action, "log", ""))) * CHARS_PER_TOKEN
+                short = len(str(obs)) > room
+                if short:
+                    obs = str(obs)[:max(room, TRIMMED_OBSERVATION_CHARS)] + " ... [trimmed]"
+            else:
+                short = len(str(obs)) > TRIMMED_OBSERVATION_CHARS
+                if short:
+                    obs = str(obs)[:TRIMMED_OBSERVATION_CHARS] + " ... [trimmed]"
+            if budget - cost(action, obs) < 0 and kept:
+                break
+            budget -= cost(action, obs)
+            kept.insert(0, (action, obs))
+            trimmed += short
+        return kept, trimmed, len(steps) - len(kept)
+
+    def report(self, report: BudgetReport, steps=()) -> BudgetReport:
+        """Fill in the prefix size and how a finished run's scratchpad was trimmed at its last step."""
+        steps = list(steps or [])
+        _, report.steps_trimmed, report.steps_dropped = self._trim(steps)
+        report.prefix_tokens = self.prefix_tokens
+        report.steps = len(steps)
+        return report
+
+
+def attach(agent, model_name: str = "", fallback_prefix: str = "", **kwargs) -> PromptBudget:
+    """Measure `agent`'s fixed prompt and make it trim its scratchpad to the remaining budget."""
+    prompt = static_prompt(agent)
+    budget = PromptBudget(estimate_tokens(prompt if prompt is not None else fallback_prefix), model_name, **kwargs)
+    agent.trim_intermediate_steps = budget.trim_steps
+    return budget
@@ -0,0 +1,139 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+# ==============================
+# Question -> SQL -> answer cache
+# ==============================
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    sql: str | None
+    answer: str
+    created_at: float
+
+
+def normalize_question(question: str) -> str:
+    """Case/whitespace/punctuation-insensitive form used as the cache key."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return re.sub(r"[\s?.!]+$", "", question)
+
+
+# Questions that lean on earlier turns ("what about West?", "and their returns?")
+_FOLLOW_UP_RE = re.compile(
+    r"^(and|also|but|then|what about|how about|same|now)\b"
+    r"|\b(it|its|that|those|these|them|they|their|he|she|him|her|previous|above|same|instead)\b"
+)
+
+
+def cache_key(question: str, agent_input: str) -> str:
+    """What to cache an answer under: the question alone, unless it reads as a follow-up.
+
+    A self-contained question has the same answer whatever came before it, so a repeat
+    later in the conversation still hits. A follow-up is keyed on `agent_input`, the
+    question with the history it was asked after.
+    """
+    return agent_input if _FOLLOW_UP_RE.search(normalize_question(question)) else question
+
+
+class QueryCache:
+    """Persistent LRU+TTL cache of agent answers.
+
+    Entries are keyed on the normalized question, a database identity (URI/schema)
+    and the data version from `data_version.current()`. A write or re-ingestion
+    changes the version, so stale answers are never looked up again; they simply
+    age out through TTL/LRU eviction.
+    """
+
+    def __init__(self, path, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = self.misses = self.expired = self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, question TEXT NOT NULL, sql TEXT, answer TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_answers_last_used ON answers(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(question: str, db_identity: str, version: str) -> str:
+        raw = "\x1f".join([normalize_question(question), db_identity, version])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, question: str, db_identity: str, version: str) -> CachedAnswer | None:
+        key = self.make_key(question, db_identity, version)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT question, sql, answer, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[3] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return CachedAnswer(*row)
+
+    def put(self, question: str, db_identity: str, version: str, sql: str | None, answer: str):
+        key = self.make_key(question, db_identity, version)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, question, sql, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, question, sql, answer, now, now),
+            )
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+            overflow = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM answers WHERE key IN "
+                    "(SELECT key FROM answers ORDER BY last_used LIMIT ?)", (overflow,)
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "entries": size,
+        }
+
+
+def final_sql(intermediate_steps) -> str | None:
+    """The last query the SQL agent executed, from AgentExecutor intermediate steps."""
+    for action, _ in reversed(intermediate_steps or []):
+        if getattr(action, "tool", None) == "sql_db_query":
+            tool_input = action.tool_input
+            return tool_input.get("query") if isinstance(tool_input, dict) else str(tool_input)
+    return None
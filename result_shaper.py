@@ -0,0 +1,150 @@
+import datetime
+import decimal
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import sql_guard
+
+# ==============================
+# Compact SQL results for the LLM
+# ==============================
+# The sql_db_query tool used to stringify every row into the next prompt. Small
+# results still pass through verbatim; larger ones are replaced by a columnar
+# summary (row count, per-column aggregates, top-k values, a few sample rows).
+# The full result is kept in a ResultStore under an id quoted in the summary, so
+# the UI can offer it for download without it ever reaching the model.
+PASS_THROUGH_ROWS = int(os.getenv("RESULT_PASS_THROUGH_ROWS", 20))
+PASS_THROUGH_CHARS = 2000
+TOP_K = 5
+SAMPLE_ROWS = 3
+MAX_STRING_LENGTH = 300  # per value, as SQLDatabase truncates
+STORE_SIZE = 32
+RESULT_ID = "result #"
+
+
+def _truncate(value, length: int = MAX_STRING_LENGTH):
+    if isinstance(value, str) and len(value) > length:
+        return value[:length - 3] + "..."
+    return value
+
+
+def _fmt(value) -> str:
+    if isinstance(value, (float, np.floating)):
+        return f"{value:,.2f}"
+    if isinstance(value, (int, np.integer)):
+        return f"{value:,}"
+    return str(value)
+
+
+def verbatim(rows: list[dict], include_columns: bool = False) -> str:
+    """The string SQLDatabase.run() would have returned."""
+    if include_columns:
+        return str([{k: _truncate(v) for k, v in row.items()} for row in rows])
+    return str([tuple(_truncate(v) for v in row.values()) for row in rows])
+
+
+def _coerce(frame: pd.DataFrame) -> pd.DataFrame:
+    """MySQL returns DECIMAL and DATE as Python objects; make them numeric/datetime columns."""
+    for col in frame.columns[frame.dtypes == object]:
+        first = frame[col].dropna()
+        first = first.iloc[0] if len(first) else None
+        if isinstance(first, decimal.Decimal):
+            frame[col] = pd.to_numeric(frame[col], errors="coerce")
+        elif isinstance(first, (datetime.date, datetime.datetime)):
+            frame[col] = pd.to_datetime(frame[col], errors="coerce")
+    return frame
+
+
+def summarize(frame: pd.DataFrame, result_id: str = "", top_k: int = TOP_K, truncated: bool = False) -> str:
+    """Row count, per-column aggregates and top-k values of `frame`.
+
+    `truncated` means `frame` is only the first rows of the result (the guard's row cap).
+    """
+    size = f"First {len(frame):,} rows (result truncated)" if truncated else f"{len(frame):,} rows"
+    lines = [f"{size} x {len(frame.columns)} columns. Too large to show; summary below"
+             + (f" (the user can download {'these rows' if truncated else 'the full'} {RESULT_ID}{result_id})."
+                if result_id else ".")]
+    if truncated:
+        lines.append("Counts, sums and distinct values below cover these rows only, not the whole result; "
+                     "use COUNT/SUM in SQL for totals.")
+    nulls = frame.isna().sum()
+    numeric = frame.select_dtypes(include="number").columns
+    if len(numeric):
+        stats = frame[numeric].agg(["min", "max", "mean", "sum"])
+    for col in frame.columns:
+        null_note = f", {nulls[col]:,} null" if nulls[col] else ""
+        if col in numeric:
+            s = stats[col]
+            whole = int if pd.api.types.is_integer_dtype(frame[col]) else float
+            lines.append(f"- {col} (number): min {_fmt(whole(s['min']))}, max {_fmt(whole(s['max']))}, "
+                         f"mean {_fmt(s['mean'])}, sum {_fmt(whole(s['sum']))}{null_note}")
+            continue
+        series = frame[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            lines.append(f"- {col} (date): {series.min()} .. {series.max()}{null_note}")
+            continue
+        counts = series.astype(str).value_counts()
+        top = ", ".join(f"{_truncate(v, 60)} ({c:,})" for v, c in counts.head(top_k).items())
+        lines.append(f"- {col}: {len(counts):,} distinct; top {top}{null_note}")
+    sample = frame.head(SAMPLE_ROWS).astype(str).to_dict("records")
+    lines.append(f"First {len(sample)} rows: {verbatim(sample)}")
+    lines.append("Filter or aggregate in SQL to get specific rows.")
+    return "\n".join(lines)
+
+
+class ResultStore:
+    """The last STORE_SIZE full results, by id, for download in the UI."""
+
+    def __init__(self, size: int = STORE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._frames: OrderedDict[str, tuple[str, pd.DataFrame]] = OrderedDict()
+
+    def put(self, sql: str, frame: pd.DataFrame) -> str:
+        result_id = uuid.uuid4().hex[:8]
+        with self._lock:
+            self._frames[result_id] = (sql, frame)
+            while len(self._frames) > self.size:
+                self._frames.popitem(last=False)
+        return result_id
+
+    def get(self, result_id: str) -> tuple[str, pd.DataFrame] | None:
+        with self._lock:
+            return self._frames.get(result_id)
+
+    def ids_in(self, text) -> list[str]:
+        """Result ids quoted in tool outputs (summaries), oldest first."""
+        found = []
+        with self._lock:
+            for chunk in str(text or "").split(RESULT_ID)[1:]:
+                result_id = chunk[:8]
+                if result_id in self._frames and result_id not in found:
+                    found.append(result_id)
+        return found
+
+    def shaped_run(self, db, command, fetch="all", include_columns: bool = False, **kwargs):
+        """SQLDatabase.run() with large results summarized and stored."""
+        rows = db._execute(command, fetch, **kwargs)
+        if fetch == "cursor":
+            return rows
+        if not rows:
+            return ""
+        cap = sql_guard.current_row_cap()
+        truncated = cap is not None and len(rows) >= cap
+        text = verbatim(rows, include_columns)
+        if len(rows) <= PASS_THROUGH_ROWS and len(text) <= PASS_THROUGH_CHARS:
+            return text + (f" (first {len(rows):,} rows; result truncated)" if truncated else "")
+        frame = _coerce(pd.DataFrame.from_records(rows))
+        return summarize(frame, self.put(str(command), frame), truncated=truncated)
+
+
+def install(db, store: ResultStore):
+    """Route `db.run` through `store.shaped_run` (install before any guard)."""
+    db.run = lambda command, *args, **kwargs: store.shaped_run(db, command, *args, **kwargs)
+    db.results = store
+    return db
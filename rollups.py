@@ -0,0 +1,327 @@
+import json
+from dataclasses import dataclass
+
+import pandas as pd
+from sqlalchemy import exc, inspect, text
+
+import data_version
+from index_advisor import resolve_column
+
+# ==============================
+# Incrementally maintained rollups
+# ==============================
+# Pre-aggregated copies of `orders` (+ `returns`) and `orders_2` at the grain
+# region x state x segment x category x month, for the aggregate questions agent-1
+# gets most. Rollup rows are partitioned by month. A write that knows which rows it
+# touched (OrdersStore, the intent router, incremental ingestion) recomputes just
+# those months from the base tables, inside its own transaction. Any other write
+# (agent DML, full reloads) is caught by comparing the source tables' data_version
+# counters with the ones the rollup was built at, and rebuilds it in full.
+STATE_TABLE = "_rollup_state"
+GROUP_KEYS = ["Region", "State", "Segment", "Category", "Month"]
+# rollup -> tables whose writes can change it
+SOURCES = {"rollup_sales": ("orders", "returns"), "rollup_orders_2": ("orders_2",)}
+MEASURE_ALIASES = {
+    "sales": ["Sales"],
+    "quantity": ["Quantity"],
+    "profit": ["Profit"],
+}
+
+CREATE_STATE_SQL = (f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} ("
+                    "rollup VARCHAR(64) PRIMARY KEY, source_versions TEXT NOT NULL)")
+
+
+@dataclass
+class Rollup:
+    name: str
+    source: str
+    sources: tuple  # tables whose writes change it
+    measures: list  # (column DDL, SQL expression over the source row alias `o`)
+    description: str
+    join: str = ""
+
+
+def _rollups(columns: dict) -> list[Rollup]:
+    """Rollup definitions over the source columns present in this database."""
+    found = []
+    orders = columns.get("orders")
+    if orders:
+        c = {k: resolve_column(orders, k) for k in ("order_id", "state", "region", "segment", "category")}
+        c.update({k: next((n for n in names if n in orders), None) for k, names in MEASURE_ALIASES.items()})
+        returns = columns.get("returns") or []
+        returns_key = resolve_column(returns, "order_id")
+        if all(c.values()):
+            returned = "r.order_id IS NOT NULL" if returns_key else "1 = 0"
+            found.append(Rollup(
+                "rollup_sales", "orders", SOURCES["rollup_sales"],
+                [("order_lines BIGINT", "COUNT(*)"),
+                 # Not additive: one order spans several categories/months (see prompt_hint)
+                 ("distinct_orders_in_row BIGINT", f"COUNT(DISTINCT o.`{c['order_id']}`)"),
+                 ("sales DOUBLE", f"SUM(o.`{c['sales']}`)"),
+                 ("quantity BIGINT", f"SUM(o.`{c['quantity']}`)"),
+                 ("profit DOUBLE", f"SUM(o.`{c['profit']}`)"),
+                 ("returned_lines BIGINT", f"SUM(CASE WHEN {returned} THEN 1 ELSE 0 END)"),
+                 ("returned_sales DOUBLE", f"SUM(CASE WHEN {returned} THEN o.`{c['sales']}` ELSE 0 END)")],
+                "order lines, distinct orders within the row, sales, quantity, profit and returned lines/sales from "
+                "`orders` joined with `returns`",
+                join=(f" LEFT JOIN (SELECT DISTINCT `{returns_key}` AS order_id FROM returns) r "
+                      f"ON r.order_id = o.`{c['order_id']}`") if returns_key else "",
+            ))
+    orders_2 = columns.get("orders_2")
+    if orders_2 and all(resolve_column(orders_2, k) for k in ("state", "region", "segment", "category")):
+        found.append(Rollup(
+            "rollup_orders_2", "orders_2", SOURCES["rollup_orders_2"],
+            [("orders BIGINT", "COUNT(*)"),
+             ("quantity BIGINT", "SUM(o.Quantity)"),
+             ("delivered BIGINT", "SUM(CASE WHEN o.Delivered = 'YES' THEN 1 ELSE 0 END)"),
+             ("undelivered BIGINT", "SUM(CASE WHEN o.Delivered = 'NO' THEN 1 ELSE 0 END)"),
+             ("returned BIGINT", "SUM(CASE WHEN o.Delivered = 'RETURNED' THEN 1 ELSE 0 END)")],
+            "orders, quantity and delivered/undelivered/returned counts from `orders_2`",
+        ))
+    return found
+
+
+# ---- SQL over either a SQLAlchemy Connection or a DB-API cursor ----
+class _Target:
+    def __init__(self, target, dialect: str):
+        self.target = target
+        self.dialect = dialect
+
+    def run(self, sql: str, params=()) -> list:
+        if self.dialect == "sqlite":
+            sql = sql.replace("%s", "?")
+        if hasattr(self.target, "exec_driver_sql"):
+            result = self.target.exec_driver_sql(sql, tuple(params))
+            return result.fetchall() if result.returns_rows else []
+        self.target.execute(sql, tuple(params))
+        return self.target.fetchall() if self.target.description else []
+
+    def columns(self, table: str) -> list[str]:
+        if hasattr(self.target, "exec_driver_sql"):
+            return list(self.target.exec_driver_sql(f"SELECT * FROM `{table}` LIMIT 0").keys())
+        self.target.execute(f"SELECT * FROM `{table}` LIMIT 0")
+        names = [d[0] for d in self.target.description]
+        self.target.fetchall()
+        return names
+
+
+def _date_column(columns: list[str]) -> str:
+    return resolve_column(columns, "purchase_date")
+
+
+def _month(column: str) -> str:
+    return f"SUBSTR(CAST(o.`{column}` AS CHAR), 1, 7)"
+
+
+def month_of(value) -> str:
+    return str(pd.Timestamp(value).date())[:7]
+
+
+def _next_month(month: str) -> str:
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}-01"
+
+
+def _source_versions(t: _Target, rollup: Rollup) -> str:
+    rows = t.run(f"SELECT table_name, version FROM {data_version.VERSION_TABLE} "
+                 f"WHERE table_name IN ({', '.join(['%s'] * len(rollup.sources))})", rollup.sources)
+    return json.dumps(sorted([str(name), int(version)] for name, version in rows))
+
+
+def _record(t: _Target, rollup: Rollup):
+    t.run(f"DELETE FROM {STATE_TABLE} WHERE rollup = %s", (rollup.name,))
+    t.run(f"INSERT INTO {STATE_TABLE} (rollup, source_versions) VALUES (%s, %s)",
+          (rollup.name, _source_versions(t, rollup)))
+
+
+def _record_after(t: _Target, rollup: Rollup, bumps: dict) -> bool:
+    """Mark `rollup` current if its sources moved only by this write's own `bumps` ({table: count})
+    since it was last recorded. Any other write in between leaves it stale for `ensure_fresh`."""
+    stored = t.run(f"SELECT source_versions FROM {STATE_TABLE} WHERE rollup = %s", (rollup.name,))
+    if not stored:
+        return False
+    expected = dict(json.loads(stored[0][0]))
+    for table, count in bumps.items():
+        expected[table] = expected.get(table, 0) + count
+    if dict(json.loads(_source_versions(t, rollup))) != expected:
+        return False
+    _record(t, rollup)
+    return True
+
+
+def _maintained(t: _Target, rollup_name: str) -> bool:
+    return bool(t.run(f"SELECT 1 FROM {STATE_TABLE} WHERE rollup = %s", (rollup_name,)))
+
+
+def _group_select(t: _Target, rollup: Rollup, date_col: str, where: str = "") -> str:
+    columns = t.columns(rollup.source)
+    keys = [f"o.`{resolve_column(columns, k.lower())}`" for k in GROUP_KEYS[:-1]] + [_month(date_col)]
+    measures = ", ".join(expr for _, expr in rollup.measures)
+    return (f"SELECT {', '.join(keys)}, {measures} FROM `{rollup.source}` o{rollup.join}"
+            f"{' WHERE ' + where if where else ''} GROUP BY 1, 2, 3, 4, 5")
+
+
+def _column_names(rollup: Rollup) -> list[str]:
+    return GROUP_KEYS + [ddl.split()[0] for ddl, _ in rollup.measures]
+
+
+def _insert(rollup: Rollup) -> str:
+    return f"INSERT INTO {rollup.name} ({', '.join(_column_names(rollup))}) "
+
+
+def _create(t: _Target, rollup: Rollup):
+    t.run(f"DROP TABLE IF EXISTS {rollup.name}")
+    t.run(f"CREATE TABLE {rollup.name} (Region VARCHAR(32), State VARCHAR(64), Segment VARCHAR(32), "
+          f"Category VARCHAR(32), Month CHAR(7), {', '.join(ddl for ddl, _ in rollup.measures)})")
+    t.run(f"CREATE INDEX ix_{rollup.name}_month ON {rollup.name} (Month)")
+
+
+def _refresh_months(t: _Target, rollup: Rollup, months, bumps: dict) -> int:
+    date_col = _date_column(t.columns(rollup.source))
+    for month in sorted(set(months)):
+        t.run(f"DELETE FROM {rollup.name} WHERE Month = %s", (month,))
+        t.run(_insert(rollup) + _group_select(t, rollup, date_col,
+                                              f"o.`{date_col}` >= %s AND o.`{date_col}` < %s"),
+              (f"{month}-01", _next_month(month)))
+    _record_after(t, rollup, bumps)
+    return len(set(months))
+
+
+def _rebuild(t: _Target, rollup: Rollup):
+    _create(t, rollup)
+    t.run(_insert(rollup) + _group_select(t, rollup, _date_column(t.columns(rollup.source))))
+    _record(t, rollup)
+
+
+def _columns_match(t: _Target, rollup: Rollup) -> bool:
+    """Whether the stored rollup table has the columns of the current definition."""
+    return t.columns(rollup.name) == _column_names(rollup)
+
+
+def _definitions(t: _Target, tables) -> list[Rollup]:
+    return _rollups({table: t.columns(table) for table in tables})
+
+
+# ==============================
+# Entry points
+# ==============================
+def ensure_fresh(engine, report=print) -> list[str]:
+    """Build missing rollups and rebuild any whose sources changed behind their back.
+
+    Returns the rollups rebuilt. Read-only databases are left alone.
+    """
+    if not data_version.ensure_table(engine):
+        return []
+    rebuilt = []
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(CREATE_STATE_SQL)
+            t = _Target(conn, engine.dialect.name)
+            present = set(inspect(conn).get_table_names())
+            for rollup in _definitions(t, present & {"orders", "returns", "orders_2"}):
+                stored = t.run(f"SELECT source_versions FROM {STATE_TABLE} WHERE rollup = %s", (rollup.name,))
+                if (rollup.name in present and stored and stored[0][0] == _source_versions(t, rollup)
+                        and _columns_match(t, rollup)):
+                    continue
+                _rebuild(t, rollup)
+                rebuilt.append(rollup.name)
+                report(f"Rebuilt {rollup.name}")
+    except exc.DBAPIError as e:
+        report(f"Rollups not maintained: {e.orig}")
+    return rebuilt
+
+
+def refresh_where(conn, source: str, where: str, params: dict, bumps: int = 1) -> int:
+    """After a write to `source` on a SQLAlchemy connection, refresh the months of rows matching `where`.
+
+    `bumps` is how many times the write bumped `source`'s version (one per statement
+    under data_version.track_writes).
+    """
+    if not inspect(conn).has_table(STATE_TABLE):
+        return 0
+    t = _Target(conn, conn.dialect.name)
+    rollups = [r for r in _definitions(t, [source]) if _maintained(t, r.name)]
+    if not rollups:
+        return 0
+    date_col = _date_column(t.columns(source))
+    if date_col is None:  # no months to refresh
+        return 0
+    months = [m for (m,) in conn.execute(
+        text(f"SELECT DISTINCT {_month(date_col)} FROM `{source}` o WHERE {where}"), params)]
+    return sum(_refresh_months(t, r, months, {source: bumps}) for r in rollups)
+
+
+def refresh_cursor(cursor, source: str, where: str, params=(), dialect: str = "mysql", bumps: int = 1) -> int:
+    """Same as `refresh_where`, on a DB-API cursor inside the caller's transaction (%s params).
+
+    The state table must already exist (CREATE_STATE_SQL), as with data_version.bump_cursor.
+    """
+    t = _Target(cursor, dialect)
+    rollups = [r for r in _definitions(t, [source]) if _maintained(t, r.name)]
+    if not rollups:
+        return 0
+    date_col = _date_column(t.columns(source))
+    if date_col is None:  # no months to refresh
+        return 0
+    months = [m for (m,) in t.run(f"SELECT DISTINCT {_month(date_col)} FROM `{source}` o WHERE {where}", params)]
+    return sum(_refresh_months(t, r, months, {source: bumps}) for r in rollups)
+
+
+def record_cursor(cursor, source: str, dialect: str = "mysql") -> int:
+    """After one write to `source` that changes no rollup row (and its version bump), mark the
+    rollups built from it current again. Rollups already stale for other reasons stay stale."""
+    t = _Target(cursor, dialect)
+    return sum(_record_after(t, Rollup(name, sources[0], sources, [], ""), {source: 1})
+               for name, sources in SOURCES.items() if source in sources)
+
+
+def apply_sync(engine, stats, report=print) -> list[str]:
+    """Refresh rollups from incremental ingestion stats (ingestion.SyncStat), month by month.
+
+    Sources that were fully reloaded are left to `ensure_fresh`.
+    """
+    by_table = {s.table: s for s in stats if not s.skipped}
+    refreshed = []
+    with engine.begin() as conn:
+        conn.exec_driver_sql(CREATE_STATE_SQL)
+        t = _Target(conn, engine.dialect.name)
+        present = set(inspect(conn).get_table_names())
+        for rollup in _definitions(t, present & {"orders", "returns", "orders_2"}):
+            changed = [by_table[s] for s in rollup.sources if s in by_table]
+            if not changed or not _maintained(t, rollup.name) or any(s.full_reload for s in changed):
+                continue
+            months = set()
+            date_col = _date_column(t.columns(rollup.source))
+            for stat in changed:
+                rows = pd.concat([f for f in (stat.upserted_rows, stat.replaced_rows) if f is not None])
+                if rows.empty:
+                    continue
+                if stat.table == rollup.source:
+                    months |= {month_of(v) for v in rows[date_col].dropna()}
+                else:  # returns: the months of the orders they refer to
+                    returned = rows[resolve_column(list(rows.columns), "order_id")].dropna().unique().tolist()
+                    order_key = resolve_column(t.columns(rollup.source), "order_id")
+                    for i in range(0, len(returned), 500):
+                        chunk = returned[i:i + 500]
+                        months |= {m for (m,) in t.run(
+                            f"SELECT DISTINCT {_month(date_col)} FROM `{rollup.source}` o "
+                            f"WHERE o.`{order_key}` IN ({', '.join(['%s'] * len(chunk))})", chunk)}
+            _refresh_months(t, rollup, months, {s.table: 1 for s in changed})  # incremental_load bumps once
+            refreshed.append(rollup.name)
+            report(f"Refreshed {len(months)} month(s) of {rollup.name}")
+    return refreshed
+
+
+def prompt_hint(catalog: dict) -> str:
+    """Tell the agent about the rollups present in `catalog`, to be queried before base tables."""
+    lines = [f"- {r}: one row per Region, State, Segment, Category and Month ('YYYY-MM')"
+             for r in ("rollup_sales", "rollup_orders_2") if r in catalog["tables"]]
+    if not lines:
+        return ""
+    return ("\nPre-aggregated rollup tables (kept current with every write). For totals, counts, "
+            "rates or trends by region, state, segment, category or month, SUM their columns "
+            "instead of scanning orders/orders_2; join state_managers/regional_managers on State/Region "
+            "for per-manager figures. Exception: rollup_sales.distinct_orders_in_row counts distinct "
+            "orders within that one row only and must never be SUMmed, since an order spans several "
+            "categories and months; count orders with COUNT(DISTINCT `Order ID`) on orders instead "
+            "(order_lines is additive):\n" + "\n".join(lines) + "\n")
@@ -0,0 +1,139 @@
+import hashlib
+import json
+from pathlib import Path
+
+from sqlalchemy import inspect, text
+
+import data_version
+
+# ==============================
+# Table descriptions (shared by the agent prompts)
+# ==============================
+TABLE_DESCRIPTIONS = {
+    "orders": "Contains customer details and order details. Tracks what orders each customer has placed.",
+    "regional_managers": "Contains manager names for the four regions: West, East, Central, and South.",
+    "returns": "Contains order IDs and information about whether a product was returned or not.",
+    "state_managers": "Contains manager names for each U.S. state.",
+    "segment_managers": "Contains customer segments (Consumer, Home Office, Corporate) and their respective managers.",
+    "category_managers": "Contains product categories (Technology, Furniture, Office Supplies) and their respective managers.",
+    "customer_success_managers": "Contains regions (Central, East, South, West) and their respective customer success managers.",
+    "orders_2": "Live customer orders managed by the Customer Success app; Delivered is 'YES', 'NO' or 'RETURNED'.",
+}
+
+DEFAULT_SAMPLE_ROWS = 3
+CATALOG_DIR = Path(__file__).parent / ".schema_catalog"
+
+
+def is_internal(table: str) -> bool:
+    """Bookkeeping tables (ingestion state, version counters, staging copies)."""
+    return table.startswith("_") or table.endswith(("__staging", "__retired"))
+
+
+# ==============================
+# Build / persist
+# ==============================
+def build_catalog(engine, include_tables=None, sample_rows: int = DEFAULT_SAMPLE_ROWS) -> dict:
+    """Reflect columns and sample rows of every user table in one pass."""
+    tables = {}
+    with engine.connect() as conn:
+        insp = inspect(conn)
+        quote = conn.dialect.identifier_preparer.quote
+        for table in sorted(insp.get_table_names()):
+            if is_internal(table) or (include_tables and table not in include_tables):
+                continue
+            columns = [{"name": c["name"], "type": str(c["type"]), "nullable": c.get("nullable", True)}
+                       for c in insp.get_columns(table)]
+            rows = conn.execute(text(f"SELECT * FROM {quote(table)} LIMIT {int(sample_rows)}")).fetchall()
+            tables[table] = {
+                "description": TABLE_DESCRIPTIONS.get(table, ""),
+                "columns": columns,
+                "sample_rows": [[None if v is None else str(v) for v in row] for row in rows],
+            }
+    return {"dialect": engine.dialect.name, "tables": tables}
+
+
+def _catalog_path(identity: str, include_tables, version: str, directory: Path) -> Path:
+    scope = hashlib.sha1(f"{identity}|{sorted(include_tables or [])}".encode()).hexdigest()[:12]
+    return directory / f"catalog-{scope}-{version}.json"
+
+
+def load_catalog(engine, identity: str, include_tables=None, directory: Path = CATALOG_DIR) -> dict:
+    """Return the catalog for the current data version, building it at most once.
+
+    Catalogs are persisted as JSON under `directory`, one file per database scope
+    and version; files for older versions of the same scope are removed.
+    """
+    version = data_version.current(engine)
+    path = _catalog_path(identity, include_tables, version, directory)
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    catalog = build_catalog(engine, include_tables)
+    catalog["version"] = version
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale in directory.glob(path.name.rsplit("-", 1)[0] + "-*.json"):
+        stale.unlink(missing_ok=True)
+    path.write_text(json.dumps(catalog, indent=1), encoding="utf-8")
+    return catalog
+
+
+# ==============================
+# Rendering for the agent
+# ==============================
+def table_info(catalog: dict) -> dict:
+    """Per-table text in the same shape SQLDatabase.get_table_info produces.
+
+    Pass it as `custom_table_info` so the toolkit's schema tool answers from the
+    catalog instead of reflecting and sampling the database.
+    """
+    q = "`" if catalog["dialect"] == "mysql" else '"'
+    quote = lambda name: name if name.isidentifier() else f"{q}{name}{q}"
+    info = {}
+    for table, meta in catalog["tables"].items():
+        columns = ",\n".join(f"\t{quote(c['name'])} {c['type']}" + ("" if c["nullable"] else " NOT NULL")
+                             for c in meta["columns"])
+        lines = []
+        if meta["description"]:
+            lines.append(f"-- {meta['description']}")
+        lines.append(f"CREATE TABLE {quote(table)} (\n{columns}\n)")
+        if meta["sample_rows"]:
+            header = "\t".join(c["name"] for c in meta["columns"])
+            rows = "\n".join("\t".join("NULL" if v is None else v for v in row)
+                             for row in meta["sample_rows"])
+            lines.append(f"/*\n{len(meta['sample_rows'])} rows from {table} table:\n{header}\n{rows}\n*/")
+        info[table] = "\n".join(lines)
+    return info
+
+
+def render(catalog: dict) -> str:
+    """The whole catalog as one block for the agent prompt."""
+    return "\n\n".join(table_info(catalog).values())
+
+
+def sql_database(engine, catalog: dict, guard=None, results=None, router=None):
+    """A LangChain SQLDatabase that serves schema questions from `catalog`.
+
+    With a `sql_guard.SQLGuard`, every query the agent runs goes through it. With a
+    `result_shaper.ResultStore`, large results reach the model as a summary and are
+    kept in the store for download. With an `engine_router.EngineRouter`, reads run
+    on its replica or snapshot and writes on `engine`.
+    """
+    from langchain.sql_database import SQLDatabase
+
+    db = SQLDatabase(
+        engine,
+        include_tables=list(catalog["tables"]),
+        custom_table_info=table_info(catalog),
+        sample_rows_in_table_info=0,
+        lazy_table_reflection=True,
+    )
+    if router is not None:
+        import engine_router
+        engine_router.install(db, router)
+    if results is not None:
+        import result_shaper
+        result_shaper.install(db, results)
+    if guard is not None:
+        import sql_guard
+        sql_guard.install(db, guard)
+    return db
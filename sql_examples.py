@@ -0,0 +1,216 @@
+import math
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from heapq import nlargest
+
+from query_cache import normalize_question
+from sql_guard import is_select
+
+# ==============================
+# Few-shot examples from past successful runs
+# ==============================
+# Every agent run that ends on a SELECT that executed cleanly adds its question and
+# that final SQL to a persistent index. Before the next run, the TOP_K most similar
+# past questions (BM25 over question words, per database) go into the agent input as
+# worked examples, so the model starts from table, column and join choices that are
+# known to work instead of rediscovering them over extra ReAct steps. The whole index
+# is held in memory as an inverted list; a lookup touches only the postings of the
+# question's own words.
+DEFAULT_MAX_ENTRIES = 2000
+TOP_K = 3
+MIN_MATCH = 0.3  # share of the question's best possible BM25 score an example must reach
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD_RE = re.compile(r"[a-z0-9_]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can did do does for from give has have how i in is it list me my of on or "
+    "please show tell that the their there this to was were what which who with".split()
+)
+
+
+@dataclass
+class Example:
+    question: str
+    sql: str
+    score: float = 0.0
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping, enough for "returns" ~ "returned" ~ "return"."""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) > len(suffix) + 3:
+            return word[:-len(suffix)]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased, stemmed words without stopwords; identifiers like orders_2 stay whole."""
+    return [_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def successful_sql(steps, output: str = "") -> str | None:
+    """The agent's last query, if it is a SELECT that ran without an error and the agent
+    reached an answer. Writes are not kept: an example must be safe to imitate.
+
+    `steps` are AgentExecutor intermediate steps or AgentJob snapshot steps.
+    """
+    if str(output or "").startswith("Agent stopped"):  # iteration / time limit
+        return None
+    for step in reversed(steps or []):
+        if isinstance(step, dict):
+            tool, tool_input, observation = step["tool"], step["input"], step["output"]
+        else:
+            action, observation = step
+            tool, tool_input = getattr(action, "tool", None), getattr(action, "tool_input", "")
+        if tool != "sql_db_query":
+            continue
+        if observation is None or str(observation).lstrip().startswith("Error"):
+            return None
+        sql = (tool_input.get("query") if isinstance(tool_input, dict) else str(tool_input)).strip()
+        return sql if is_select(sql) else None
+    return None
+
+
+def render(examples: list[Example]) -> str:
+    """The examples as a block for the agent input."""
+    lines = ["Similar questions answered correctly before (adapt the SQL; do not copy it blindly):"]
+    for example in examples:
+        lines.append(f"Question: {example.question}\nSQL: {example.sql}")
+    return "\n".join(lines)
+
+
+class ExampleIndex:
+    """Persistent question -> SQL pairs with an in-memory BM25 index.
+
+    Pairs are keyed on the normalized question and a database identity; a newer
+    successful run of the same question replaces the older SQL. Past `max_entries`,
+    the least recently retrieved pairs are dropped.
+    """
+
+    def __init__(self, path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lookups = self.hits = self.added = 0
+        self.lookup_seconds = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS examples ("
+            "key TEXT NOT NULL, db_identity TEXT NOT NULL, question TEXT NOT NULL, sql TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (db_identity, key))"
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        self._docs: dict[int, tuple[str, str, str, int]] = {}  # id -> (db_identity, question, sql, length)
+        self._keys: dict[tuple[str, str], int] = {}
+        self._postings: dict[str, dict[int, int]] = defaultdict(dict)  # word -> {id: term frequency}
+        self._used: dict[tuple[str, str], float] = {}  # retrievals not yet written to last_used
+        self._total_length = 0
+        self._next_id = 0
+        rows = self._conn.execute("SELECT db_identity, key, question, sql FROM examples ORDER BY created_at")
+        for db_identity, key, question, sql in rows:
+            self._index(db_identity, key, question, sql)
+
+    def _index(self, db_identity: str, key: str, question: str, sql: str):
+        old = self._keys.pop((db_identity, key), None)
+        if old is not None:
+            self._unindex(old)
+        words = Counter(tokenize(question))
+        doc_id, self._next_id = self._next_id, self._next_id + 1
+        length = sum(words.values())
+        self._docs[doc_id] = (db_identity, question, sql, length)
+        self._keys[(db_identity, key)] = doc_id
+        self._total_length += length
+        for word, tf in words.items():
+            self._postings[word][doc_id] = tf
+
+    def _unindex(self, doc_id: int):
+        _, question, _, length = self._docs.pop(doc_id)
+        self._total_length -= length
+        for word in set(tokenize(question)):
+            postings = self._postings[word]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[word]
+
+    def add(self, question: str, sql: str, db_identity: str):
+        """Record a question whose run ended on `sql` (see `successful_sql`)."""
+        key = normalize_question(question)
+        if not key or not sql or not tokenize(question):
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO examples (key, db_identity, question, sql, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, db_identity, question.strip(), sql, now, now))
+            self._index(db_identity, key, question.strip(), sql)
+            self.added += 1
+            overflow = len(self._docs) - self.max_entries
+            if overflow > 0:
+                self._conn.executemany("UPDATE examples SET last_used = ? WHERE db_identity = ? AND key = ?",
+                                       [(at, *item) for item, at in self._used.items()])
+                self._used.clear()
+                evicted = self._conn.execute(
+                    "SELECT db_identity, key FROM examples ORDER BY last_used LIMIT ?", (overflow,)).fetchall()
+                self._conn.executemany("DELETE FROM examples WHERE db_identity = ? AND key = ?", evicted)
+                for item in evicted:
+                    self._unindex(self._keys.pop(tuple(item)))
+            self._conn.commit()
+
+    def search(self, question: str, db_identity: str, k: int = TOP_K,
+               min_match: float = MIN_MATCH) -> list[Example]:
+        """Up to `k` past examples for `db_identity`, most similar first."""
+        start = time.perf_counter()
+        words = set(tokenize(question))
+        with self._lock:
+            n = len(self._docs)
+            avg_length = self._total_length / n if n else 0.0
+            scores: dict[int, float] = defaultdict(float)
+            best = 0.0
+            docs = self._docs
+            for word in words:
+                postings = self._postings.get(word)
+                df = len(postings) if postings else 0
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                best += idf
+                if not postings:
+                    continue
+                weight, base, per_length = idf * (BM25_K1 + 1), BM25_K1 * (1 - BM25_B), BM25_K1 * BM25_B / avg_length
+                for doc_id, tf in postings.items():
+                    scores[doc_id] += weight * tf / (tf + base + per_length * docs[doc_id][3])
+            matches = [(score, doc_id) for doc_id, score in scores.items()
+                       if score >= min_match * best and self._docs[doc_id][0] == db_identity]
+            found = [Example(self._docs[doc_id][1], self._docs[doc_id][2], round(score, 3))
+                     for score, doc_id in nlargest(k, matches)]
+            self.lookups += 1
+            self.hits += bool(found)
+            now = time.time()
+            for example in found:  # persisted when an eviction needs it, keeping lookups off the disk
+                self._used[(db_identity, normalize_question(example.question))] = now
+            self.lookup_seconds += time.perf_counter() - start
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM examples")
+            self._conn.commit()
+            self._load()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._docs),
+            "added": self.added,
+            "lookups": self.lookups,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            "avg_lookup_us": round(self.lookup_seconds / self.lookups * 1e6, 1) if self.lookups else 0.0,
+        }
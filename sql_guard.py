@@ -0,0 +1,238 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from sqlalchemy import event, exc, text
+
+import profiling
+
+# ==============================
+# Cost guard for agent-written SQL
+# ==============================
+# The agents execute whatever SQL the model writes. A guard installed on their
+# SQLDatabase checks each statement before it runs:
+#   - EXPLAIN estimates the rows the plan examines; plans over the budget are
+#     rejected with a message the model can act on, unless a LIMIT lets the
+#     database stop early (then they run limited, under the timeout);
+#   - SELECTs without a LIMIT get one, and larger LIMITs are capped, so no
+#     result is longer than MAX_ROWS;
+#   - every statement runs under a watchdog that interrupts it after TIMEOUT.
+# Each intervention is appended to LOG_FILE with the SQL and estimate.
+MAX_ESTIMATED_ROWS = int(os.getenv("SQL_GUARD_MAX_ESTIMATED_ROWS", 5_000_000))
+MAX_ROWS = int(os.getenv("SQL_GUARD_MAX_ROWS", 10_000))  # bounds downloads; the model sees a summary
+TIMEOUT_SECONDS = float(os.getenv("SQL_GUARD_TIMEOUT_SECONDS", 15))
+LOG_FILE = Path(__file__).parent / ".profiling" / "sql_guard.jsonl"
+TABLE_COUNT_TTL = 300  # seconds; SQLite plans carry no row estimates, so table sizes fill in
+
+_SELECT_RE = re.compile(r"^\s*(?:\(\s*)*(?:SELECT|WITH)\b", re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\bLIMIT\s+(\d+)(?:\s*(,|OFFSET)\s*(\d+))?\s*$", re.IGNORECASE)
+# Without these, rows stream in plan order and a LIMIT stops the scan early
+_BLOCKING_RE = re.compile(r"\b(?:GROUP\s+BY|ORDER\s+BY|DISTINCT|UNION|HAVING|COUNT|SUM|AVG|MIN|MAX)\b",
+                          re.IGNORECASE)
+_TABLE_REF_RE = re.compile(r"\b(?:FROM|JOIN)\s+[`\"\[]?(\w+)[`\"\]]?(?:\s+(?:AS\s+)?[`\"]?(\w+))?",
+                           re.IGNORECASE)
+_SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+_KEYWORDS = {"where", "join", "inner", "left", "right", "outer", "cross", "natural", "on", "using",
+             "group", "order", "limit", "having", "union", "as", "set", "values"}
+
+_local = threading.local()
+
+
+@dataclass
+class Intervention:
+    action: str  # limit_added | limit_capped | limited_over_budget | rejected | timeout
+    sql: str
+    estimated_rows: int | None
+    rewritten: str | None = None
+    detail: str = ""
+    ts: float = 0.0
+
+
+def current_row_cap() -> int | None:
+    """The row cap the guard put on the statement this thread is running, if it capped one."""
+    watch = getattr(_local, "watch", None)
+    return watch["row_cap"] if watch else None
+
+
+def interrupt(engine, dbapi_connection):
+    """Abort the statement running on `dbapi_connection` (from any thread)."""
+    if engine.dialect.name == "sqlite":
+        dbapi_connection.interrupt()
+    elif engine.dialect.name == "mysql":
+        connection_id = getattr(dbapi_connection, "connection_id", None)
+        if connection_id:
+            with engine.connect() as killer:
+                killer.exec_driver_sql(f"KILL QUERY {int(connection_id)}")
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    watch = getattr(_local, "watch", None)
+    if watch is not None:
+        watch["connection"] = conn.connection.dbapi_connection
+        watch["engine"] = conn.engine  # a routed read may run on another engine than the guard's
+
+
+def watch(engine):
+    """Let the timeout see statements run on `engine` too (e.g. an engine_router read engine)."""
+    if not event.contains(engine, "before_cursor_execute", _before_execute):
+        event.listen(engine, "before_cursor_execute", _before_execute)
+    return engine
+
+
+def _strip(sql: str) -> str:
+    return sql.strip().rstrip(";").strip()
+
+
+def is_select(sql: str) -> bool:
+    return bool(_SELECT_RE.match(sql))
+
+
+def apply_row_cap(sql: str, max_rows: int = MAX_ROWS) -> tuple[str, str | None]:
+    """Return (sql, action): add `LIMIT max_rows` to a SELECT, or lower a larger LIMIT."""
+    sql = _strip(sql)
+    if not is_select(sql):
+        return sql, None
+    match = _LIMIT_RE.search(sql)
+    if match is None:
+        return f"{sql} LIMIT {max_rows}", "limit_added"
+    count_group = 3 if match.group(2) == "," else 1
+    if int(match.group(count_group)) <= max_rows:
+        return sql, None
+    start, end = match.span(count_group)
+    return sql[:start] + str(max_rows) + sql[end:], "limit_capped"
+
+
+class SQLGuard:
+    """EXPLAIN budget, row cap and statement timeout for one engine."""
+
+    def __init__(self, engine, app: str = "", max_estimated_rows: int = MAX_ESTIMATED_ROWS,
+                 max_rows: int = MAX_ROWS, timeout_seconds: float = TIMEOUT_SECONDS,
+                 log_file: Path = LOG_FILE):
+        self.engine = engine
+        self.app = app
+        self.max_estimated_rows = max_estimated_rows
+        self.max_rows = max_rows
+        self.timeout_seconds = timeout_seconds
+        self.log_file = Path(log_file)
+        self.recent: deque[Intervention] = deque(maxlen=50)
+        self._table_rows: dict[str, int] = {}
+        self._table_rows_at = 0.0
+        watch(engine)
+
+    # ---- cost estimate
+    def _sqlite_table_rows(self, conn) -> dict[str, int]:
+        if time.monotonic() - self._table_rows_at > TABLE_COUNT_TTL:
+            names = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars()
+            self._table_rows = {n.lower(): conn.execute(text(f'SELECT COUNT(*) FROM "{n}"')).scalar()
+                                for n in list(names)}
+            self._table_rows_at = time.monotonic()
+        return self._table_rows
+
+    def estimate(self, sql: str) -> int | None:
+        """Rows the plan examines (product over nested-loop steps), or None if EXPLAIN fails."""
+        try:
+            with self.engine.connect() as conn:
+                if self.engine.dialect.name == "mysql":
+                    plan = conn.execute(text(f"EXPLAIN {sql}")).mappings().fetchall()
+                    total = 1
+                    for step in plan:
+                        total *= max(int(step.get("rows") or 1), 1)
+                    return total
+                if self.engine.dialect.name == "sqlite":
+                    plan = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+                    sizes = self._sqlite_table_rows(conn)
+                    aliases = {(alias or table).lower(): table.lower()
+                               for table, alias in _TABLE_REF_RE.findall(sql)
+                               if not alias or alias.lower() not in _KEYWORDS}
+                    total = 1
+                    for _id, _parent, _, detail in plan:
+                        match = _SQLITE_SCAN_RE.match(detail)
+                        if match and match.group(1) != "CONSTANT":
+                            name = match.group(1).lower()
+                            # Unknown names are CTEs/subqueries: assume the largest table
+                            rows = sizes.get(aliases.get(name, name), max(sizes.values(), default=1))
+                            total *= max(rows, 1)
+                    return total
+        except exc.SQLAlchemyError:
+            return None  # let the statement run and report its own error
+        return None
+
+    # ---- checks
+    def check(self, sql: str) -> tuple[str | None, Intervention | None]:
+        """Return (sql to run or None if rejected, intervention or None)."""
+        original = _strip(sql)
+        if not is_select(original):
+            return original, None
+        rewritten, action = apply_row_cap(original, self.max_rows)
+        estimated = self.estimate(original)
+        if estimated is not None and estimated > self.max_estimated_rows:
+            if _BLOCKING_RE.search(original):
+                return None, Intervention(
+                    "rejected", original, estimated,
+                    detail=f"estimated {estimated:,} rows examined > budget {self.max_estimated_rows:,}")
+            action = "limited_over_budget"
+        if action is None:
+            return rewritten, None
+        return rewritten, Intervention(action, original, estimated, rewritten, f"row cap {self.max_rows}")
+
+    def log(self, item: Intervention):
+        item.ts = round(time.time(), 3)
+        self.recent.append(item)
+        profiling.jsonl_log(self.log_file).append([{"app": self.app, **asdict(item)}])
+
+    # ---- execution
+    def run(self, run, command, *args, **kwargs):
+        """Call `run(command, ...)` (SQLDatabase.run) with the checks applied."""
+        if not isinstance(command, str):
+            return run(command, *args, **kwargs)
+        sql, item = self.check(command)
+        if item is not None:
+            self.log(item)
+        if sql is None:
+            return (f"Error: query rejected by the cost guard: {item.detail}. "
+                    "Add selective WHERE filters or join conditions, or aggregate, and try again.")
+
+        capped = item is not None and item.action in ("limit_added", "limit_capped", "limited_over_budget")
+        watch = {"connection": None, "engine": self.engine, "fired": False,
+                 "row_cap": self.max_rows if capped else None}
+
+        def _timeout():
+            if watch["connection"] is not None:
+                watch["fired"] = True
+                interrupt(watch["engine"], watch["connection"])
+
+        _local.watch = watch
+        timer = threading.Timer(self.timeout_seconds, _timeout)
+        timer.daemon = True
+        timer.start()
+        started = time.perf_counter()
+        try:
+            return run(sql, *args, **kwargs)
+        except exc.DBAPIError:
+            if not watch["fired"]:
+                raise
+            self.log(Intervention("timeout", sql, item.estimated_rows if item else None,
+                                  detail=f"interrupted after {time.perf_counter() - started:.1f} s"))
+            return (f"Error: query cancelled after {self.timeout_seconds:g} s by the cost guard. "
+                    "Narrow it with WHERE filters or aggregate, and try again.")
+        finally:
+            timer.cancel()
+            _local.watch = None
+
+
+def recent(limit: int = 20, app: str | None = None, log_file: Path = LOG_FILE) -> list[dict]:
+    """The last `limit` logged interventions, newest first."""
+    items = profiling.jsonl_log(log_file).records()
+    return [i for i in items if app is None or i["app"] == app][-limit:][::-1]
+
+
+def install(db, guard: SQLGuard):
+    """Route `db.run` (what the sql_db_query tool calls) through `guard`."""
+    run = db.run
+    db.run = lambda command, *args, **kwargs: guard.run(run, command, *args, **kwargs)
+    db.guard = guard
+    return db
@@ -0,0 +1,24 @@
+import pytest
+
+from engine_router import snapshot_portable
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT Region, COUNT(*) FROM orders GROUP BY Region",
+    "SELECT COUNT(*) FROM orders_2 WHERE Delivered = 'yes'",
+    "SELECT * FROM orders_2 WHERE Product_Name = 'a/b || c'",
+])
+def test_portable(sql):
+    assert snapshot_portable(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT SUM(Quantity) / COUNT(*) FROM orders_2",
+    "SELECT Customer_Name || State FROM orders_2",
+    "SELECT CONCAT(Customer_Name, State) FROM orders_2",
+    "SELECT LENGTH(Product_Name) FROM orders_2",
+    "SELECT * FROM orders_2 WHERE Purchase_Date >= '2024-01-01'",
+    'SELECT * FROM orders_2 WHERE Delivered = "YES"',
+])
+def test_not_portable(sql):
+    assert not snapshot_portable(sql)
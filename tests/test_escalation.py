@@ -0,0 +1,33 @@
+import pytest
+
+from escalation import DraftError, RateGate, draft_email
+
+
+class _Reply:
+    content = "Dear manager"
+
+
+class _LLM:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+
+    def invoke(self, prompt):
+        if self.errors:
+            raise self.errors.pop(0)
+        return _Reply()
+
+
+def test_rate_limits_are_retried():
+    llm = _LLM(RuntimeError("429 rate limit"), RuntimeError("429 rate limit"))
+    assert draft_email(llm, "prompt", RateGate(), max_retries=3, backoff=0) == ("Dear manager", 3)
+
+
+@pytest.mark.parametrize("errors, attempts", [
+    ([ValueError("bad prompt")], 1),
+    ([RuntimeError("429")] * 2 + [ValueError("bad prompt")], 3),
+    ([RuntimeError("429")] * 5, 4),
+])
+def test_failures_report_the_attempts_made(errors, attempts):
+    with pytest.raises(DraftError) as failed:
+        draft_email(_LLM(*errors), "prompt", RateGate(), max_retries=4, backoff=0)
+    assert failed.value.attempts == attempts
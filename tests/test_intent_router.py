@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+import data_version
+import intent_router
+from intent_router import _singular
+
+
+@pytest.mark.parametrize("plural, singular", [
+    ("Office Chairs", "Office Chair"), ("Boxes", "Box"), ("Batteries", "Battery"),
+    ("Glass", "Glass"), ("Address", "Address"), ("Status", "Status"),
+])
+def test_singular(plural, singular):
+    assert _singular(plural) == singular
+
+
+@pytest.mark.parametrize("tracked", [False, True])
+def test_update_quantity_prefers_the_exact_product_name(tracked):
+    engine = create_engine("sqlite://")
+    pd.DataFrame({"Customer_ID": ["C-1"] * 3, "Customer_Name": ["Ann"] * 3,
+                  "Product_Name": ["Glasses", "Glass", "Office Chair"], "Quantity": [1, 1, 1],
+                  "Delivered": ["NO"] * 3}).to_sql("orders_2", engine, index=False)
+    if tracked:  # the version bump must not change the UPDATE's rowcount
+        data_version.track_writes(engine)
+    intent_router.try_fast_path(engine, "update Ann's order to 4 'Glasses'")
+    intent_router.try_fast_path(engine, "update Ann's order to 7 'Office Chairs'")
+    with engine.connect() as conn:
+        quantities = dict(conn.execute(text("SELECT Product_Name, Quantity FROM orders_2")).fetchall())
+    assert quantities == {"Glasses": 4, "Glass": 1, "Office Chair": 7}
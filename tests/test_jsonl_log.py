@@ -0,0 +1,18 @@
+from profiling import JsonlLog, slowest
+
+
+def test_rotates_by_size_and_keeps_a_tail(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    log = JsonlLog(path, max_bytes=200, keep=5)
+    for i in range(20):
+        log.append([{"app": "a", "kind": "sql", "ms": i}])
+    assert path.stat().st_size <= 200 + 40
+    assert (tmp_path / "trace.jsonl.1").exists()
+    assert [r["ms"] for r in log.records()] == [15, 16, 17, 18, 19]
+
+
+def test_new_process_reads_the_end_of_the_file(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    JsonlLog(path, max_bytes=10_000).append([{"app": "a", "kind": "sql", "ms": i} for i in range(50)])
+    assert [r["ms"] for r in JsonlLog(path, max_bytes=100).records()][-2:] == [48, 49]
+    assert [s["ms"] for s in slowest(path, limit=3, app="a")] == [49, 48, 47]
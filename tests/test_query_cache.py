@@ -0,0 +1,23 @@
+import pytest
+
+from query_cache import QueryCache, cache_key
+
+HISTORY_INPUT = "Conversation so far:\nuser: total sales in East?\n\nUser question: {}"
+
+
+@pytest.mark.parametrize("question", ["Total sales by region?", "How many orders were returned"])
+def test_standalone_question_is_keyed_on_itself(question):
+    assert cache_key(question, HISTORY_INPUT.format(question)) == question
+
+
+@pytest.mark.parametrize("question", ["What about West?", "and for 2023", "Which of them are late?"])
+def test_follow_up_is_keyed_with_its_history(question):
+    assert cache_key(question, HISTORY_INPUT.format(question)) == HISTORY_INPUT.format(question)
+
+
+def test_repeat_later_in_conversation_hits(tmp_path):
+    cache = QueryCache(tmp_path / "cache.sqlite")
+    cache.put(cache_key("Total sales by region?", "User question: Total sales by region?"), "db", "v1",
+              "SELECT 1", "East: 10")
+    later = cache_key("total sales by region", HISTORY_INPUT.format("total sales by region"))
+    assert cache.get(later, "db", "v1").answer == "East: 10"
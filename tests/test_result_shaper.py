@@ -0,0 +1,38 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from result_shaper import ResultStore, summarize
+from sql_guard import SQLGuard
+
+
+class _DB:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def _execute(self, command, fetch="all", **kwargs):
+        with self.engine.connect() as conn:
+            return [dict(r) for r in conn.execute(text(command)).mappings()]
+
+
+def _run(sql, max_rows, tmp_path):
+    engine = create_engine("sqlite://")
+    pd.DataFrame({"n": range(100)}).to_sql("t", engine, index=False)
+    db, store = _DB(engine), ResultStore()
+    guard = SQLGuard(engine, max_rows=max_rows, log_file=tmp_path / "guard.jsonl")
+    return guard.run(lambda command, *a, **kw: store.shaped_run(db, command, *a, **kw), sql)
+
+
+def test_capped_result_is_reported_as_truncated(tmp_path):
+    out = _run("SELECT n FROM t", 50, tmp_path)
+    assert out.startswith("First 50 rows (result truncated) x 1 columns")
+    assert "these rows only" in out
+
+
+def test_uncapped_result_reports_its_row_count(tmp_path):
+    out = _run("SELECT n FROM t LIMIT 40", 50, tmp_path)
+    assert out.startswith("40 rows x 1 columns") and "truncated" not in out
+    assert _run("SELECT n FROM t", 500, tmp_path).startswith("100 rows x 1 columns")
+
+
+def test_summarize():
+    assert "result truncated" not in summarize(pd.DataFrame({"n": [1, 2]}))
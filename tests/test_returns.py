@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+import data_version
+import intent_router
+from orders_store import OrdersStore, sqlite_pool
+
+
+def _db(tmp_path):
+    path = tmp_path / "orders.db"
+    engine = create_engine(f"sqlite:///{path}")
+    recent, old = date.today() - timedelta(days=3), date.today() - timedelta(days=90)
+    pd.DataFrame({
+        "Customer_ID": ["C-1", "C-1", "C-2", "C-3"],
+        "Customer_Name": ["Ann", "Ann", "Bob", "Cy"],
+        "Product_Name": ["Pen", "Pad", "Pen", "Pen"],
+        "Quantity": [1, 2, 3, 4],
+        "Purchase_Date": [str(recent), str(old), str(recent), str(recent)],
+        "Delivered": ["YES", "YES", "YES", "NO"],
+    }).to_sql("orders_2", engine, index=False)
+    pd.DataFrame({"Returned": ["Yes"], "Order ID": ["CA-1"]}).to_sql("returns", engine, index=False)
+    store = OrdersStore(sqlite_pool(str(path)))
+    data_version.track_writes(engine)
+    return engine, store
+
+
+def _state(engine):
+    with engine.connect() as conn:
+        delivered = dict(conn.execute(text("SELECT rowid, Delivered FROM orders_2")).fetchall())
+        returns = [r for (r,) in conn.execute(text('SELECT "Order ID" FROM returns ORDER BY rowid'))]
+    return delivered, returns
+
+
+def test_store_and_fast_path_record_returns_alike(tmp_path):
+    engine, store = _db(tmp_path)
+    assert store.mark_return(3) and not store.mark_return(3)
+    assert not store.mark_return(4)  # undelivered
+    result = intent_router.try_fast_path(engine, "return C-1's orders")
+    assert result.answer.startswith("Returned 1 order(s)")
+    delivered, returns = _state(engine)
+    assert delivered == {1: "RETURNED", 2: "YES", 3: "RETURNED", 4: "NO"}
+    assert returns == ["CA-1", "orders_2-3", "orders_2-1"]
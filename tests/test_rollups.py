@@ -0,0 +1,50 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+import data_version
+import intent_router
+import rollups
+from orders_store import OrdersStore, sqlite_pool
+
+
+def _db(tmp_path):
+    path = tmp_path / "orders.db"
+    engine = create_engine(f"sqlite:///{path}")
+    pd.DataFrame({
+        "Customer_ID": ["C-1", "C-2"],
+        "Customer_Name": ["Ann", "Bob"],
+        "Region": ["East", "East"],
+        "State": ["Ohio", "Ohio"],
+        "Segment": ["Consumer", "Consumer"],
+        "Category": ["Furniture", "Furniture"],
+        "Product_Name": ["Pen", "Pad"],
+        "Quantity": [1, 1],
+        "Purchase_Date": ["2024-09-03", "2024-09-10"],
+        "Delivered": ["NO", "NO"],
+    }).to_sql("orders_2", engine, index=False)
+    assert rollups.ensure_fresh(engine, report=lambda _: None) == ["rollup_orders_2"]
+    data_version.track_writes(engine)
+    return engine, OrdersStore(sqlite_pool(str(path)))
+
+
+def _quantity(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT SUM(quantity) FROM rollup_orders_2 WHERE Month = '2024-09'")).scalar()
+
+
+def test_store_write_does_not_hide_an_earlier_agent_write(tmp_path):
+    engine, store = _db(tmp_path)
+    with engine.begin() as conn:  # agent DML: versioned, rollup not refreshed
+        conn.execute(text("UPDATE orders_2 SET Quantity = 100 WHERE Customer_ID = 'C-1'"))
+    assert store.update_order("C9", "x", 1) == 0
+    assert rollups.ensure_fresh(engine, report=lambda _: None) == ["rollup_orders_2"]
+    assert _quantity(engine) == 101
+
+
+def test_fast_path_writes_keep_the_rollup_current(tmp_path):
+    engine, store = _db(tmp_path)
+    assert intent_router.try_fast_path(engine, "mark C-1 as delivered").answer.startswith("Marked 1")
+    assert intent_router.try_fast_path(engine, "update Bob's order to 7 Pads").answer.startswith("Updated 1")
+    assert store.update_order("C9", "x", 1) == 0
+    assert rollups.ensure_fresh(engine, report=lambda _: None) == []
+    assert _quantity(engine) == 8
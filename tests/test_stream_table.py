@@ -0,0 +1,47 @@
+import datetime
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from ingestion import ColumnSpec, INT_TYPES, _widen, stream_table
+
+
+class _Sheet:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def iter_rows(self, values_only=True):
+        return iter(self.rows)
+
+
+def _load(rows, batch_rows=2):
+    engine = create_engine("sqlite://")
+    messages = []
+    stat = stream_table(_Sheet(rows), "sheet", engine, batch_rows=batch_rows, report=messages.append)
+    return pd.read_sql("SELECT * FROM sheet", engine), stat, messages
+
+
+def test_later_batches_keep_values_outside_the_first_batch_types():
+    rows = [
+        ("Region", "Product", "Quantity", "Date"),
+        ("East", "Pen", 1, datetime.date(2024, 1, 1)),
+        ("West", "Pad", 2, datetime.date(2024, 1, 2)),
+        ("North", "x" * 300, 10**12, "unknown"),
+    ]
+    df, stat, messages = _load(rows)
+    assert stat.rows == 3
+    assert df["Region"].tolist() == ["East", "West", "North"]
+    assert df.loc[2, "Product"] == "x" * 300
+    assert df.loc[2, "Quantity"] == 10**12
+    assert df.loc[2, "Date"] == "unknown"
+    assert len(messages) == 4
+
+
+def test_widen():
+    assert _widen(ColumnSpec("Region", "category"), ["East", None]).kind == "category"
+    assert _widen(ColumnSpec("Region", "category"), ["North"]).kind == "text"
+    assert _widen(ColumnSpec("Name", "text", text_len=255), ["x" * 256]).sql_type("mysql") == "TEXT"
+    widened = _widen(ColumnSpec("Qty", "int", int_type=0), [40_000])
+    assert INT_TYPES[widened.int_type][0] == "INT"
+    assert _widen(ColumnSpec("Qty", "int"), [1.5]).kind == "float"
+    assert _widen(ColumnSpec("Qty", "int", int_type=3), [2**70]).kind == "float"
@@ -0,0 +1,42 @@
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+import ingestion
+from ingestion import INGEST_ROWS_TABLE, sync_table
+
+
+def _rows(engine, table="orders"):
+    with engine.connect() as conn:
+        return conn.execute(text(f'SELECT "Order ID", "Product ID", Sales FROM {table} ORDER BY Sales')).fetchall()
+
+
+def test_null_key_parts_are_updated_in_place():
+    engine = create_engine("sqlite://")
+    df = pd.DataFrame({"Order ID": ["A", "A", "B"], "Product ID": ["P1", None, "P1"], "Sales": [1.0, 2.0, 3.0]})
+    sync_table(df, "orders", engine)
+    df.loc[1, "Sales"] = 5.0
+    stat = sync_table(df, "orders", engine)
+    assert (stat.updated, stat.full_reload) == (1, False)
+    stat = sync_table(df.drop(index=1), "orders", engine)
+    assert stat.deleted == 1
+    assert _rows(engine) == [("A", "P1", 1.0), ("B", "P1", 3.0)]
+
+
+def test_reload_without_a_key_clears_row_hashes():
+    engine = create_engine("sqlite://")
+    sync_table(pd.DataFrame({"Region": ["East", "West"], "Manager": ["Ann", "Bob"]}), "regional_managers", engine)
+    sync_table(pd.DataFrame({"Region": ["East", "East"], "Manager": ["Ann", "Bob"]}), "regional_managers", engine)
+    with engine.connect() as conn:
+        assert conn.execute(text(f"SELECT COUNT(*) FROM {INGEST_ROWS_TABLE}")).scalar() == 0
+
+
+def test_changed_keys_are_looked_up_in_batches(monkeypatch):
+    monkeypatch.setattr(ingestion, "KEY_BATCH_ROWS", 2)
+    engine = create_engine("sqlite://")
+    df = pd.DataFrame({"Order ID": list("ABCDE"), "Product ID": ["P1", None, "P1", None, "P1"],
+                       "Sales": [1.0, 2.0, 3.0, 4.0, 5.0]})
+    sync_table(df, "orders", engine)
+    stat = sync_table(df.assign(Sales=df["Sales"] * 10), "orders", engine)
+    assert stat.updated == 5 and len(stat.replaced_rows) == 5
+    assert _rows(engine) == [("A", "P1", 10.0), ("B", None, 20.0), ("C", "P1", 30.0), ("D", None, 40.0),
+                             ("E", "P1", 50.0)]
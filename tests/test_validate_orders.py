@@ -0,0 +1,33 @@
+import pandas as pd
+import pytest
+
+from orders_store import IMPORT_COLUMNS, validate_orders
+
+
+def _row(**overrides):
+    row = {"Customer_Name": "Ada Lovelace", "Customer_ID": "AL-100", "Segment": "Consumer",
+           "Country": "United States", "State": "Texas", "Postal_Code": "75001", "Region": "Central",
+           "Category": "Technology", "Product_Name": "Phone", "Quantity": "2"}
+    row.update(overrides)
+    return row
+
+
+def test_all_valid_rows():
+    valid, rejected = validate_orders(pd.DataFrame([_row(), _row(Customer_ID="AL-101", Quantity="3")]))
+    assert len(valid) == 2 and rejected.empty
+    assert list(valid.columns) == IMPORT_COLUMNS
+    assert valid["Quantity"].tolist() == [2, 3]
+
+
+def test_mixed_rows():
+    df = pd.DataFrame([_row(), _row(Customer_ID=" ", Quantity="1.5"), _row(Region="North")])
+    valid, rejected = validate_orders(df)
+    assert valid.index.tolist() == [0]
+    assert rejected.index.tolist() == [1, 2]
+    assert rejected.loc[1, "Error"] == "Customer_ID is empty; Quantity must be a whole number >= 1"
+    assert rejected.loc[2, "Error"].startswith("Region must be one of")
+
+
+def test_missing_columns():
+    with pytest.raises(ValueError, match="Missing columns: Quantity"):
+        validate_orders(pd.DataFrame([_row()]).drop(columns="Quantity"))